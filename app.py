@@ -2,10 +2,17 @@ import time
 import market
 import trader
 import config
+import ipc
+import metrics
+import gzip
+import hashlib
 import json
-from datetime import datetime
+import os
+import threading
+from datetime import datetime, timezone
 import trade_logger
-from flask import Flask, render_template, jsonify
+from trade_journal import get_journal
+from flask import Flask, Response, render_template, jsonify, request, send_file, stream_with_context
 
 # ÖNCE trade modülünü import et
 import trade
@@ -14,7 +21,7 @@ import trade
 portfolio = None
 if config.SIMULATION_MODE:
     from simulation import SimulatedPortfolio
-    portfolio = SimulatedPortfolio()
+    portfolio = SimulatedPortfolio(migrate=False) # The worker migrates the legacy JSON state
     # Şimdi portfolio'yu trade modülüne set et
     trade.set_portfolio(portfolio)
     print(f"[INIT] Portfolio initialized and shared with trade module.")
@@ -22,39 +29,324 @@ if config.SIMULATION_MODE:
 # --- Flask Web Server ---
 app = Flask(__name__)
 
+STATE_FILE = 'portfolio_state.json' # Written by worker.py every cycle
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+class StateCache:
+    """
+    Keeps the decoded portfolio state in memory. It comes from the worker's IPC
+    snapshot when available (reloaded only when its sequence number changes) and
+    otherwise from portfolio_state.json (reloaded only when the file's inode, mtime
+    or size changes). JSON views of the state are encoded (and
+    gzipped) once per state version, so repeated requests cost almost nothing.
+    The newest trade journal entries are cached the same way (see journal_tail).
+    """
+    def __init__(self, path, journal_tail_size=100):
+        self.path = path
+        self._lock = threading.Lock()
+        self._version = None
+        self._seq = 0 # Sequence of the last IPC snapshot
+        self._state = {}
+        self._responses = {} # name -> cached encoded response
+        self.last_modified = None
+        self._journal_lock = threading.Lock()
+        self._journal_tail_size = journal_tail_size
+        self._journal_checked = float('-inf')
+        self._journal_last_id = 0
+        self._journal_entries = []
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def get(self):
+        """
+        Returns (state, version). The worker's IPC snapshot is used when it has been
+        published; the state file is the fallback. version is None when there is no state.
+        """
+        with self._lock:
+            seq, snapshot = ipc.read('portfolio', since_seq=self._seq)
+            if snapshot is not None:
+                self._state, self._version, self._seq = snapshot, ('ipc', seq), seq
+                self.last_modified = datetime.now(timezone.utc)
+            if self._seq:
+                return self._state, self._version
+
+            version = self._file_version()
+            if version != self._version:
+                try:
+                    with open(self.path, 'r') as f:
+                        self._state = json.load(f)
+                    self._version = version
+                    self.last_modified = datetime.fromtimestamp(version[1] / 1e9, tz=timezone.utc)
+                except FileNotFoundError:
+                    self._state, self._version, self.last_modified = {}, None, None
+                except json.JSONDecodeError:
+                    pass # Caught the file mid-write; keep the previous state and retry next time
+            return self._state, self._version
+
+    def journal_tail(self):
+        """
+        Returns (last_id, entries): the trade journal's newest id and its newest entries,
+        oldest first. The journal is asked for its last id at most once per
+        DASHBOARD_PUSH_INTERVAL however many dashboards are streaming, and the
+        entries are read again only when that id moved.
+        """
+        with self._journal_lock:
+            now = time.monotonic()
+            if now - self._journal_checked >= config.DASHBOARD_PUSH_INTERVAL:
+                self._journal_checked = now
+                journal = get_journal()
+                if journal.last_id() != self._journal_last_id:
+                    self._journal_entries = journal.get_trades(limit=self._journal_tail_size)
+                    self._journal_last_id = self._journal_entries[-1]["id"] if self._journal_entries else 0
+            return self._journal_last_id, self._journal_entries
+
+    def encoded(self, name, version, build):
+        """
+        Returns the cached {etag, body, gzip} for a view, rebuilding it only when `version`
+        changed. Views with a name of None are encoded every time and not kept.
+        """
+        with self._lock:
+            entry = self._responses.get(name)
+            if entry and entry['version'] == version:
+                return entry
+        body = json.dumps(build()).encode('utf-8')
+        entry = {
+            'version': version,
+            'etag': hashlib.sha1(body).hexdigest(),
+            'body': body,
+            'gzip': gzip.compress(body, compresslevel=6) if len(body) >= 1024 else None,
+        }
+        if name is not None:
+            with self._lock:
+                self._responses[name] = entry
+        return entry
+
+state_cache = StateCache(STATE_FILE)
+
 def get_state_from_file():
-    """Helper function to read the state file."""
-    try:
-        with open('portfolio_state.json', 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+    """Helper function to read the state file (served from the in-memory cache)."""
+    return state_cache.get()[0]
+
+def conditional_json(name, version, build, last_modified=None):
+    """
+    Serves a cached JSON view with ETag / Last-Modified validators, answering
+    If-None-Match / If-Modified-Since with 304 and gzip-compressing when accepted.
+    """
+    entry = state_cache.encoded(name, version, build)
+    use_gzip = entry['gzip'] is not None and request.accept_encodings['gzip'] > 0
+    response = Response(entry['gzip'] if use_gzip else entry['body'], mimetype='application/json')
+    response.set_etag(entry['etag'] + ('-gz' if use_gzip else ''))
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache' # Always revalidate, usually with a 304
+    response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
 
 @app.route('/api/portfolio_summary')
 def api_portfolio_summary():
-    state = get_state_from_file()
-    return jsonify(state.get("portfolio_summary", {}))
+    state, version = state_cache.get()
+    return conditional_json('portfolio_summary', version, lambda: state.get("portfolio_summary", {}), state_cache.last_modified)
 
 @app.route('/api/open_positions')
 def api_open_positions():
-    state = get_state_from_file()
-    return jsonify(state.get("open_positions", {}))
+    state, version = state_cache.get()
+    return conditional_json('open_positions', version, lambda: state.get("open_positions", {}), state_cache.last_modified)
 
 @app.route('/api/trade_log')
 def api_trade_log():
+    """
+    Renders the newest journal entries as trading_log.txt text.
+    With ?after_id=N only entries newer than N are returned, so pollers can append.
+    With ?offset=N the raw trading_log.txt is tailed from byte N instead.
+    """
+    offset = request.args.get('offset', type=int)
+    if offset is not None:
+        return _tail_trade_log(offset)
+
+    after_id = request.args.get('after_id', type=int) or None
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    journal = get_journal()
+
+    def build():
+        entries = journal.get_trades(limit=limit, after_id=after_id)
+        return {
+            "log_content": trade_logger.render_log(entries),
+            "last_id": entries[-1]["id"] if entries else (after_id or 0),
+        }
+    # Only the default view is worth caching; incremental reads differ per client
+    name = f'trade_log:{limit}' if after_id is None else None
+    return conditional_json(name, journal.last_id(), build)
+
+def _tail_trade_log(offset, max_bytes=256 * 1024):
+    """Returns the bytes of trading_log.txt after `offset` and the offset to ask for next time."""
     try:
-        with open(trade_logger.LOG_FILE, 'r') as f:
-            return jsonify({"log_content": f.read()})
+        size = os.path.getsize(trade_logger.LOG_FILE)
     except FileNotFoundError:
-        return jsonify({"log_content": "Log file not found."})
+        return jsonify({"log_content": "", "offset": 0, "size": 0})
+    if offset > size:
+        offset = 0 # The log was rotated; start over
+    data = b""
+    if offset < size:
+        with open(trade_logger.LOG_FILE, 'rb') as f:
+            f.seek(offset)
+            data = f.read(min(size - offset, max_bytes))
+    return jsonify({"log_content": data.decode('utf-8', errors='ignore'), "offset": offset + len(data), "size": size})
+
+@app.route('/api/trade_log/raw')
+def api_trade_log_raw():
+    """The raw trading_log.txt, with ETag and HTTP Range support (e.g. Range: bytes=1024-)."""
+    if not os.path.exists(trade_logger.LOG_FILE):
+        return Response("", mimetype='text/plain')
+    return send_file(os.path.abspath(trade_logger.LOG_FILE), mimetype='text/plain', conditional=True, max_age=0)
+
+@app.route('/api/trades')
+def api_trades():
+    """Structured journal query, e.g. /api/trades?action=CLOSE&symbol=BTC/USDT&limit=20"""
+    return jsonify(get_journal().get_trades(
+        limit=min(request.args.get('limit', 50, type=int), 1000),
+        action=request.args.get('action'),
+        symbol=request.args.get('symbol'),
+        after_id=request.args.get('after_id', type=int),
+        since=request.args.get('since', type=float),
+    ))
+
+@app.route('/api/pnl_by_symbol')
+def api_pnl_by_symbol():
+    return jsonify(get_journal().pnl_by_symbol(since=request.args.get('since', type=float)))
 
 @app.route('/api/portfolio_history')
 def api_portfolio_history():
-    state = get_state_from_file()
-    return jsonify(state.get("equity_history", []))
+    state, version = state_cache.get()
+    return conditional_json('portfolio_history', version, lambda: state.get("equity_history", []), state_cache.last_modified)
+
+# --- Live dashboard (Server-Sent Events) ---
+
+def build_snapshot(state=None):
+    """Everything the dashboard shows, in one response."""
+    state = get_state_from_file() if state is None else state
+    last_trade_id, entries = state_cache.journal_tail()
+    return {
+        "portfolio_summary": state.get("portfolio_summary", {}),
+        "open_positions": state.get("open_positions", {}),
+        "equity_history": state.get("equity_history", []),
+        "log_content": trade_logger.render_log(entries),
+        "last_trade_id": last_trade_id,
+    }
+
+def diff_states(previous, current):
+    """
+    Returns the changes between two portfolio states as a delta:
+    the new summary (if changed), updated/removed positions and new equity points.
+    """
+    delta = {}
+    if current.get("portfolio_summary") != previous.get("portfolio_summary"):
+        delta["portfolio_summary"] = current.get("portfolio_summary", {})
+
+    old_positions = previous.get("open_positions", {})
+    new_positions = current.get("open_positions", {})
+    updated = {s: p for s, p in new_positions.items() if old_positions.get(s) != p}
+    removed = [s for s in old_positions if s not in new_positions]
+    if updated or removed:
+        delta["positions"] = {"updated": updated, "removed": removed}
+
+    old_history = previous.get("equity_history", [])
+    last_timestamp = old_history[-1]["timestamp"] if old_history else ""
+    new_points = [p for p in current.get("equity_history", []) if p["timestamp"] > last_timestamp]
+    if new_points:
+        delta["equity_points"] = new_points
+    return delta
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+_market_snapshot = {"seq": 0, "data": {}}
+
+@app.route('/api/market')
+def api_market():
+    """The last cycle's market summaries, as published by the worker."""
+    seq, snapshot = ipc.read('market', since_seq=_market_snapshot["seq"])
+    if snapshot is not None:
+        _market_snapshot.update(seq=seq, data=snapshot)
+    return conditional_json('market', _market_snapshot["seq"], lambda: _market_snapshot["data"])
+
+_metrics_snapshot = {"seq": 0, "text": None}
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """The worker's latency histograms and counters (see metrics.py) in Prometheus text format."""
+    seq, snapshot = ipc.read('metrics', since_seq=_metrics_snapshot["seq"])
+    if snapshot is not None:
+        _metrics_snapshot.update(seq=seq, text=metrics.render(snapshot))
+    if _metrics_snapshot["text"] is None:
+        return Response("# The worker has not published any metrics yet.\n", status=503, mimetype="text/plain")
+    return Response(_metrics_snapshot["text"], content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route('/api/snapshot')
+def api_snapshot():
+    state, version = state_cache.get()
+    return conditional_json('snapshot', (version, state_cache.journal_tail()[0]), lambda: build_snapshot(state=state))
+
+# Each open stream holds one gunicorn thread for as long as the tab is open
+_stream_slots = threading.BoundedSemaphore(config.DASHBOARD_MAX_STREAMS)
+
+@app.route('/api/stream')
+def api_stream():
+    """
+    Server-Sent Events stream for the dashboard. Sends a `snapshot` event first, then
+    `delta` events only when the portfolio state or the trade journal changes.
+
+    At most DASHBOARD_MAX_STREAMS streams are served at once, so open tabs cannot
+    take every web thread (WEB_THREADS in start.sh); beyond that the answer is 503
+    and the dashboard polls /api/snapshot instead. All streams read the state and
+    the journal through the shared state_cache.
+    """
+    if not _stream_slots.acquire(blocking=False):
+        return Response("Too many dashboard streams; poll /api/snapshot instead.\n", status=503,
+                        mimetype="text/plain", headers={"Retry-After": "30"})
+
+    def events():
+        state, version = state_cache.get()
+        snapshot = build_snapshot(state=state)
+        last_trade_id = snapshot["last_trade_id"]
+        yield _sse("snapshot", snapshot)
+
+        last_sent = time.time()
+        while True:
+            time.sleep(config.DASHBOARD_PUSH_INTERVAL)
+            delta = {}
+
+            new_state, new_version = state_cache.get()
+            if new_version != version:
+                version = new_version
+                delta = diff_states(state, new_state)
+                state = new_state
+
+            tail_id, entries = state_cache.journal_tail()
+            if tail_id > last_trade_id:
+                entries = [entry for entry in entries if entry["id"] > last_trade_id]
+                last_trade_id = tail_id
+                delta["trades"] = {"log_content": trade_logger.render_log(entries), "last_id": last_trade_id}
+
+            if delta:
+                yield _sse("delta", delta)
+                last_sent = time.time()
+            elif time.time() - last_sent >= 15:
+                yield ": keep-alive\n\n" # Stops proxies from closing an idle stream
+                last_sent = time.time()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    response = Response(stream_with_context(events()), mimetype="text/event-stream", headers=headers)
+    response.call_on_close(_stream_slots.release) # The server closes the response when the client goes away
+    return response
 
 # --- End Flask Web Server ---
@@ -0,0 +1,187 @@
+"""
+Asyncio runtime for the worker.
+
+The decision cycle is split into stages that run as separate tasks connected by
+queues:
+
+    candle clock -> fetch -> decide -> execute -> persist
+                                           \\-> notify
+    TP/SL clock  -> TP/SL check
+
+The event loop itself never blocks. Blocking work runs in executors:
+- `positions`: one thread for everything that touches positions (decide, execute,
+  TP/SL), so position management happens in order and is never stuck behind I/O
+- `io`: market data fetches (including the TP/SL price refresh), state persistence,
+  and the cycle start/end bookkeeping (strategy reload, metrics, profiler dumps)
+- `notify`: email and other notifications, so a slow SMTP login can't delay anything
+
+Persistence only keeps the latest state (a slow disk makes it skip states, never
+fall behind), and the notification queue is bounded (notifications are dropped
+when it is full).
+
+The stage functions come from worker.py; see worker.run_async().
+"""
+import asyncio
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from scheduler import Job, timeframe_seconds
+
+class WorkerRuntime:
+    def __init__(self, stages, timeframe, settle_delay=0.0, tp_sl_interval=0.0, notify_queue_size=100, clock=time.time):
+        """
+        `stages` holds the worker's stage functions: start_cycle, fetch_market_data, decide,
+        execute, snapshot_state, persist_state, finish_cycle, end_cycle, fetch_tp_sl_prices,
+        check_tp_sl_prices and portfolio_lock.
+        """
+        self.stages = stages
+        self.clock = clock
+        self.cycle_job = Job('cycle', None, timeframe_seconds(timeframe), offset=settle_delay)
+        self.tp_sl_job = Job('tp_sl', None, tp_sl_interval) if tp_sl_interval > 0 else None
+        self.notify_queue_size = notify_queue_size
+        self.executors = {
+            'positions': ThreadPoolExecutor(max_workers=1, thread_name_prefix="positions"),
+            'io': ThreadPoolExecutor(max_workers=2, thread_name_prefix="io"),
+            'notify': ThreadPoolExecutor(max_workers=1, thread_name_prefix="notify"),
+        }
+
+    async def _run(self, executor, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executors[executor], func, *args)
+
+    def _locked(self, func):
+        def run(*args):
+            with self.stages['portfolio_lock']:
+                return func(*args)
+        return run
+
+    async def _clock(self, job, run_once):
+        """Calls `run_once` at every slot of the job, reporting and skipping slots it overran."""
+        slot = job.next_slot(self.clock())
+        while True:
+            await asyncio.sleep(max(0.0, slot - self.clock()))
+            started = self.clock()
+            try:
+                await run_once()
+            except Exception as e:
+                print(f"[RUNTIME] Job '{job.name}' failed: {e}")
+                traceback.print_exc()
+            slot = job.finished(slot, started, self.clock(), tag="RUNTIME")
+
+    # --- Stages ---
+
+    async def fetch_once(self):
+        """Starts a cycle and hands its market data to the decide stage."""
+        if not self.decide_queue.empty() or self.busy:
+            self.cycle_job.overruns += 1
+            metrics.CYCLE_OVERRUNS.inc(job=self.cycle_job.name)
+            print(f"[RUNTIME] Previous cycle is still being processed; skipping this candle. Total overruns: {self.cycle_job.overruns}.")
+            return
+        if not await self._run('io', self.stages['start_cycle']):
+            return
+        cycle_errors = []
+        market_data_cache = await self._run('io', self.stages['fetch_market_data'], cycle_errors)
+        if market_data_cache:
+            await self.decide_queue.put((market_data_cache, cycle_errors))
+        else:
+            await self._run('io', self.stages['end_cycle']) # Publish the fetch errors even though the cycle is skipped
+
+    async def decide_loop(self):
+        while True:
+            market_data_cache, cycle_errors = await self.decide_queue.get()
+            self.busy = True
+            try:
+                portfolio_summary, position_statuses, decisions = await self._run(
+                    'positions', self._locked(self.stages['decide']), market_data_cache
+                )
+                await self.execute_queue.put((market_data_cache, cycle_errors, portfolio_summary, position_statuses, decisions))
+            except Exception as e:
+                self.busy = False
+                print(f"[RUNTIME] Decide stage failed: {e}")
+                traceback.print_exc()
+
+    def _execute_and_snapshot(self, market_data_cache, position_statuses, decisions, cycle_errors):
+        # TP/SL may have run between decide and execute, so positions are re-checked
+        is_cycle_successful = self.stages['execute'](market_data_cache, position_statuses, decisions, cycle_errors, True)
+        return is_cycle_successful, self.stages['snapshot_state']()
+
+    async def execute_loop(self):
+        while True:
+            market_data_cache, cycle_errors, portfolio_summary, position_statuses, decisions = await self.execute_queue.get()
+            try:
+                is_cycle_successful, state_data = await self._run(
+                    'positions', self._locked(self._execute_and_snapshot),
+                    market_data_cache, position_statuses, decisions, cycle_errors
+                )
+                self.submit_state(state_data)
+                notifications = await self._run('io', self.stages['finish_cycle'], is_cycle_successful, cycle_errors, portfolio_summary)
+                for send, args in notifications:
+                    self.notify(send, *args)
+            except Exception as e:
+                print(f"[RUNTIME] Execute stage failed: {e}")
+                traceback.print_exc()
+            finally:
+                self.busy = False
+
+    def submit_state(self, state_data):
+        """Queues a state for persistence, replacing one that was not written yet."""
+        if state_data is None:
+            return
+        if self.persist_queue.full():
+            self.persist_queue.get_nowait()
+        self.persist_queue.put_nowait(state_data)
+
+    async def persist_loop(self):
+        while True:
+            state_data = await self.persist_queue.get()
+            try:
+                await self._run('io', self.stages['persist_state'], state_data)
+            except Exception as e:
+                print(f"[RUNTIME] Persist stage failed: {e}")
+
+    def notify(self, send, *args):
+        """Queues a notification. Never blocks; drops it if the queue is full."""
+        try:
+            self.notify_queue.put_nowait((send, args))
+        except asyncio.QueueFull:
+            print(f"[RUNTIME] Notification queue is full; dropping {getattr(send, '__name__', send)}.")
+
+    async def notify_loop(self):
+        while True:
+            send, args = await self.notify_queue.get()
+            try:
+                await self._run('notify', send, *args)
+            except Exception as e:
+                print(f"[RUNTIME] Notification {getattr(send, '__name__', send)} failed: {e}")
+
+    async def tp_sl_once(self):
+        """Fetches the prices on `io`, so only the price update and the check take the positions thread."""
+        prices = await self._run('io', self.stages['fetch_tp_sl_prices'])
+        if prices is not None:
+            await self._run('positions', self.stages['check_tp_sl_prices'], prices)
+
+    async def run(self, run_first_cycle=True):
+        self.decide_queue = asyncio.Queue(maxsize=1)
+        self.execute_queue = asyncio.Queue(maxsize=1)
+        self.persist_queue = asyncio.Queue(maxsize=1)
+        self.notify_queue = asyncio.Queue(maxsize=self.notify_queue_size)
+        self.busy = False
+
+        tasks = [
+            asyncio.create_task(self.decide_loop(), name="decide"),
+            asyncio.create_task(self.execute_loop(), name="execute"),
+            asyncio.create_task(self.persist_loop(), name="persist"),
+            asyncio.create_task(self.notify_loop(), name="notify"),
+        ]
+        if run_first_cycle:
+            await self.fetch_once()
+        tasks.append(asyncio.create_task(self._clock(self.cycle_job, self.fetch_once), name="cycle"))
+        if self.tp_sl_job:
+            tasks.append(asyncio.create_task(self._clock(self.tp_sl_job, self.tp_sl_once), name="tp_sl"))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for executor in self.executors.values():
+                executor.shutdown(wait=False, cancel_futures=True)
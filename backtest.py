@@ -0,0 +1,258 @@
+"""
+Event-driven backtester.
+Replays historical candles of one or more symbols in time order through the same
+streaming indicators, compiled engine rules, TP/SL triggers and SimulatedPortfolio
+accounting that the live worker uses. Each candle is treated as a closed cycle:
+update PnL -> check TP/SL -> decide -> execute, at the candle's close price.
+
+History files live in config.BACKTEST_DATA_DIR and are named like the candle store
+files (e.g. BTC_USDT_3m.csv). CSV rows are timestamp,open,high,low,close,volume;
+candle store JSON files (lists of rows) are accepted as well.
+
+Usage:
+    python backtest.py --download 30                 # fetch 30 days of history
+    python backtest.py --output equity.csv           # run strategy.json on it
+    python backtest.py --vector                      # same, with the vectorized backtest
+    python backtest.py --compare                     # check both backtests give the same trades
+"""
+
+import argparse
+import csv
+import heapq
+import itertools
+import json
+import math
+import os
+import time
+import ccxt
+import config
+import engine
+from indicators import IndicatorSet
+from market import build_summary
+from models import Decision, json_default
+from simulation import SimulatedPortfolio
+from stops import StopBook
+from trade import parse_command
+
+def history_file(symbol, timeframe, data_dir=config.BACKTEST_DATA_DIR, extension='csv'):
+    safe_symbol = symbol.replace('/', '_').replace(':', '_')
+    return os.path.join(data_dir, f"{safe_symbol}_{timeframe}.{extension}")
+
+def download_history(symbol, timeframe='3m', days=30, data_dir=config.BACKTEST_DATA_DIR):
+    """Downloads `days` of candles for a symbol from the exchange into a CSV history file."""
+    from exchange import get_client
+    client = get_client()
+    timeframe_ms = client.parse_timeframe(timeframe) * 1000
+    since = int(time.time() * 1000) - days * 24 * 60 * 60 * 1000
+    os.makedirs(data_dir, exist_ok=True)
+    file_path = history_file(symbol, timeframe, data_dir)
+    count = 0
+    with open(file_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        while True:
+            candles = client.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=1000)
+            # Drop the still-forming candle at the end
+            candles = [c for c in candles if c[0] + timeframe_ms <= time.time() * 1000]
+            if not candles:
+                break
+            writer.writerows(candles)
+            count += len(candles)
+            since = candles[-1][0] + timeframe_ms
+    print(f"[BACKTEST] Downloaded {count} candles for {symbol} into {file_path}")
+    return file_path
+
+def load_candles(symbol, timeframe='3m', data_dir=config.BACKTEST_DATA_DIR):
+    """Yields [timestamp, open, high, low, close, volume] rows for a symbol from its history file."""
+    csv_path = history_file(symbol, timeframe, data_dir)
+    if os.path.exists(csv_path):
+        with open(csv_path, 'r', newline='') as f:
+            reader = csv.reader(f)
+            next(reader, None) # Header
+            for row in reader:
+                yield [int(float(row[0]))] + [float(value) for value in row[1:6]]
+        return
+    json_path = history_file(symbol, timeframe, data_dir, extension='json')
+    with open(json_path, 'r') as f:
+        for row in json.load(f):
+            yield row
+
+def _tagged(candles, index):
+    for candle in candles:
+        yield candle[0], index, candle
+
+def _execute(portfolio, decision, symbol, market_data, close_quantity=None):
+    """
+    Executes an engine decision on the backtest portfolio, like trade.parse_and_execute does.
+    `close_quantity` closes only part of the position (partial take profit).
+    """
+    action, leverage = parse_command(decision.command)
+    if action == "hold":
+        return
+    side, quantity = portfolio.get_position_details(symbol)
+    params = {
+        'trade_amount_usd': decision.trade_amount_usd,
+        'leverage': leverage,
+        'reason': decision.reasoning,
+        'market_data': market_data,
+    }
+    if action in ["long", "short"] and side == "flat":
+        quantity = (params['trade_amount_usd'] * leverage) / market_data.current_price
+        portfolio.create_order(symbol, 'market', 'buy' if action == "long" else 'sell', quantity, params)
+    elif action == "close" and side != "flat":
+        params['reduceOnly'] = True
+        portfolio.create_order(symbol, 'market', 'sell' if side in ["long", "buy"] else 'buy', close_quantity or quantity, params)
+
+def run_backtest(strategy, candles_by_symbol, timeframe='3m', starting_balance=None,
+                 take_profit_pct=config.TAKE_PROFIT_PCT, stop_loss_pct=config.STOP_LOSS_PCT,
+                 atr_multiplier=config.ATR_MULTIPLIER, trailing_atr=config.TRAILING_STOP_ATR,
+                 breakeven_atr=config.BREAKEVEN_AFTER_ATR, partial_tp_pct=config.PARTIAL_TP_PCT,
+                 partial_tp_fraction=config.PARTIAL_TP_FRACTION):
+    """
+    Runs one strategy over the given candles. Exits use the same stops.StopBook as the worker.
+
+    Args:
+        strategy: A strategy dictionary in the strategy.json format.
+        candles_by_symbol: {symbol: iterable of [timestamp, open, high, low, close, volume]}, oldest first.
+
+    Returns:
+        A dictionary with the equity curve [(timestamp, equity)], the closed trades and statistics.
+    """
+    stops = StopBook(take_profit_pct, stop_loss_pct, atr_multiplier, trailing_atr, breakeven_atr, partial_tp_pct, partial_tp_fraction)
+    portfolio = SimulatedPortfolio(starting_balance=starting_balance, backtest=True, stops=stops)
+    starting_balance = portfolio.balance
+    symbols = list(candles_by_symbol)
+    indicator_sets = {symbol: IndicatorSet() for symbol in symbols}
+    decide = engine.compile_strategy(strategy).decide
+    last_market_data = {}
+    equity_curve = []
+
+    # Merge all symbols into one stream ordered by candle timestamp
+    streams = [_tagged(candles, index) for index, candles in enumerate(candles_by_symbol.values())]
+    current_timestamp = None
+    for timestamp, index, candle in heapq.merge(*streams):
+        if timestamp != current_timestamp:
+            if current_timestamp is not None:
+                equity_curve.append((current_timestamp, portfolio.get_portfolio_summary()['total_equity_usd']))
+            current_timestamp = timestamp
+
+        symbol = symbols[index]
+        values = indicator_sets[symbol].update(candle)
+        if math.isnan(values['ema_200']):
+            continue # Indicators are still warming up
+        market_data = build_summary(symbol, values, values['close'])
+        last_market_data[symbol] = market_data
+
+        # 1. Update PnL and check TP/SL
+        if symbol in portfolio.positions:
+            portfolio.update_open_positions({symbol: market_data}, from_tick=True)
+            trigger = portfolio.check_exit(symbol)
+            if trigger:
+                kind, reason, quantity = trigger
+                _execute(portfolio, Decision("close", 0, reason), symbol, market_data, quantity)
+
+        # 2. Decide and execute
+        decision = decide(market_data, portfolio.get_position_details(symbol), portfolio.get_portfolio_summary())
+        _execute(portfolio, decision, symbol, market_data)
+
+    # Close whatever is still open at the last known price so the statistics are complete
+    for symbol in list(portfolio.positions):
+        _execute(portfolio, Decision("close", 0, "End of backtest"), symbol, last_market_data[symbol])
+    if current_timestamp is not None:
+        equity_curve.append((current_timestamp, portfolio.get_portfolio_summary()['total_equity_usd']))
+
+    trades = [t for t in portfolio.trade_history if t['action'] == 'CLOSE']
+    return {
+        "equity_curve": equity_curve,
+        "trades": trades,
+        "statistics": compute_statistics(equity_curve, trades, starting_balance, timeframe),
+    }
+
+def compute_statistics(equity_curve, trades, starting_balance, timeframe='3m'):
+    """Summarizes a backtest: return, drawdown, Sharpe ratio and trade statistics."""
+    equities = [equity for _, equity in equity_curve] or [starting_balance]
+    final_equity = equities[-1]
+
+    peaks = itertools.accumulate(equities, max, initial=starting_balance)
+    next(peaks) # Skip the initial value
+    max_drawdown = max(0.0, max((peak - equity) / peak if peak > 0 else 0 for peak, equity in zip(peaks, equities)))
+
+    # Annualized Sharpe ratio from per-candle equity returns
+    returns = [(b - a) / a for a, b in zip(equities, equities[1:]) if a > 0]
+    sharpe = 0.0
+    if len(returns) > 1:
+        mean = sum(returns) / len(returns)
+        std = math.sqrt(sum((r - mean) ** 2 for r in returns) / (len(returns) - 1))
+        periods_per_year = 365 * 24 * 60 * 60 / ccxt.Exchange.parse_timeframe(timeframe)
+        sharpe = mean / std * math.sqrt(periods_per_year) if std > 0 else 0.0
+
+    pnls = [t['pnl_usd'] for t in trades]
+    gross_profit = sum(p for p in pnls if p > 0)
+    gross_loss = -sum(p for p in pnls if p < 0)
+    return {
+        "starting_balance": starting_balance,
+        "final_equity": round(final_equity, 2),
+        "total_return_pct": round((final_equity / starting_balance - 1) * 100, 2) if starting_balance else 0,
+        "max_drawdown_pct": round(max_drawdown * 100, 2),
+        "sharpe_ratio": round(sharpe, 3),
+        "trades": len(pnls),
+        "win_rate_pct": round(sum(1 for p in pnls if p > 0) / len(pnls) * 100, 2) if pnls else 0,
+        "profit_factor": round(gross_profit / gross_loss, 3) if gross_loss > 0 else None,
+        "avg_trade_pnl_usd": round(sum(pnls) / len(pnls), 4) if pnls else 0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest strategy.json on local candle history.")
+    parser.add_argument('--symbols', default=','.join(config.TRADING_SYMBOLS))
+    parser.add_argument('--timeframe', default='3m')
+    parser.add_argument('--data-dir', default=config.BACKTEST_DATA_DIR)
+    parser.add_argument('--strategy', default='strategy.json')
+    parser.add_argument('--balance', type=float, default=config.SIMULATION_STARTING_BALANCE)
+    parser.add_argument('--download', type=int, metavar='DAYS', help="Download DAYS of history first")
+    parser.add_argument('--output', help="Write the equity curve to this CSV file")
+    parser.add_argument('--trades', help="Write the closed trades to this JSON file")
+    parser.add_argument('--vector', action='store_true', help="Use the vectorized backtest (vector_backtest.py)")
+    parser.add_argument('--compare', action='store_true', help="Check that the event-driven and vectorized backtests match")
+    args = parser.parse_args()
+
+    symbols = [s.strip() for s in args.symbols.split(',')]
+    if args.download:
+        for symbol in symbols:
+            download_history(symbol, args.timeframe, args.download, args.data_dir)
+
+    with open(args.strategy, 'r') as f:
+        strategy = json.load(f)
+
+    if args.compare:
+        import vector_backtest
+        differences = vector_backtest.compare_backtests(
+            strategy, {symbol: load_candles(symbol, args.timeframe, args.data_dir) for symbol in symbols}, args.timeframe)
+        print("[BACKTEST] Event-driven and vectorized results match." if not differences else "\n".join(differences))
+        raise SystemExit(1 if differences else 0)
+
+    started = time.time()
+    if args.vector:
+        import vector_backtest
+        timestamps, ohlcv = vector_backtest.load_arrays(symbols, args.timeframe, args.data_dir)
+        started = time.time()
+        result = vector_backtest.run_vectorized_backtest(
+            strategy, timestamps, ohlcv, symbols, timeframe=args.timeframe, starting_balance=args.balance)
+    else:
+        result = run_backtest(
+            strategy,
+            {symbol: load_candles(symbol, args.timeframe, args.data_dir) for symbol in symbols},
+            timeframe=args.timeframe,
+            starting_balance=args.balance,
+        )
+    print(f"[BACKTEST] {len(result['equity_curve'])} time steps processed in {time.time() - started:.2f}s")
+    print(json.dumps(result['statistics'], indent=2))
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['timestamp', 'equity'])
+            writer.writerows(result['equity_curve'])
+    if args.trades:
+        with open(args.trades, 'w') as f:
+            json.dump(result['trades'], f, indent=2, default=json_default)
@@ -0,0 +1,443 @@
+"""
+Offline benchmark suite.
+Measures the hot paths of the bot against recorded candle fixtures and a mock
+ccxt client, so results are reproducible and need no network or API keys:
+
+- indicators: market.get_market_summary (candle store sync + streaming indicators)
+- decide:     engine.decide_action and the compiled engine's decide_all
+- portfolio:  SimulatedPortfolio.update_open_positions (PnL update + SQLite save)
+- trade_log:  trade_logger.log_trade (journal insert + text log)
+- main_job:   full worker.main_job cycles
+
+each at 5, 50 and 500 symbols by default. Fixtures are the backtest history files
+in --fixtures (see `python backtest.py --download`); symbols beyond the recorded
+ones reuse them with scaled prices. Without fixtures a seeded random walk is used.
+
+Everything the benchmark writes (candle store, SQLite files, logs) goes to a
+temporary directory, never to the live bot's files.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --symbols 5,50 --only decide,main_job --cycles 10
+    python benchmark.py --latency 20 --output bench.json   # simulate 20 ms per API call
+    python benchmark.py --only main_job --profile profiles  # profile the measured cycles
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS = ["indicators", "decide", "portfolio", "trade_log", "main_job"]
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class MockExchange:
+    """
+    ccxt-like client serving candles and tickers from in-memory series.
+    Candles become visible one at a time as the mock clock advances (one candle per
+    advance()), so repeated syncs download only the new candle, like in production.
+
+    It also trades like a one-way futures account, for exercising the live order path
+    offline: market orders fill at the last close, and reduce-only STOP_MARKET /
+    TAKE_PROFIT_MARKET orders trigger at their stopPrice when a new candle's range
+    reaches it (stop first if both do). Reduce-only orders never open or flip a
+    position; left without a position they expire. Order amounts are truncated to
+    `amount_step`, as ccxt does with the market's lot size.
+    """
+    def __init__(self, series, timeframe='3m', visible=300, latency=0.0, amount_step=0.001):
+        import ccxt
+        self.parse_timeframe = ccxt.Exchange.parse_timeframe
+        self.series = series
+        self.timeframe = timeframe
+        self.visible = visible # Index of the first candle that is not visible yet
+        self.latency = latency
+        self.calls = {}
+        self.positions = {} # symbol -> {"side", "contracts", "entryPrice", "leverage"}
+        self.open_orders = {} # order id -> trigger order
+        self.orders = {} # order id -> every order ever placed, for fetch_order
+        self.fills = [] # Every filled order, oldest first
+        self.leverage = {}
+        self.amount_step = amount_step # Lot size of every symbol
+        self._order_ids = 0
+
+    def _call(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def advance(self, candles=1):
+        for _ in range(candles):
+            self.visible += 1
+            self._trigger_orders()
+
+    def _trigger_orders(self):
+        for order in sorted(self.open_orders.values(), key=lambda o: o['type'] != 'STOP_MARKET'):
+            if order['id'] not in self.open_orders:
+                continue # Expired by an earlier fill in this candle
+            candle = self.series[order['symbol']][self.visible - 1]
+            high, low, stop = candle[2], candle[3], order['stopPrice']
+            rising = (order['type'] == 'STOP_MARKET') == (order['side'] == 'buy')
+            if (rising and high >= stop) or (not rising and low <= stop):
+                del self.open_orders[order['id']]
+                self._fill(order, stop)
+
+    def _fill(self, order, price):
+        symbol, side, amount = order['symbol'], order['side'], order['amount']
+        position = self.positions.get(symbol)
+        order.update(status='closed', average=price, filled=amount, timestamp=self.series[symbol][self.visible - 1][0])
+        if position and position['side'] != ('long' if side == 'buy' else 'short'):
+            amount = min(amount, position['contracts'])
+            position['contracts'] -= amount
+            if position['contracts'] <= 1e-12:
+                del self.positions[symbol]
+                for other in [o for o in self.open_orders.values() if o['symbol'] == symbol and o['reduceOnly']]:
+                    other['status'] = 'expired'
+                    del self.open_orders[other['id']]
+        elif order['reduceOnly']:
+            order.update(status='expired', filled=0)
+            return order
+        elif position:
+            total = position['contracts'] + amount
+            position['entryPrice'] = (position['entryPrice'] * position['contracts'] + price * amount) / total
+            position['contracts'] = total
+        else:
+            self.positions[symbol] = {"side": 'long' if side == 'buy' else 'short', "contracts": amount,
+                                      "entryPrice": price, "leverage": self.leverage.get(symbol, 1)}
+        order['filled'] = amount
+        self.fills.append(order)
+        return order
+
+    def load_markets(self, reload=False, params={}):
+        return {}
+
+    def amount_to_precision(self, symbol, amount):
+        # Truncates to the lot size and rejects what truncates to zero, like ccxt does for binance
+        import ccxt
+        rounded = round(math.floor(amount / self.amount_step + 1e-9) * self.amount_step, 12)
+        if rounded <= 0:
+            raise ccxt.InvalidOrder(f"{symbol} amount of {amount} must be greater than minimum amount precision of {self.amount_step}")
+        return repr(rounded)
+
+    def set_leverage(self, leverage, symbol, params={}):
+        self._call('set_leverage')
+        self.leverage[symbol] = leverage
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        self._call('create_order')
+        amount = float(self.amount_to_precision(symbol, amount)) # ccxt rounds the amount before sending it
+        self._order_ids += 1
+        order = {"id": str(self._order_ids), "symbol": symbol, "type": type.upper(), "side": side, "amount": amount,
+                 "stopPrice": params.get('stopPrice'), "reduceOnly": bool(params.get('reduceOnly')), "status": 'open'}
+        self.orders[order['id']] = order
+        if order['type'] == 'MARKET':
+            return dict(self._fill(order, self.series[symbol][self.visible - 1][4]))
+        self.open_orders[order['id']] = order
+        return dict(order)
+
+    def cancel_order(self, id, symbol=None, params={}):
+        import ccxt
+        self._call('cancel_order')
+        order = self.open_orders.pop(id, None)
+        if order is None:
+            raise ccxt.OrderNotFound(f"Unknown order {id}")
+        order['status'] = 'canceled'
+        return dict(order)
+
+    def fetch_order(self, id, symbol=None, params={}):
+        import ccxt
+        self._call('fetch_order')
+        if id not in self.orders:
+            raise ccxt.OrderNotFound(f"Unknown order {id}")
+        return dict(self.orders[id])
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        self._call('fetch_open_orders')
+        return [dict(o) for o in self.open_orders.values() if symbol is None or o['symbol'] == symbol]
+
+    def fetch_positions(self, symbols=None, params={}):
+        self._call('fetch_positions')
+        positions = []
+        for symbol, position in self.positions.items():
+            mark = self.series[symbol][self.visible - 1][4]
+            direction = 1 if position['side'] == 'long' else -1
+            positions.append(dict(position, symbol=f"{symbol}:USDT", markPrice=mark,
+                                  unrealizedPnl=(mark - position['entryPrice']) * position['contracts'] * direction))
+        return positions
+
+    def fetch_ohlcv(self, symbol, timeframe='3m', since=None, limit=None, params={}):
+        self._call('fetch_ohlcv')
+        candles = self.series[symbol][:self.visible]
+        if since is not None:
+            candles = [c for c in candles[-(limit or len(candles)) - 1:] if c[0] >= since][:limit]
+        elif limit:
+            candles = candles[-limit:]
+        return [list(c) for c in candles]
+
+    def _ticker(self, symbol):
+        last = self.series[symbol][self.visible - 1]
+        return {"symbol": symbol, "last": last[4], "close": last[4], "timestamp": last[0]}
+
+    def fetch_ticker(self, symbol, params={}):
+        self._call('fetch_ticker')
+        return self._ticker(symbol)
+
+    def fetch_tickers(self, symbols=None, params={}):
+        self._call('fetch_tickers')
+        return {symbol: self._ticker(symbol) for symbol in (symbols or self.series)}
+
+def load_fixtures(symbols, count, timeframe, data_dir, length, seed=7):
+    """
+    Returns {symbol: candles} for `count` benchmark symbols. The candles are shifted
+    in time so the last one closed a few candles before now (the market code drops
+    candles that are still forming).
+    """
+    import backtest
+    recorded = []
+    for symbol in symbols:
+        try:
+            recorded.append(list(backtest.load_candles(symbol, timeframe, data_dir))[-length:])
+        except OSError:
+            pass
+    recorded = [candles for candles in recorded if len(candles) >= length]
+    if not recorded:
+        print(f"[BENCH] No fixtures with {length} candles in '{data_dir}'; using a seeded random walk.")
+        rng = random.Random(seed)
+        price, candles = 100.0, []
+        for i in range(length):
+            close = price * (1 + rng.gauss(0, 0.002))
+            candles.append([i, price, max(price, close) * 1.001, min(price, close) * 0.999, close, rng.uniform(10, 100)])
+            price = close
+        recorded = [candles]
+
+    timeframe_ms = MockExchange({}).parse_timeframe(timeframe) * 1000
+    end = (int(time.time() * 1000) // timeframe_ms - 2) * timeframe_ms
+    start = end - (length - 1) * timeframe_ms
+    series = {}
+    for i in range(count):
+        base = recorded[i % len(recorded)]
+        scale = 1 + (i // len(recorded)) * 0.01 # Same shape, slightly different prices
+        series[f"BENCH{i:03d}/USDT"] = [
+            [start + j * timeframe_ms] + [v * scale for v in c[1:5]] + [c[5]] for j, c in enumerate(base)
+        ]
+    return series
+
+def summarize(name, symbols, timings, operations):
+    """Turns per-iteration timings into throughput and latency figures."""
+    total = sum(timings)
+    per_op = total / operations if operations else 0
+    return {
+        "benchmark": name,
+        "symbols": symbols,
+        "iterations": len(timings),
+        "total_s": round(total, 4),
+        "per_op_us": round(per_op * 1e6, 2),
+        "ops_per_s": round(operations / total, 1) if total else None,
+        "median_iteration_ms": round(statistics.median(timings) * 1000, 3),
+        "p95_iteration_ms": round(sorted(timings)[math.ceil(len(timings) * 0.95) - 1] * 1000, 3), # Nearest rank
+    }
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    """Silences the modules' print output so it doesn't dominate the measurements."""
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def bench_indicators(client, symbols, cycles):
+    import market
+    # First sync seeds the candle stores and indicator sets; it is not measured
+    for symbol in symbols:
+        market.get_market_summary(symbol, interval=client.timeframe, client=client, closed_only=True)
+    timings = []
+    for _ in range(cycles):
+        client.advance()
+        started = time.perf_counter()
+        for symbol in symbols:
+            market.get_market_summary(symbol, interval=client.timeframe, client=client, closed_only=True)
+        timings.append(time.perf_counter() - started)
+    return [summarize("indicators", len(symbols), timings, len(symbols) * cycles)]
+
+def bench_decide(client, symbols, cycles, strategy):
+    import engine
+    import market
+    summaries = {s: market.get_market_summary(s, interval=client.timeframe, client=client) for s in symbols}
+    portfolio_summary = {"available_balance_usd": 1000.0, "total_equity_usd": 1000.0,
+                         "unrealized_pnl_usd": 0.0, "open_positions_count": 0}
+    rng = random.Random(1)
+    statuses = {s: rng.choice([("flat", 0), ("long", 1.0), ("short", 1.0)]) for s in symbols}
+    repeat = max(1, 20000 // len(symbols)) # Enough decisions per iteration to be measurable
+
+    timings = []
+    for _ in range(cycles):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for symbol in symbols:
+                engine.decide_action(strategy, summaries[symbol], statuses[symbol], portfolio_summary)
+        timings.append(time.perf_counter() - started)
+    results = [summarize("decide_action", len(symbols), timings, len(symbols) * repeat * cycles)]
+
+    compiled = engine.compile_strategy(strategy)
+    timings = []
+    for _ in range(cycles):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            compiled.decide_all(summaries, statuses, portfolio_summary)
+        timings.append(time.perf_counter() - started)
+    results.append(summarize("decide_all (compiled)", len(symbols), timings, len(symbols) * repeat * cycles))
+    return results
+
+def bench_portfolio(client, symbols, cycles):
+    import config
+    import market
+    from simulation import SimulatedPortfolio
+    from models import MarketSnapshot
+    state_db, config.SIMULATION_STATE_DB = config.SIMULATION_STATE_DB, f"bench_portfolio_{len(symbols)}.db"
+    try:
+        portfolio = SimulatedPortfolio(starting_balance=len(symbols) * 100.0)
+    finally:
+        config.SIMULATION_STATE_DB = state_db
+    for i, symbol in enumerate(symbols):
+        summary = market.get_market_summary(symbol, interval=client.timeframe, client=client)
+        quantity = 10.0 / summary.current_price
+        portfolio.create_order(symbol, 'market', 'buy' if i % 2 else 'sell', quantity,
+                               {'trade_amount_usd': 10.0, 'leverage': 10, 'reason': 'benchmark', 'market_data': summary})
+    timings = []
+    for _ in range(cycles):
+        client.advance()
+        cache = {s: MarketSnapshot(s, client.fetch_ticker(s)["last"]) for s in symbols}
+        started = time.perf_counter()
+        portfolio.update_open_positions(cache)
+        timings.append(time.perf_counter() - started)
+    portfolio.store.close()
+    return [summarize("portfolio update+save", len(symbols), timings, cycles)]
+
+def bench_trade_log(client, symbols, cycles):
+    import trade_logger
+    timings = []
+    for cycle in range(cycles):
+        started = time.perf_counter()
+        for symbol in symbols:
+            trade_logger.log_trade({
+                "action": "CLOSE", "symbol": symbol, "side": "long", "reason": "benchmark",
+                "quantity": 1.0, "leverage": 10, "margin": 10.0, "entry_price": 100.0,
+                "exit_price": 101.0, "pnl_usd": 0.1, "pnl_pct": 1.0,
+                "market_data": {"current_price": 101.0, "rsi_14": 55.0, "cycle": cycle},
+            })
+        timings.append(time.perf_counter() - started)
+    return [summarize("log_trade", len(symbols), timings, len(symbols) * cycles)]
+
+def bench_main_job(client, symbols, cycles, profile_dir=None):
+    import config
+    import exchange
+    import worker
+    config.TRADING_SYMBOLS = list(symbols)
+    exchange._client = client
+    worker.main_job() # Warm-up: seeds candle stores and indicator sets
+    if profile_dir:
+        # Same hook as WORKER_PROFILE / SIGUSR1 on the live worker (see profiling.py)
+        worker.profiler.directory = os.path.join(profile_dir, f"{len(symbols)}_symbols")
+        worker.profiler.arm(cycles)
+    timings = []
+    for _ in range(cycles):
+        client.advance()
+        started = time.perf_counter()
+        worker.main_job()
+        timings.append(time.perf_counter() - started)
+    return [summarize("main_job cycle", len(symbols), timings, cycles)]
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    # Point every path the bot writes to into the temporary directory before config is imported
+    os.environ.update({
+        "IPC_DIR": os.path.join(workdir, "ipc"),
+        "CANDLE_STORE_DIR": os.path.join(workdir, "candles"),
+        "SIMULATION_STATE_DB": os.path.join(workdir, "simulation_state.db"),
+        "TRADE_JOURNAL_DB": os.path.join(workdir, "trade_journal.db"),
+        "SIMULATION_MODE": "True",
+        "MARKET_FEED_MODE": "rest",
+        "SMTP_SERVER": "",
+        "NOTIFY_WEBHOOK_URL": "",
+    })
+    fixtures_dir = os.path.abspath(args.fixtures)
+    profile_dir = os.path.abspath(args.profile) if args.profile else None
+    with open(os.path.abspath(args.strategy), 'r') as f:
+        strategy = json.load(f)
+    shutil.copy(os.path.abspath(args.strategy), os.path.join(workdir, "strategy.json"))
+    sys.path.insert(0, REPO_DIR)
+    os.chdir(workdir) # trading_log.txt, portfolio_state.json, ... are relative paths
+
+    import candle_store
+    import config
+    import indicators
+    sizes = [int(n) for n in args.symbols.split(',')]
+    selected = args.only.split(',') if args.only else BENCHMARKS
+    series = load_fixtures(config.TRADING_SYMBOLS, max(sizes), args.timeframe, fixtures_dir, args.candles + args.cycles * 2 + 10)
+
+    results = []
+    try:
+        for size in sizes:
+            for name in selected:
+                symbols = list(series)[:size]
+                client = MockExchange({s: series[s] for s in symbols}, args.timeframe, visible=args.candles, latency=args.latency / 1000)
+                # Fresh candle stores and indicator sets per run, so sizes don't share warm state
+                candle_store._stores.clear()
+                indicators._sets.clear()
+                with quiet(not args.verbose):
+                    if name == "indicators":
+                        found = bench_indicators(client, symbols, args.cycles)
+                    elif name == "decide":
+                        found = bench_decide(client, symbols, args.cycles, strategy)
+                    elif name == "portfolio":
+                        found = bench_portfolio(client, symbols, args.cycles)
+                    elif name == "trade_log":
+                        found = bench_trade_log(client, symbols, args.cycles)
+                    else:
+                        found = bench_main_job(client, symbols, args.cycles, profile_dir)
+                for result in found:
+                    result["api_calls"] = dict(client.calls)
+                    results.append(result)
+                    print(f"[BENCH] {result['benchmark']:<24} {size:>4} symbols: {result['per_op_us']:>12.2f} us/op "
+                          f"{result['ops_per_s'] or 0:>12.1f} ops/s  median {result['median_iteration_ms']:>9.3f} ms "
+                          f"p95 {result['p95_iteration_ms']:>9.3f} ms")
+    finally:
+        os.chdir(REPO_DIR)
+        if args.keep:
+            print(f"[BENCH] Benchmark files kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the bot's hot paths against a mock exchange.")
+    parser.add_argument('--symbols', default="5,50,500", help="Comma-separated symbol counts")
+    parser.add_argument('--only', help=f"Comma-separated benchmarks from {BENCHMARKS}")
+    parser.add_argument('--cycles', type=int, default=5, help="Measured iterations per benchmark")
+    parser.add_argument('--candles', type=int, default=300, help="Candles of history visible at the start")
+    parser.add_argument('--timeframe', default='3m')
+    parser.add_argument('--fixtures', default=os.environ.get("BACKTEST_DATA_DIR", "history"), help="Directory with recorded candle history")
+    parser.add_argument('--strategy', default='strategy.json')
+    parser.add_argument('--latency', type=float, default=0.0, help="Simulated latency per API call (ms)")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--profile', metavar='DIR', help="Write cProfile dumps of the measured main_job cycles to DIR")
+    parser.add_argument('--keep', action='store_true', help="Keep the temporary benchmark directory")
+    parser.add_argument('--verbose', action='store_true', help="Show the modules' own output")
+    args = parser.parse_args()
+    if args.only:
+        for name in args.only.split(','):
+            if name not in BENCHMARKS:
+                parser.error(f"Unknown benchmark '{name}'. Choose from {BENCHMARKS}")
+
+    results = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"generated_at": time.strftime('%Y-%m-%d %H:%M:%S'), "arguments": vars(args), "results": results}, f, indent=2)
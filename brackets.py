@@ -0,0 +1,166 @@
+"""
+Exchange-side TP/SL for live mode.
+
+When a live position opens, BracketManager places two reduce-only trigger orders
+on the exchange, at the same levels check_exit_triggers uses in simulation
+(see engine.get_exit_prices):
+
+    STOP_MARKET         at the ATR stop (atr_at_entry x ATR_MULTIPLIER), or the
+                        STOP_LOSS_PCT fallback when no ATR is known
+    TAKE_PROFIT_MARKET  at TAKE_PROFIT_PCT of the position margin
+
+The exchange then closes the position as soon as a level trades, instead of at
+the next TP/SL poll. Binance can't amend trigger orders, so a changed position is
+re-bracketed by cancel and replace; closing a position cancels its brackets.
+sync() runs once per cycle against the position cache and cleans up after a
+bracket fired (the other leg is left over) or a position changed outside the bot.
+A leg that filled on the exchange is journaled as a CLOSE (trade_logger.log_trade),
+like an exit the bot made itself.
+"""
+import threading
+import time
+import ccxt
+import config
+import engine
+import metrics
+from exchange import amount_to_precision
+from position_cache import normalize_symbol
+from trade_logger import log_trade
+
+# Order types of the two legs, by exit kind
+BRACKET_ORDER_TYPES = {"stop_loss": "STOP_MARKET", "take_profit": "TAKE_PROFIT_MARKET"}
+
+class BracketManager:
+    def __init__(self, client_factory, take_profit_pct=config.TAKE_PROFIT_PCT,
+                 stop_loss_pct=config.STOP_LOSS_PCT, atr_multiplier=config.ATR_MULTIPLIER):
+        self.client_factory = client_factory
+        self.take_profit_pct = take_profit_pct
+        self.stop_loss_pct = stop_loss_pct
+        self.atr_multiplier = atr_multiplier
+        self.brackets = {} # normalized symbol -> {"symbol", "side", "quantity", "position", "orders": {kind: {"id", "price"}}}
+        self._lock = threading.RLock()
+
+    def protects(self, symbol):
+        """True if both legs of the symbol's bracket are on the exchange."""
+        bracket = self.brackets.get(normalize_symbol(symbol))
+        return bool(bracket) and len(bracket['orders']) == len(BRACKET_ORDER_TYPES)
+
+    def place(self, symbol, position):
+        """Places the SL and TP orders for `position`, replacing the symbol's current bracket."""
+        if not position or not position.quantity or not position.margin:
+            return
+        client = self.client_factory()
+        take_profit_price, stop_loss_price = engine.get_exit_prices(
+            position, self.take_profit_pct, self.stop_loss_pct, self.atr_multiplier
+        )
+        prices = {"stop_loss": stop_loss_price, "take_profit": take_profit_price}
+        close_side = 'sell' if position.is_long else 'buy'
+        # The size the exchange gives the orders; sync() compares positions against it
+        quantity = amount_to_precision(client, symbol, position.quantity)
+        with self._lock:
+            self.cancel(symbol)
+            orders = {}
+            for kind, order_type in BRACKET_ORDER_TYPES.items():
+                try:
+                    order = client.create_order(symbol, order_type, close_side, quantity, None,
+                                                {'stopPrice': prices[kind], 'reduceOnly': True})
+                    orders[kind] = {"id": order['id'], "price": prices[kind]}
+                    metrics.ORDERS.inc(action=f"place_{kind}")
+                except Exception as e:
+                    print(f"[BRACKETS] [{symbol}] Could not place {order_type} at {prices[kind]:.4f}: {e}")
+                    metrics.ERRORS.inc(stage="brackets")
+            self.brackets[normalize_symbol(symbol)] = {
+                "symbol": symbol, "side": position.side, "quantity": quantity, "orders": orders,
+                "position": position.copy(), # Entry price, leverage and margin for journaling a fired leg
+            }
+        print(f"[BRACKETS] [{symbol}] {position.side.upper()} {quantity}: "
+              f"SL {stop_loss_price:.4f} / TP {take_profit_price:.4f} on the exchange ({len(orders)}/2 placed).")
+
+    def cancel(self, symbol):
+        """Cancels the symbol's bracket orders. Orders that already filled or are gone are ignored."""
+        with self._lock:
+            bracket = self.brackets.pop(normalize_symbol(symbol), None)
+        if not bracket or not bracket['orders']:
+            return
+        client = self.client_factory()
+        for kind, order in bracket['orders'].items():
+            try:
+                client.cancel_order(order['id'], bracket['symbol'])
+                metrics.ORDERS.inc(action=f"cancel_{kind}")
+            except ccxt.OrderNotFound:
+                pass # Filled (this leg closed the position) or already cancelled
+            except Exception as e:
+                print(f"[BRACKETS] [{symbol}] Could not cancel {kind} order {order['id']}: {e}")
+                metrics.ERRORS.inc(stage="brackets")
+
+    def _cancel_untracked(self, symbol):
+        """Cancels reduce-only trigger orders we don't track, e.g. placed before a restart."""
+        try:
+            client = self.client_factory()
+            for order in client.fetch_open_orders(symbol):
+                order_type = str(order.get('type') or order.get('info', {}).get('type', '')).upper()
+                if order_type in BRACKET_ORDER_TYPES.values() and order.get('reduceOnly'):
+                    client.cancel_order(order['id'], symbol)
+        except Exception as e:
+            print(f"[BRACKETS] [{symbol}] Could not check open orders: {e}")
+
+    def _journal_fills(self, bracket):
+        """Journals a CLOSE for every leg of `bracket` that (partly) filled on the exchange."""
+        client = self.client_factory()
+        position = bracket['position']
+        direction = 1 if position.is_long else -1
+        for kind, tracked in bracket['orders'].items():
+            try:
+                order = client.fetch_order(tracked['id'], bracket['symbol'])
+            except Exception as e:
+                print(f"[BRACKETS] [{bracket['symbol']}] Could not fetch {kind} order {tracked['id']}: {e}")
+                metrics.ERRORS.inc(stage="brackets")
+                continue
+            quantity = float(order.get('filled') or 0)
+            if quantity <= 0:
+                continue
+            exit_price = float(order.get('average') or order.get('price') or tracked['price'])
+            pnl = (exit_price - position.entry_price) * quantity * direction
+            margin = position.margin * min(1.0, quantity / position.quantity) if position.quantity else position.margin
+            timestamp = order.get('lastTradeTimestamp') or order.get('timestamp')
+            print(f"[BRACKETS] [{bracket['symbol']}] {kind.replace('_', ' ').title()} filled on the exchange at {exit_price:.4f}, PnL: {pnl:.4f}")
+            log_trade({
+                'time': timestamp / 1000 if timestamp else time.time(),
+                'action': 'CLOSE',
+                'symbol': bracket['symbol'],
+                'reason': f"Exchange {BRACKET_ORDER_TYPES[kind]} order filled",
+                'side': position.side,
+                'quantity': quantity,
+                'leverage': position.leverage,
+                'margin': margin,
+                'entry_price': position.entry_price,
+                'exit_price': exit_price,
+                'pnl_usd': pnl,
+                'pnl_pct': pnl / margin * 100 if margin > 0 else 0,
+            })
+
+    def sync(self, open_positions):
+        """
+        Brings the brackets in line with `open_positions` ({symbol: position}, e.g. from
+        the position cache). Cancels brackets of closed positions and re-places
+        brackets that are missing a leg or belong to a different side or size. Sizes
+        are compared at the symbol's lot-size precision, like the orders were placed.
+        Legs that filled in the meantime are journaled before their bracket is dropped.
+        """
+        open_keys = {normalize_symbol(symbol): position for symbol, position in open_positions.items()}
+        with self._lock:
+            for key, bracket in list(self.brackets.items()):
+                if key not in open_keys:
+                    print(f"[BRACKETS] [{bracket['symbol']}] Position is closed; cancelling its remaining bracket orders.")
+                    self._journal_fills(bracket)
+                    self.cancel(bracket['symbol'])
+            for symbol, position in open_positions.items():
+                bracket = self.brackets.get(normalize_symbol(symbol))
+                if bracket is None:
+                    self._cancel_untracked(symbol)
+                elif bracket['side'] == position.side and self.protects(symbol) and \
+                        bracket['quantity'] == amount_to_precision(self.client_factory(), symbol, position.quantity):
+                    continue
+                else:
+                    self._journal_fills(bracket) # A leg may have partly closed the position
+                self.place(symbol, position)
@@ -0,0 +1,149 @@
+import config
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from exchange import get_client
+
+# One store per (symbol, timeframe), shared by everything in the process
+_stores = {}
+_stores_lock = threading.Lock()
+
+class CandleStore:
+    """
+    Keeps the most recent OHLCV candles of one symbol/timeframe in an in-memory ring
+    buffer, backed by a JSON-lines file on disk so history survives restarts.
+    Each sync only downloads candles since the last stored timestamp and patches the
+    still-forming last candle in place, instead of re-downloading the whole history.
+    New candles are appended to the file (a patched candle is appended again and wins
+    on load); the file is rewritten only when it grows past twice the buffer size.
+    """
+    def __init__(self, symbol, timeframe, capacity=config.CANDLE_STORE_SIZE, directory=config.CANDLE_STORE_DIR):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.capacity = capacity
+        safe_symbol = symbol.replace('/', '_').replace(':', '_')
+        self.file_path = os.path.join(directory, f"{safe_symbol}_{timeframe}.jsonl")
+        self.candles = deque(maxlen=capacity)
+        self._file_lines = 0 # Lines in the file, including superseded ones
+        self._lock = threading.Lock()
+        self._load()
+        # History on disk may be shorter than the buffer; back-fill it on the first sync
+        self._needs_backfill = len(self.candles) < capacity
+
+    def _load(self):
+        try:
+            with open(self.file_path, 'r') as f:
+                for line in f:
+                    self._file_lines += 1
+                    try:
+                        candle = json.loads(line)
+                    except ValueError:
+                        continue # Partly written line from a process that died mid-append
+                    self._merge([candle])
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[CANDLES] Could not read {self.file_path}, starting empty: {e}")
+
+    def _append(self, candles):
+        if not candles:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.file_path) or '.', exist_ok=True)
+            # One write per sync, so lines from the worker and the strategist don't interleave
+            with open(self.file_path, 'a') as f:
+                f.write(''.join(json.dumps(candle) + '\n' for candle in candles))
+            self._file_lines += len(candles)
+        except Exception as e:
+            print(f"[CANDLES] Could not write {self.file_path}: {e}")
+
+    def _rewrite(self):
+        directory = os.path.dirname(self.file_path) or '.'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Per-writer temp file: other processes sharing the directory never see it half-written
+            fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.file_path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(''.join(json.dumps(candle) + '\n' for candle in self.candles))
+                os.replace(tmp_file, self.file_path)
+            except BaseException:
+                os.unlink(tmp_file)
+                raise
+            self._file_lines = len(self.candles)
+        except Exception as e:
+            print(f"[CANDLES] Could not write {self.file_path}: {e}")
+
+    def resize(self, capacity):
+        """Grows the ring buffer; the next sync back-fills the missing history."""
+        with self._lock:
+            if capacity > self.capacity:
+                self.capacity = capacity
+                self.candles = deque(self.candles, maxlen=capacity)
+                self._needs_backfill = True
+
+    def _merge(self, new_candles):
+        """Adds candles to the buffer and returns the ones that were added or patched."""
+        merged = []
+        for candle in new_candles:
+            if self.candles and candle[0] == self.candles[-1][0]:
+                self.candles[-1] = candle # Patch the still-forming candle
+            elif not self.candles or candle[0] > self.candles[-1][0]:
+                self.candles.append(candle)
+            else:
+                continue
+            merged.append(candle)
+        return merged
+
+    def sync(self, client=None):
+        """
+        Fetches candles newer than the last stored one. Falls back to a full download
+        when the store needs back-filling or the gap is larger than the buffer.
+        """
+        client = client or get_client()
+        with self._lock:
+            timeframe_ms = client.parse_timeframe(self.timeframe) * 1000
+            now_ms = time.time() * 1000
+            needs_full_fetch = (
+                self._needs_backfill
+                or not self.candles
+                or now_ms - self.candles[-1][0] > timeframe_ms * self.capacity
+            )
+            if needs_full_fetch:
+                new_candles = client.fetch_ohlcv(self.symbol, timeframe=self.timeframe, limit=self.capacity)
+                self.candles.clear()
+                self._needs_backfill = False
+                self._merge(new_candles)
+                self._rewrite()
+                return
+            new_candles = client.fetch_ohlcv(self.symbol, timeframe=self.timeframe, since=self.candles[-1][0], limit=self.capacity)
+            self._append(self._merge(new_candles))
+            if self._file_lines > 2 * self.capacity:
+                self._rewrite() # Drop candles that fell out of the buffer and superseded patches
+
+    def get(self, limit):
+        """Returns the last `limit` candles (oldest first) as [timestamp, open, high, low, close, volume] rows."""
+        with self._lock:
+            if limit >= len(self.candles):
+                return list(self.candles)
+            return list(self.candles)[-limit:]
+
+def get_store(symbol, timeframe, capacity=config.CANDLE_STORE_SIZE):
+    """Returns the shared CandleStore for a symbol/timeframe, creating it on first use."""
+    key = (symbol, timeframe)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = CandleStore(symbol, timeframe, capacity=max(capacity, config.CANDLE_STORE_SIZE))
+            _stores[key] = store
+    store.resize(capacity)
+    return store
+
+def get_candles(symbol, timeframe, limit, client=None):
+    """Syncs the candle store for a symbol/timeframe and returns its last `limit` candles."""
+    store = get_store(symbol, timeframe, capacity=limit)
+    store.sync(client)
+    return store.get(limit)
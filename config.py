@@ -23,13 +23,58 @@ BINANCE_API_SECRET = os.getenv("BINANCE_TESTNET_API_SECRET")
 symbols_from_env = os.getenv("TRADING_SYMBOLS", "BTC/USDT,ETH/USDT,DOGE/USDT,SOL/USDT,XRP/USDT")
 TRADING_SYMBOLS = [symbol.strip() for symbol in symbols_from_env.split(',')]
 
+# Market veri çekme ayarları
+MARKET_FETCH_CONCURRENCY = int(os.getenv("MARKET_FETCH_CONCURRENCY", 8)) # Aynı anda veri çekilen sembol sayısı (1 = sıralı)
+MARKET_FETCH_TIMEOUT = float(os.getenv("MARKET_FETCH_TIMEOUT", 10.0))    # Sembol başına zaman aşımı (saniye)
+MARKET_SNAPSHOT_FUNDING = os.getenv("MARKET_SNAPSHOT_FUNDING", "False").lower() in ('true', '1', 't') # Fonlama oranlarını da çek (vadeli sözleşmeler için tek ek istek)
+MARKETS_CACHE_FILE = os.getenv("MARKETS_CACHE_FILE", "markets_cache_{mode}.json") # Borsa market bilgileri için disk önbelleği
+MARKETS_CACHE_TTL = int(os.getenv("MARKETS_CACHE_TTL", 6 * 60 * 60))      # Önbellek geçerlilik süresi (saniye)
+CANDLE_STORE_DIR = os.getenv("CANDLE_STORE_DIR", "candles")               # Mum verilerinin diskte tutulduğu klasör
+CANDLE_STORE_SIZE = int(os.getenv("CANDLE_STORE_SIZE", 500))              # Sembol/zaman dilimi başına bellekte tutulan mum sayısı
+
+# Canlı fiyat akışı ayarları (TP/SL'in her fiyat değişiminde kontrol edilmesi için)
+MARKET_FEED_MODE = os.getenv("MARKET_FEED_MODE", "rest").lower()          # "rest" (kapalı), "websocket" veya "replay"
+MARKET_FEED_WS_URL = os.getenv("MARKET_FEED_WS_URL", "wss://stream.binance.com:9443/stream")
+MARKET_FEED_RECORD_FILE = os.getenv("MARKET_FEED_RECORD_FILE")           # Gelen mesajları tekrar oynatmak için kaydet (opsiyonel)
+MARKET_FEED_REPLAY_FILE = os.getenv("MARKET_FEED_REPLAY_FILE", "feed_replay.jsonl")
+MARKET_FEED_REPLAY_SPEED = float(os.getenv("MARKET_FEED_REPLAY_SPEED", 0)) or None # 0 = olabildiğince hızlı
+
 
 if not BINANCE_API_KEY:
     print("UYARI: API anahtarları .env dosyasında eksik!")
 
+# Zamanlayıcı Ayarları
+DECISION_TIMEFRAME = os.getenv("DECISION_TIMEFRAME", "3m")                 # Karar döngüsünün çalıştığı mum zaman dilimi
+CANDLE_SETTLE_DELAY = float(os.getenv("CANDLE_SETTLE_DELAY", 3.0))         # Mum kapanışından sonra beklenen süre (saniye), borsanın mumu kesinleştirmesi için
+TPSL_CHECK_INTERVAL = float(os.getenv("TPSL_CHECK_INTERVAL", 10.0))        # Kararlardan bağımsız TP/SL kontrol sıklığı (saniye, 0 = kapalı)
+WORKER_RUNTIME = os.getenv("WORKER_RUNTIME", "asyncio").lower()            # "asyncio" (aşamalar ayrı görevler) veya "threads" (tek döngü)
+
+# Profil Ayarları (canlı döngülerin profilini çıkarmak için; SIGUSR1 sinyali de profillemeyi başlatır)
+WORKER_PROFILE = os.getenv("WORKER_PROFILE", "False").lower() in ('true', '1', 't') # Açılışta ilk PROFILE_CYCLES döngünün profilini çıkar
+PROFILE_CYCLES = int(os.getenv("PROFILE_CYCLES", 5))                      # Her tetiklemede profillenen döngü sayısı
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")                         # Profil dosyalarının yazıldığı klasör
+PROFILER = os.getenv("PROFILER", "cprofile").lower()                       # "cprofile" veya "pyinstrument" (kuruluysa)
+
 # Simülasyon Ayarları
 SIMULATION_MODE = os.getenv("SIMULATION_MODE", "True").lower() in ('true', '1', 't')
 SIMULATION_STARTING_BALANCE = float(os.getenv("SIMULATION_STARTING_BALANCE", 1000.0))
+SIMULATION_STATE_DB = os.getenv("SIMULATION_STATE_DB", "simulation_state.db") # Simülasyon portföy durumu (SQLite, WAL modu)
+TRADE_JOURNAL_DB = os.getenv("TRADE_JOURNAL_DB", "trade_journal.db") # Yapılandırılmış işlem günlüğü (SQLite); trading_log.txt bunun okunabilir görünümü
+
+# Canlı Pozisyon Önbelleği Ayarları (canlı modda fetch_positions her döngüde bir kez çağrılır)
+POSITION_CACHE_MAX_AGE = float(os.getenv("POSITION_CACHE_MAX_AGE", 30.0))     # Bu süreden eski pozisyonlar okunurken yenilenir (saniye)
+POSITION_CACHE_MAX_STALE = float(os.getenv("POSITION_CACHE_MAX_STALE", 120.0)) # Yenileme başarısızsa en fazla bu kadar eski veri kullanılır (saniye)
+POSITION_FILL_GRACE = float(os.getenv("POSITION_FILL_GRACE", 10.0))           # Kendi emrimizin borsada görünmesi için beklenen süre (saniye)
+EXCHANGE_BRACKETS = os.getenv("EXCHANGE_BRACKETS", "True").lower() in ('true', '1', 't') # Canlı modda TP/SL borsada STOP_MARKET/TAKE_PROFIT_MARKET emri olarak bekler
+
+# Web Arayüzü Ayarları
+DASHBOARD_PUSH_INTERVAL = float(os.getenv("DASHBOARD_PUSH_INTERVAL", 1.0)) # Web arayüzüne değişikliklerin gönderilme sıklığı (saniye)
+DASHBOARD_MAX_STREAMS = int(os.getenv("DASHBOARD_MAX_STREAMS", 4))        # Aynı anda açık /api/stream bağlantısı sınırı; her biri bir gunicorn thread'ini tutar (WEB_THREADS'ten küçük olmalı)
+
+# Süreçler arası iletişim (IPC) Ayarları
+IPC_ENABLED = os.getenv("IPC_ENABLED", "True").lower() in ('true', '1', 't') # worker/strategist/app arasında paylaşımlı bellek kanalları
+IPC_DIR = os.getenv("IPC_DIR", "/dev/shm/scalping-bot" if os.path.isdir("/dev/shm") else "/tmp/scalping-bot") # Kanal dosyalarının klasörü
+IPC_CHANNEL_SIZE = int(os.getenv("IPC_CHANNEL_SIZE", 4 * 1024 * 1024)) # Kanal başına en büyük snapshot boyutu (byte)
 
 # Email Ayarları
 SMTP_SERVER = os.getenv("SMTP_SERVER")
@@ -37,8 +82,26 @@ SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
 SENDER_EMAIL = os.getenv("SENDER_EMAIL")
 SENDER_PASSWORD = os.getenv("SENDER_PASSWORD")
 RECEIVER_EMAIL = os.getenv("RECEIVER_EMAIL")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "True").lower() in ('true', '1', 't') # Yerel test sunucusu için kapatılabilir
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 30.0))                      # SMTP bağlantı zaman aşımı (saniye)
+
+# Bildirim Ayarları (e-postalar arka planda, kuyruktan gönderilir)
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", 100))              # Kuyruk doluysa yeni bildirimler atılır
+NOTIFY_RATE_LIMIT = int(os.getenv("NOTIFY_RATE_LIMIT", 10))               # Dakikada en fazla gönderilen bildirim (0 = sınırsız)
+NOTIFY_COALESCE_WINDOW = float(os.getenv("NOTIFY_COALESCE_WINDOW", 60.0)) # Tekrarlanan uyarıların birleştirildiği süre (saniye)
+NOTIFY_WEBHOOK_URL = os.getenv("NOTIFY_WEBHOOK_URL")                      # Bildirimlerin JSON olarak da gönderileceği webhook (opsiyonel)
+ERROR_ALERT_CYCLES = int(os.getenv("ERROR_ALERT_CYCLES", 5))              # Hata uyarısı e-postası için art arda başarısız döngü sayısı
 
 # Trade Strateji Ayarları
 TAKE_PROFIT_PCT = float(os.getenv("TAKE_PROFIT_PCT", 25.0)) # Yüzde olarak
 STOP_LOSS_PCT = float(os.getenv("STOP_LOSS_PCT", 15.0))   # Yüzde olarak (Dinamik SL aktifken kullanılmayacak)
-ATR_MULTIPLIER = float(os.getenv("ATR_MULTIPLIER", 2.0))    # Dinamik Stop-Loss için ATR çarpanı
\ No newline at end of file
+ATR_MULTIPLIER = float(os.getenv("ATR_MULTIPLIER", 2.0))    # Dinamik Stop-Loss için ATR çarpanı
+TRAILING_STOP_ATR = float(os.getenv("TRAILING_STOP_ATR", 0.0))     # İz süren stop: en iyi fiyattan bu kadar ATR geride (0 = kapalı)
+BREAKEVEN_AFTER_ATR = float(os.getenv("BREAKEVEN_AFTER_ATR", 0.0)) # Fiyat bu kadar ATR lehe gidince stop giriş fiyatına çekilir (0 = kapalı)
+PARTIAL_TP_PCT = float(os.getenv("PARTIAL_TP_PCT", 0.0))           # Kısmi kâr alma seviyesi, marjın yüzdesi olarak (0 = kapalı)
+PARTIAL_TP_FRACTION = float(os.getenv("PARTIAL_TP_FRACTION", 0.5)) # Kısmi kâr almada kapatılan pozisyon oranı
+
+# Backtest Ayarları
+BACKTEST_DATA_DIR = os.getenv("BACKTEST_DATA_DIR", "history") # Geçmiş mum verilerinin (CSV) bulunduğu klasör
+SWEEP_WORKERS = int(os.getenv("SWEEP_WORKERS", os.cpu_count() or 1)) # Parametre taramasında kullanılacak process sayısı
+SWEEP_RESULTS_FILE = os.getenv("SWEEP_RESULTS_FILE", "sweep_results.json") # Tarama sonuçları (strategist bunu okur)
@@ -1,4 +1,5 @@
 import json
+from models import Decision, Position
 
 def decide_action(strategy: dict, market_data: dict, position_status: tuple, portfolio_summary: dict) -> dict:
     """
@@ -96,3 +97,179 @@ def decide_action(strategy: dict, market_data: dict, position_status: tuple, por
 
     # Default case if something goes wrong
     return {"command": "hold", "reasoning": "Default hold, no conditions were met.", "trade_amount_usd": 0}
+
+
+class CompiledStrategy:
+    """
+    A strategy.json document compiled into a decision function.
+    The filter switches and thresholds are bound once as closure constants, so a call
+    does no strategy lookups, and reasoning strings are only built when read (see
+    models.Decision). decide() takes a models.MarketSnapshot and returns exactly what
+    decide_action() would for the same inputs.
+    """
+    def __init__(self, strategy: dict):
+        self.strategy = strategy
+        self.decide = _compile_decide(strategy)
+
+    def decide_all(self, market_data_by_symbol: dict, position_status_by_symbol: dict, portfolio_summary: dict) -> dict:
+        """
+        Decides for all symbols at once. Returns {symbol: decision}; a symbol whose
+        decision raised gets the exception instead, so one bad symbol doesn't stop the rest.
+        """
+        decide = self.decide
+        decisions = {}
+        for symbol, market_data in market_data_by_symbol.items():
+            try:
+                decisions[symbol] = decide(market_data, position_status_by_symbol.get(symbol, ('flat', 0)), portfolio_summary)
+            except Exception as e:
+                decisions[symbol] = e
+        return decisions
+
+def compile_strategy(strategy: dict) -> CompiledStrategy:
+    """Compiles a strategy.json document into a CompiledStrategy."""
+    return CompiledStrategy(strategy)
+
+def _compile_decide(strategy):
+    filters = strategy.get('filters', {})
+    long_cond = strategy.get('long_conditions', {})
+    short_cond = strategy.get('short_conditions', {})
+    trade_params = strategy.get('trade_parameters', {})
+
+    use_trend = bool(filters.get('use_ema_trend_filter'))
+    no_trade_zone = filters.get('no_trade_zone_pct', 0) if use_trend else 0
+    use_no_trade_zone = no_trade_zone > 0
+    use_rsi = bool(filters.get('use_rsi_pullback'))
+    use_volume = bool(filters.get('use_volume_confirmation'))
+    long_entry_min = long_cond.get('rsi_entry_min', 30)
+    long_entry_max = long_cond.get('rsi_entry_max', 50)
+    long_exit = long_cond.get('rsi_exit_extreme', 75)
+    short_entry_min = short_cond.get('rsi_entry_min', 50)
+    short_entry_max = short_cond.get('rsi_entry_max', 70)
+    short_exit = short_cond.get('rsi_exit_extreme', 25)
+    leverage = trade_params.get('default_leverage', 20)
+    trade_pct = trade_params.get('trade_amount_pct_of_balance', 10)
+    long_command = f"long {leverage}x"
+    short_command = f"short {leverage}x"
+    no_trade_zone_label = no_trade_zone * 100 if use_no_trade_zone else 0
+    long_sides = ('long', 'buy')
+    short_sides = ('short', 'sell')
+
+    def decide(market_data, position_status, portfolio_summary):
+        current_price = market_data.current_price
+        ema_200 = market_data.ema_200
+        rsi = market_data.rsi_14
+        position_side = position_status[0]
+
+        # RULE 0: In a position, only decide between 'hold' or 'close'
+        if position_side != 'flat':
+            is_long = position_side in long_sides
+            is_short = position_side in short_sides
+            if use_trend:
+                if is_long and current_price < ema_200:
+                    return Decision("close", 0, "Closing long position: Trend reversed (price crossed below EMA200).")
+                if is_short and current_price > ema_200:
+                    return Decision("close", 0, "Closing short position: Trend reversed (price crossed above EMA200).")
+            if use_rsi:
+                if is_long and rsi > long_exit:
+                    return Decision("close", 0, "Closing long position: RSI is overbought ({:.1f} > {}).", rsi, long_exit)
+                if is_short and rsi < short_exit:
+                    return Decision("close", 0, "Closing short position: RSI is oversold ({:.1f} < {}).", rsi, short_exit)
+            return Decision("hold", 0, "Holding existing {} position.", position_side)
+
+        # RULE 1: Trend Filter
+        if use_trend:
+            is_bullish = current_price > ema_200
+            is_bearish = current_price < ema_200
+            if not is_bullish and not is_bearish:
+                return Decision("hold", 0, "Price is exactly at EMA200, market direction unclear.")
+            # RULE 2: No-Trade Zone Filter
+            if use_no_trade_zone and abs(current_price - ema_200) / ema_200 < no_trade_zone:
+                return Decision("hold", 0, "Price is within the {}% no-trade zone around EMA200.", no_trade_zone_label)
+        else:
+            is_bullish = True
+            is_bearish = True
+
+        # RULE 3: Entry Signal (RSI Pullback)
+        if use_rsi:
+            if is_bullish and not (long_entry_min < rsi < long_entry_max):
+                return Decision("hold", 0, "Bullish trend, but RSI ({:.1f}) is not in the pullback zone ({}-{}).", rsi, long_entry_min, long_entry_max)
+            if is_bearish and not (short_entry_min < rsi < short_entry_max):
+                return Decision("hold", 0, "Bearish trend, but RSI ({:.1f}) is not in the pullback zone ({}-{}).", rsi, short_entry_min, short_entry_max)
+
+        # RULE 4: Volume Filter
+        if use_volume:
+            volume = market_data.volume
+            volume_sma = market_data.volume_sma_20
+            if volume < volume_sma:
+                return Decision("hold", 0, "Entry signal found, but volume ({:.2f}) is below SMA ({:.2f}). Waiting for confirmation.", volume, volume_sma)
+
+        # EXECUTION: All filters passed
+        trade_amount = portfolio_summary.get('available_balance_usd', 0) * (trade_pct / 100)
+        if is_bullish:
+            return Decision(long_command, trade_amount, "All conditions met for LONG: Bullish trend, RSI pullback ({:.1f}), and Volume confirmation.", rsi)
+        return Decision(short_command, trade_amount, "All conditions met for SHORT: Bearish trend, RSI pullback ({:.1f}), and Volume confirmation.", rsi)
+
+    return decide
+
+def get_stop_loss_price(position: Position, atr_multiplier: float):
+    """Returns the ATR-based stop price of a position, or None if no ATR was stored at entry."""
+    atr_at_entry = position.atr_at_entry
+    if not atr_at_entry or atr_at_entry <= 0:
+        return None
+    if position.is_long:
+        return position.entry_price - (atr_at_entry * atr_multiplier)
+    return position.entry_price + (atr_at_entry * atr_multiplier)
+
+def get_exit_prices(position: Position, take_profit_pct: float, stop_loss_pct: float, atr_multiplier: float):
+    """
+    Returns the (take_profit_price, stop_loss_price) at which check_exit_triggers closes
+    the position, so the same levels can be placed on the exchange as trigger orders.
+    """
+    direction = 1 if position.is_long else -1
+    entry_price = position.entry_price
+    margin_per_unit = position.margin / position.quantity # PnL of 1% margin per unit of price move = margin_per_unit / 100
+    take_profit_price = entry_price + direction * margin_per_unit * take_profit_pct / 100
+    stop_loss_price = get_stop_loss_price(position, atr_multiplier)
+    if stop_loss_price is None:
+        stop_loss_price = entry_price - direction * margin_per_unit * stop_loss_pct / 100
+    return take_profit_price, stop_loss_price
+
+def check_exit_triggers(position: Position, take_profit_pct: float, stop_loss_pct: float, atr_multiplier: float):
+    """
+    Checks an open position against its take-profit and stop-loss levels.
+    Used by the worker's TP/SL check and by the backtester so both close positions the same way.
+
+    Args:
+        position: An open models.Position (SimulatedPortfolio or PositionCache).
+        take_profit_pct: Take profit, as a percentage of the position margin.
+        stop_loss_pct: Fallback stop loss (percentage of margin), used when no ATR was stored.
+        atr_multiplier: Distance of the dynamic stop from the entry price, in ATRs.
+
+    Returns:
+        A tuple of ('take_profit' | 'stop_loss', reason), or None if no level was hit.
+    """
+    margin = position.margin
+    entry_price = position.entry_price
+    if margin == 0 or entry_price == 0:
+        return None
+
+    current_price = position.current_price
+    pnl_pct = (position.unrealized_pnl / margin) * 100
+
+    # 1. Take Profit (percentage-based)
+    if pnl_pct >= take_profit_pct:
+        return 'take_profit', f"TAKE PROFIT triggered at {pnl_pct:.2f}%"
+
+    # 2. Dynamic Stop Loss (ATR-based)
+    stop_loss_price = get_stop_loss_price(position, atr_multiplier)
+    if stop_loss_price is not None:
+        side = position.side
+        if (side in ['long', 'buy'] and current_price <= stop_loss_price) or \
+           (side in ['short', 'sell'] and current_price >= stop_loss_price):
+            return 'stop_loss', f"DYNAMIC STOP LOSS triggered at price {current_price:.4f} (ATR: {position.atr_at_entry}, Multiplier: {atr_multiplier})"
+        return None
+
+    # 3. Fallback to the percentage-based SL if ATR is not available
+    if pnl_pct <= -stop_loss_pct:
+        return 'stop_loss', f"FALLBACK STOP LOSS triggered at {pnl_pct:.2f}%"
+    return None
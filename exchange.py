@@ -1,33 +1,175 @@
 import ccxt
 import os
+import json
+import threading
+import time
 from dotenv import load_dotenv
 import config
+import metrics
 
 load_dotenv()
 
-def get_client():
+# Process-wide client shared by market.py and trade.py
+_client = None
+_client_lock = threading.Lock()
+
+class RateLimiter:
     """
-    Creates and configures the CCXT exchange client.
-    - In simulation mode, it connects without API keys to fetch live public data.
-    - In live mode, it connects to the testnet with API keys for trading.
+    Thread-safe replacement for ccxt's built-in throttle.
+    ccxt's sync throttle only compares against the last request timestamp, so
+    several threads sharing one client would all pass it at once. This limiter
+    hands out request slots spaced by `rateLimit * cost` milliseconds instead.
+    """
+    def __init__(self, rate_limit_ms):
+        self.rate_limit_ms = rate_limit_ms
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def throttle(self, cost=None):
+        cost = 1 if cost is None else cost
+        with self._lock:
+            now = time.monotonic() * 1000
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.rate_limit_ms * cost
+        delay = slot - now
+        if delay > 0:
+            metrics.RATE_LIMIT_WAITS.inc()
+            metrics.RATE_LIMIT_WAIT_SECONDS.inc(delay / 1000.0)
+            time.sleep(delay / 1000.0)
+
+def attach_rate_limiter(exchange):
+    """Replaces the client's throttle with a thread-safe RateLimiter so it can be shared between threads."""
+    limiter = RateLimiter(exchange.rateLimit)
+    exchange.throttle = limiter.throttle
+    return exchange
+
+def attach_metrics(exchange):
     """
+    Counts and times every HTTP request the client makes (see metrics.py). ccxt's
+    fetch2 may retry a failed request; each extra attempt is counted as a retry.
+    """
+    original_fetch = exchange.fetch
+    original_fetch2 = exchange.fetch2
+    attempts = threading.local()
+
+    def fetch(*args, **kwargs):
+        attempts.count = getattr(attempts, 'count', 0) + 1
+        started = time.perf_counter()
+        try:
+            response = original_fetch(*args, **kwargs)
+        except Exception:
+            metrics.API_CALLS.inc(result="error")
+            raise
+        finally:
+            metrics.API_CALL_SECONDS.observe(time.perf_counter() - started)
+        metrics.API_CALLS.inc(result="ok")
+        return response
+
+    def fetch2(*args, **kwargs):
+        attempts.count = 0
+        try:
+            return original_fetch2(*args, **kwargs)
+        finally:
+            if attempts.count > 1:
+                metrics.RETRIES.inc(attempts.count - 1, operation="api_request")
+
+    exchange.fetch = fetch
+    exchange.fetch2 = fetch2
+    return exchange
+
+def _read_markets_cache(cache_file):
+    """Returns the cached market metadata if the cache file exists and is younger than the TTL."""
+    try:
+        if time.time() - os.path.getmtime(cache_file) > config.MARKETS_CACHE_TTL:
+            return None
+        with open(cache_file, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def _write_markets_cache(cache_file, exchange):
+    try:
+        tmp_file = cache_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({"markets": exchange.markets, "currencies": exchange.currencies}, f)
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        print(f"[EXCHANGE] Could not write markets cache: {e}")
+
+def attach_markets_cache(exchange, cache_file):
+    """
+    Wraps the client's load_markets so market metadata is read from an on-disk cache
+    (valid for config.MARKETS_CACHE_TTL seconds) instead of being downloaded again
+    after every restart. ccxt still calls load_markets lazily on the first request.
+    """
+    original_load_markets = exchange.load_markets
+    lock = threading.Lock()
+
+    def load_markets(reload=False, params={}):
+        with lock:
+            if exchange.markets and not reload:
+                return exchange.markets
+            if not reload:
+                cached = _read_markets_cache(cache_file)
+                if cached:
+                    exchange.set_markets(cached['markets'], cached.get('currencies'))
+                    print(f"[EXCHANGE] Loaded market metadata from cache: {cache_file}")
+                    return exchange.markets
+            markets = original_load_markets(reload, params)
+            _write_markets_cache(cache_file, exchange)
+            return markets
+
+    exchange.load_markets = load_markets
+    return exchange
+
+def amount_to_precision(client, symbol, amount):
+    """
+    `amount` rounded to the symbol's lot size the way ccxt rounds it in create_order,
+    i.e. the quantity the exchange will actually show for the order.
+    """
+    client.load_markets()
+    return float(client.amount_to_precision(symbol, amount))
+
+def _create_client():
     if config.SIMULATION_MODE:
         # Simulation mode: No API keys needed for public data (like price feeds)
         exchange = ccxt.binance({
             "enableRateLimit": True,
+            "timeout": int(config.MARKET_FETCH_TIMEOUT * 1000),
         })
+        cache_file = config.MARKETS_CACHE_FILE.format(mode="mainnet")
     else:
         # Live/trading mode: Use API keys and connect to the testnet
         api_key = config.BINANCE_API_KEY
         api_secret = config.BINANCE_API_SECRET
-        
+
         exchange = ccxt.binance({
             "apiKey": api_key,
             "secret": api_secret,
             "enableRateLimit": True,
+            "timeout": int(config.MARKET_FETCH_TIMEOUT * 1000),
         })
         # For safety, we keep trading on the testnet unless explicitly changed
         exchange.set_sandbox_mode(True)
         # exchange.verbose = True # Uncomment to see requests
+        cache_file = config.MARKETS_CACHE_FILE.format(mode="testnet")
 
+    attach_rate_limiter(exchange)
+    attach_markets_cache(exchange, cache_file)
+    attach_metrics(exchange)
     return exchange
+
+def get_client():
+    """
+    Returns the process-wide CCXT exchange client, creating it on first use.
+    - In simulation mode, it connects without API keys to fetch live public data.
+    - In live mode, it connects to the testnet with API keys for trading.
+    The client is reused so its HTTP session (keep-alive), loaded markets and
+    rate limiter are shared between every caller in the process.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
@@ -0,0 +1,132 @@
+"""
+Streaming market data feeds.
+Both feeds parse Binance combined-stream messages (bookTicker and kline) and call
+`on_tick(symbol, price)` for every price update, so TP/SL can react between the
+REST cycles of the worker.
+- BinanceFeed connects to the live Binance WebSocket streams.
+- ReplayFeed replays messages recorded to a JSON Lines file (one raw message per
+  line), which makes the tick path testable without a network connection.
+"""
+import asyncio
+import json
+import threading
+import time
+import websockets
+import config
+
+def _stream_name(symbol):
+    return symbol.split(':')[0].replace('/', '').lower()
+
+class _BaseFeed:
+    def __init__(self, symbols, on_tick, interval='3m'):
+        self.symbols = list(symbols)
+        self.on_tick = on_tick
+        self.interval = interval
+        self._symbols_by_stream = {_stream_name(s): s for s in self.symbols}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def streams(self):
+        names = []
+        for stream in self._symbols_by_stream:
+            names.append(f"{stream}@bookTicker")
+            names.append(f"{stream}@kline_{self.interval}")
+        return names
+
+    def handle_message(self, message):
+        """Parses one combined-stream message and forwards its price to on_tick."""
+        data = message.get('data', message)
+        event = data.get('e')
+        if event == 'kline':
+            symbol = self._symbols_by_stream.get(data['s'].lower())
+            price = float(data['k']['c'])
+        elif 'b' in data and 'a' in data:
+            # bookTicker has no event type; use the mid price of the best bid/ask
+            symbol = self._symbols_by_stream.get(data['s'].lower())
+            price = (float(data['b']) + float(data['a'])) / 2
+        else:
+            return
+        if symbol and price > 0:
+            try:
+                self.on_tick(symbol, price)
+            except Exception as e:
+                print(f"[FEED] Error handling tick for {symbol}: {e}")
+
+    def start(self):
+        """Runs the feed in a daemon thread."""
+        self._thread = threading.Thread(target=self.run, name=self.__class__.__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+class BinanceFeed(_BaseFeed):
+    """Live Binance bookTicker/kline streams with automatic reconnect."""
+    def __init__(self, symbols, on_tick, interval='3m', url=config.MARKET_FEED_WS_URL, record_file=None):
+        super().__init__(symbols, on_tick, interval)
+        self.url = url
+        self.record_file = record_file
+
+    def run(self):
+        asyncio.run(self._run())
+
+    async def _run(self):
+        url = f"{self.url}?streams={'/'.join(self.streams())}"
+        record = open(self.record_file, 'a') if self.record_file else None
+        backoff = 1
+        try:
+            while not self._stop.is_set():
+                try:
+                    async with websockets.connect(url, ping_interval=20) as ws:
+                        print(f"[FEED] Connected to {len(self.symbols)} symbol streams.")
+                        backoff = 1
+                        async for raw in ws:
+                            if self._stop.is_set():
+                                break
+                            if record:
+                                record.write(raw + "\n")
+                            self.handle_message(json.loads(raw))
+                except Exception as e:
+                    print(f"[FEED] Stream error: {e}. Reconnecting in {backoff}s...")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 60)
+        finally:
+            if record:
+                record.close()
+
+class ReplayFeed(_BaseFeed):
+    """
+    Replays recorded stream messages from a JSON Lines file.
+    `speed` of None replays as fast as possible; otherwise event times are
+    followed, scaled by `speed` (2.0 = twice as fast).
+    """
+    def __init__(self, symbols, on_tick, file_path, interval='3m', speed=None):
+        super().__init__(symbols, on_tick, interval)
+        self.file_path = file_path
+        self.speed = speed
+
+    def run(self):
+        last_event_time = None
+        with open(self.file_path, 'r') as f:
+            for line in f:
+                if self._stop.is_set():
+                    break
+                if not line.strip():
+                    continue
+                message = json.loads(line)
+                event_time = message.get('data', message).get('E')
+                if self.speed and event_time and last_event_time:
+                    time.sleep(max(0, (event_time - last_event_time) / 1000 / self.speed))
+                last_event_time = event_time or last_event_time
+                self.handle_message(message)
+        print("[FEED] Replay finished.")
+
+def create_feed(symbols, on_tick, interval='3m'):
+    """Creates the feed selected by config.MARKET_FEED_MODE, or None in 'rest' mode."""
+    mode = config.MARKET_FEED_MODE
+    if mode == 'websocket':
+        return BinanceFeed(symbols, on_tick, interval, record_file=config.MARKET_FEED_RECORD_FILE)
+    if mode == 'replay':
+        return ReplayFeed(symbols, on_tick, config.MARKET_FEED_REPLAY_FILE, interval, speed=config.MARKET_FEED_REPLAY_SPEED)
+    return None
@@ -0,0 +1,400 @@
+"""
+Incremental (streaming) indicators.
+
+Each indicator keeps a small constant-size state and is updated in O(1) per candle,
+so the hot path never rebuilds a DataFrame. `update()` commits a closed candle,
+`peek()` returns the value the indicator would have if the given (still-forming)
+candle were committed, without changing the state.
+
+Tolerance vs the pandas_ta formulas (same candle window), as written out with
+pandas ewm/rolling in tests/test_indicators.py, which checks these bounds:
+- EMA is SMA-seeded and then recursive (ewm adjust=False after an SMA seed),
+  SMA is a plain rolling mean. Both match to float precision (~1e-9 relative).
+- RSI, ATR and ADX use Wilder's smoothing computed like pandas_ta's `rma`
+  (ewm alpha=1/length, adjust=True, min_periods=length). They match within
+  1e-6 relative once the indicator is warmed up.
+A set that keeps streaming past the initial window remembers more history than
+pandas_ta run over the last N rows, so long EMAs (EMA200) drift towards the
+"true" value instead of the truncated-window one.
+
+get_indicator_values() saves each set next to the candle store whenever it commits
+a candle, and restores it on first use, so a restart continues the stream instead
+of re-seeding from the stored candles.
+"""
+import config
+import json
+import os
+import tempfile
+import threading
+
+NAN = float('nan')
+
+class EMA:
+    """Exponential moving average, seeded with the SMA of the first `length` values."""
+    def __init__(self, length):
+        self.length = length
+        self.alpha = 2.0 / (length + 1)
+        self.value = None
+        self.seed_sum = 0.0
+        self.seed_count = 0
+
+    def _next(self, x):
+        if self.value is not None:
+            return self.value + self.alpha * (x - self.value)
+        if self.seed_count + 1 == self.length:
+            return (self.seed_sum + x) / self.length
+        return None
+
+    def update(self, x):
+        new_value = self._next(x)
+        if self.value is None:
+            self.seed_sum += x
+            self.seed_count += 1
+        self.value = new_value
+        return NAN if new_value is None else new_value
+
+    def peek(self, x):
+        new_value = self._next(x)
+        return NAN if new_value is None else new_value
+
+    def to_dict(self):
+        return {"value": self.value, "seed_sum": self.seed_sum, "seed_count": self.seed_count}
+
+    def load(self, state):
+        self.value = state["value"]
+        self.seed_sum = state["seed_sum"]
+        self.seed_count = state["seed_count"]
+
+class RMA:
+    """Wilder's moving average, computed like pandas_ta's rma (ewm alpha=1/length, adjust=True)."""
+    def __init__(self, length):
+        self.length = length
+        self.decay = 1.0 - 1.0 / length
+        self.num = 0.0
+        self.den = 0.0
+        self.count = 0
+
+    @property
+    def value(self):
+        return self.num / self.den if self.count >= self.length else NAN
+
+    def update(self, x):
+        self.num = self.num * self.decay + x
+        self.den = self.den * self.decay + 1.0
+        self.count += 1
+        return self.value
+
+    def peek(self, x):
+        if self.count + 1 < self.length:
+            return NAN
+        return (self.num * self.decay + x) / (self.den * self.decay + 1.0)
+
+    def to_dict(self):
+        return {"num": self.num, "den": self.den, "count": self.count}
+
+    def load(self, state):
+        self.num = state["num"]
+        self.den = state["den"]
+        self.count = state["count"]
+
+class SMA:
+    """Rolling simple moving average over the last `length` values."""
+    def __init__(self, length):
+        self.length = length
+        self.window = []
+        self.start = 0 # Index of the oldest value in the circular window
+        self.total = 0.0
+        self.updates = 0
+
+    def update(self, x):
+        if len(self.window) < self.length:
+            self.window.append(x)
+            self.total += x
+        else:
+            self.total += x - self.window[self.start]
+            self.window[self.start] = x
+            self.start = (self.start + 1) % self.length
+        self.updates += 1
+        # Re-sum once per window to stop floating-point drift (amortized O(1))
+        if self.updates % self.length == 0:
+            self.total = sum(self.window)
+        return self.total / self.length if len(self.window) == self.length else NAN
+
+    def peek(self, x):
+        if len(self.window) + 1 < self.length:
+            return NAN
+        if len(self.window) < self.length:
+            return (self.total + x) / self.length
+        return (self.total + x - self.window[self.start]) / self.length
+
+    def to_dict(self):
+        # Stored oldest first so the window can be restored in order; the running
+        # total and update count keep the re-sum schedule of the saved set
+        return {"window": self.window[self.start:] + self.window[:self.start], "total": self.total, "updates": self.updates}
+
+    def load(self, state):
+        self.window = list(state["window"])
+        self.start = 0
+        self.total = state.get("total", sum(self.window))
+        self.updates = state.get("updates", 0)
+
+class RSI:
+    """Wilder's RSI on close prices."""
+    def __init__(self, length=14):
+        self.gain = RMA(length)
+        self.loss = RMA(length)
+        self.prev_close = None
+
+    @staticmethod
+    def _rsi(avg_gain, avg_loss):
+        total = avg_gain + avg_loss
+        return 100.0 * avg_gain / total if total else NAN
+
+    def update(self, close):
+        if self.prev_close is None:
+            self.prev_close = close
+            return NAN
+        change = close - self.prev_close
+        self.prev_close = close
+        return self._rsi(self.gain.update(max(change, 0.0)), self.loss.update(max(-change, 0.0)))
+
+    def peek(self, close):
+        if self.prev_close is None:
+            return NAN
+        change = close - self.prev_close
+        return self._rsi(self.gain.peek(max(change, 0.0)), self.loss.peek(max(-change, 0.0)))
+
+    def to_dict(self):
+        return {"gain": self.gain.to_dict(), "loss": self.loss.to_dict(), "prev_close": self.prev_close}
+
+    def load(self, state):
+        self.gain.load(state["gain"])
+        self.loss.load(state["loss"])
+        self.prev_close = state["prev_close"]
+
+def true_range(high, low, prev_close):
+    return max(high - low, abs(high - prev_close), abs(prev_close - low))
+
+class ATR:
+    """Wilder's Average True Range (pandas_ta's ATRr_<length>)."""
+    def __init__(self, length=14):
+        self.rma = RMA(length)
+        self.prev_close = None
+
+    def update(self, high, low, close):
+        if self.prev_close is None:
+            self.prev_close = close
+            return NAN
+        value = self.rma.update(true_range(high, low, self.prev_close))
+        self.prev_close = close
+        return value
+
+    def peek(self, high, low, close):
+        if self.prev_close is None:
+            return NAN
+        return self.rma.peek(true_range(high, low, self.prev_close))
+
+    def to_dict(self):
+        return {"rma": self.rma.to_dict(), "prev_close": self.prev_close}
+
+    def load(self, state):
+        self.rma.load(state["rma"])
+        self.prev_close = state["prev_close"]
+
+class ADX:
+    """Wilder's Average Directional Index (pandas_ta's ADX_<length>)."""
+    def __init__(self, length=14):
+        self.length = length
+        self.atr = RMA(length)
+        self.plus_dm = RMA(length)
+        self.minus_dm = RMA(length)
+        self.adx = RMA(length)
+        self.prev = None # (high, low, close) of the previous candle
+
+    def _inputs(self, high, low):
+        prev_high, prev_low, prev_close = self.prev
+        up = high - prev_high
+        down = prev_low - low
+        plus = up if (up > down and up > 0) else 0.0
+        minus = down if (down > up and down > 0) else 0.0
+        return true_range(high, low, prev_close), plus, minus
+
+    @staticmethod
+    def _dx(atr, plus, minus):
+        if not atr or atr != atr or plus != plus or minus != minus:
+            return None
+        dmp = 100.0 * plus / atr
+        dmn = 100.0 * minus / atr
+        total = dmp + dmn
+        return 100.0 * abs(dmp - dmn) / total if total else None
+
+    def update(self, high, low, close):
+        if self.prev is None:
+            self.prev = (high, low, close)
+            return NAN
+        tr, plus, minus = self._inputs(high, low)
+        self.prev = (high, low, close)
+        dx = self._dx(self.atr.update(tr), self.plus_dm.update(plus), self.minus_dm.update(minus))
+        if dx is None:
+            return self.adx.value
+        return self.adx.update(dx)
+
+    def peek(self, high, low, close):
+        if self.prev is None:
+            return NAN
+        tr, plus, minus = self._inputs(high, low)
+        dx = self._dx(self.atr.peek(tr), self.plus_dm.peek(plus), self.minus_dm.peek(minus))
+        if dx is None:
+            return self.adx.value
+        return self.adx.peek(dx)
+
+    def to_dict(self):
+        return {
+            "atr": self.atr.to_dict(), "plus_dm": self.plus_dm.to_dict(),
+            "minus_dm": self.minus_dm.to_dict(), "adx": self.adx.to_dict(),
+            "prev": list(self.prev) if self.prev else None,
+        }
+
+    def load(self, state):
+        self.atr.load(state["atr"])
+        self.plus_dm.load(state["plus_dm"])
+        self.minus_dm.load(state["minus_dm"])
+        self.adx.load(state["adx"])
+        self.prev = tuple(state["prev"]) if state["prev"] else None
+
+class IndicatorSet:
+    """
+    All indicators used by market.py for one symbol/timeframe.
+    Candles are [timestamp, open, high, low, close, volume] rows, as returned by ccxt.
+    """
+    def __init__(self):
+        self.ema_20 = EMA(20)
+        self.ema_50 = EMA(50)
+        self.ema_200 = EMA(200)
+        self.rsi_14 = RSI(14)
+        self.atr_14 = ATR(14)
+        self.adx_14 = ADX(14)
+        self.volume_sma_20 = SMA(20)
+        self.last_timestamp = None
+
+    def update(self, candle):
+        """Commits a closed candle and returns the indicator values including it."""
+        timestamp, _, high, low, close, volume = candle[:6]
+        self.last_timestamp = timestamp
+        return {
+            "close": close,
+            "volume": volume,
+            "ema_20": self.ema_20.update(close),
+            "ema_50": self.ema_50.update(close),
+            "ema_200": self.ema_200.update(close),
+            "rsi_14": self.rsi_14.update(close),
+            "atr_14": self.atr_14.update(high, low, close),
+            "adx_14": self.adx_14.update(high, low, close),
+            "volume_sma_20": self.volume_sma_20.update(volume),
+        }
+
+    def peek(self, candle):
+        """Returns all indicator values as if `candle` (usually the forming one) were the latest."""
+        _, _, high, low, close, volume = candle[:6]
+        return {
+            "close": close,
+            "volume": volume,
+            "ema_20": self.ema_20.peek(close),
+            "ema_50": self.ema_50.peek(close),
+            "ema_200": self.ema_200.peek(close),
+            "rsi_14": self.rsi_14.peek(close),
+            "atr_14": self.atr_14.peek(high, low, close),
+            "adx_14": self.adx_14.peek(high, low, close),
+            "volume_sma_20": self.volume_sma_20.peek(volume),
+        }
+
+    def to_dict(self):
+        state = {name: getattr(self, name).to_dict() for name in _INDICATOR_NAMES}
+        state["last_timestamp"] = self.last_timestamp
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        indicator_set = cls()
+        for name in _INDICATOR_NAMES:
+            getattr(indicator_set, name).load(state[name])
+        indicator_set.last_timestamp = state["last_timestamp"]
+        return indicator_set
+
+    @classmethod
+    def from_history(cls, candles):
+        """Seeds a new set by replaying closed candles."""
+        indicator_set = cls()
+        for candle in candles:
+            indicator_set.update(candle)
+        return indicator_set
+
+_INDICATOR_NAMES = ["ema_20", "ema_50", "ema_200", "rsi_14", "atr_14", "adx_14", "volume_sma_20"]
+
+# One IndicatorSet per (symbol, timeframe), kept up to date between cycles
+_sets = {}
+_set_locks = {} # (symbol, timeframe) -> lock held while that set is read or updated
+_sets_lock = threading.Lock()
+
+def _state_file(symbol, timeframe, directory):
+    safe_symbol = symbol.replace('/', '_').replace(':', '_')
+    return os.path.join(directory, f"{safe_symbol}_{timeframe}.indicators.json")
+
+def load_set(symbol, timeframe, directory=config.CANDLE_STORE_DIR):
+    """Returns the saved IndicatorSet of a symbol/timeframe, or None if there is none."""
+    path = _state_file(symbol, timeframe, directory)
+    try:
+        with open(path, 'r') as f:
+            return IndicatorSet.from_dict(json.load(f))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[INDICATORS] Could not read {path}, re-seeding from history: {e}")
+        return None
+
+def save_set(symbol, timeframe, indicator_set, directory=config.CANDLE_STORE_DIR):
+    """Writes an IndicatorSet atomically; the worker and the strategist may share the directory."""
+    path = _state_file(symbol, timeframe, directory)
+    try:
+        os.makedirs(directory or '.', exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=directory or '.', prefix=os.path.basename(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(indicator_set.to_dict(), f)
+            os.replace(tmp_file, path)
+        except BaseException:
+            os.unlink(tmp_file)
+            raise
+    except Exception as e:
+        print(f"[INDICATORS] Could not write {path}: {e}")
+
+def get_indicator_values(symbol, timeframe, candles, state_dir=config.CANDLE_STORE_DIR):
+    """
+    Brings the symbol's IndicatorSet up to date with `candles` and returns the
+    indicator values for the last candle. All candles but the last are treated
+    as closed; the last one may still be forming and is only peeked at.
+    On first use the set is restored from `state_dir` (None disables saving); it is
+    re-seeded from `candles` if there is no saved set or there is a gap.
+    """
+    if not candles:
+        return None
+    closed, live = candles[:-1], candles[-1]
+    key = (symbol, timeframe)
+    with _sets_lock:
+        set_lock = _set_locks.setdefault(key, threading.Lock())
+    # A fetch abandoned after its timeout may still be running; without the lock it
+    # and the next cycle could both commit the same candle
+    with set_lock:
+        indicator_set = _sets.get(key)
+        if indicator_set is None and state_dir is not None:
+            indicator_set = load_set(symbol, timeframe, state_dir)
+        last_timestamp = indicator_set.last_timestamp if indicator_set else None
+        if last_timestamp is None or (closed and last_timestamp < closed[0][0]):
+            indicator_set = IndicatorSet.from_history(closed)
+        _sets[key] = indicator_set
+        for candle in closed:
+            if indicator_set.last_timestamp is None or candle[0] > indicator_set.last_timestamp:
+                indicator_set.update(candle)
+        if state_dir is not None and indicator_set.last_timestamp != last_timestamp:
+            save_set(symbol, timeframe, indicator_set, state_dir)
+        return indicator_set.peek(live)
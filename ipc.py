@@ -0,0 +1,127 @@
+"""
+Local IPC between worker.py, strategist.py and app.py.
+
+Each channel is a single-writer / many-reader snapshot in a memory-mapped file
+(under /dev/shm when available, so it never touches the disk). The header holds
+a sequence number and the payload length; the writer makes the sequence odd while
+it copies the JSON payload and even again when it is done (a seqlock), so readers
+never see a half-written snapshot and can tell from the sequence alone whether
+anything changed since their last read.
+
+Channels:
+- "portfolio": portfolio summary, open positions and equity history (worker)
+- "market":    the last cycle's market summaries (worker)
+- "strategy":  the current strategy.json content (strategist)
+- "metrics":   latency histograms and counters, served at /metrics (worker)
+
+Files on disk (strategy.json, portfolio_state.json, ...) are still written and
+remain the durability backstop; readers fall back to them when a channel has
+never been published.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import config
+from models import json_default
+
+_HEADER = struct.Struct('<QQ') # sequence, payload length
+
+class SnapshotChannel:
+    def __init__(self, name, capacity=config.IPC_CHANNEL_SIZE, directory=config.IPC_DIR):
+        self.name = name
+        self.capacity = capacity
+        self.file_path = os.path.join(directory, f"{name}.snapshot")
+        self._mm = None
+        self._lock = threading.Lock()
+
+    def _open(self, create):
+        if self._mm is not None:
+            return self._mm
+        size = _HEADER.size + self.capacity
+        if create:
+            os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+            fd = os.open(self.file_path, os.O_RDWR | os.O_CREAT, 0o600)
+        else:
+            try:
+                fd = os.open(self.file_path, os.O_RDWR)
+            except FileNotFoundError:
+                return None # Nobody has published on this channel yet
+        try:
+            if os.fstat(fd).st_size < size:
+                if not create:
+                    return None
+                os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        return self._mm
+
+    def publish(self, obj):
+        """Publishes a new snapshot and returns its sequence number (None if it could not be published)."""
+        data = json.dumps(obj, default=json_default).encode('utf-8')
+        if len(data) > self.capacity:
+            print(f"[IPC] Snapshot for '{self.name}' is {len(data)} bytes, larger than the channel ({self.capacity}). Not published.")
+            return None
+        with self._lock:
+            mm = self._open(create=True)
+            seq, _ = _HEADER.unpack_from(mm, 0)
+            if seq % 2:
+                seq += 1 # A previous writer died mid-write
+            _HEADER.pack_into(mm, 0, seq + 1, len(data)) # Odd: write in progress
+            mm[_HEADER.size:_HEADER.size + len(data)] = data
+            _HEADER.pack_into(mm, 0, seq + 2, len(data))
+            return seq + 2
+
+    def read(self, since_seq=0, retries=100):
+        """
+        Returns (sequence, snapshot). The snapshot is None when nothing newer than
+        `since_seq` has been published (sequence 0 means never published).
+        """
+        mm = self._open(create=False)
+        if mm is None:
+            return 0, None
+        for _ in range(retries):
+            seq, length = _HEADER.unpack_from(mm, 0)
+            if seq == since_seq:
+                return seq, None
+            if seq % 2 == 0:
+                data = mm[_HEADER.size:_HEADER.size + length]
+                if _HEADER.unpack_from(mm, 0)[0] == seq:
+                    return seq, json.loads(data) if seq else None
+            time.sleep(0.001) # Writer is busy; try again
+        return since_seq, None
+
+# One channel object per name and process
+_channels = {}
+_channels_lock = threading.Lock()
+
+def get_channel(name):
+    with _channels_lock:
+        channel = _channels.get(name)
+        if channel is None:
+            channel = SnapshotChannel(name)
+            _channels[name] = channel
+    return channel
+
+def publish(name, obj):
+    """Publishes a snapshot on a channel. Never raises; IPC is an optimization over the files."""
+    if not config.IPC_ENABLED:
+        return None
+    try:
+        return get_channel(name).publish(obj)
+    except Exception as e:
+        print(f"[IPC] Could not publish '{name}': {e}")
+        return None
+
+def read(name, since_seq=0):
+    """Reads a channel's snapshot if it changed since `since_seq`. Returns (sequence, snapshot or None)."""
+    if not config.IPC_ENABLED:
+        return 0, None
+    try:
+        return get_channel(name).read(since_seq)
+    except Exception as e:
+        print(f"[IPC] Could not read '{name}': {e}")
+        return 0, None
@@ -1,41 +1,240 @@
+import atexit
+import queue
 import smtplib
+import threading
+import time
+from collections import namedtuple
 import config
+import metrics
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import json
 from datetime import datetime
 
-def send_email(subject, body):
+# `key` groups notifications for coalescing: "merge" folds repeats into one message,
+# "replace" keeps only the newest one, None sends every notification as is.
+Notification = namedtuple("Notification", ["subject", "body", "key", "coalesce", "created_at"])
+
+def make_notification(subject, body, key=None, coalesce=None):
+    return Notification(subject, body, key, coalesce, time.time())
+
+def _is_disconnect(error):
+    """True for a dropped or failed connection; False for an SMTP reply like a refused login, sender or recipient."""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    return not isinstance(error, smtplib.SMTPException) # Other SMTPExceptions are OSErrors too
+
+class SMTPSink:
     """
-    Connects to the SMTP server and sends an email with verbose logging.
+    Sends notifications as email over one persistent SMTP connection, reconnecting
+    once when the server has dropped it. Errors the server replied with (login,
+    sender or recipient refused) are raised right away, since a retry can't fix them.
+    STARTTLS and login are optional so a local stand-in server (e.g. aiosmtpd) can
+    be used for testing.
     """
-    if not all([config.SENDER_EMAIL, config.SENDER_PASSWORD, config.RECEIVER_EMAIL]):
-        print("[MAILER] Email configuration is incomplete. Cannot send email.")
-        return
-
-    print(f"[MAILER] Attempting to connect to SMTP server: {config.SMTP_SERVER}:{config.SMTP_PORT}")
-    try:
-        # Use a 'with' statement for robust connection handling
-        with smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT) as server:
-            print("[MAILER] SMTP connection successful. Starting TLS...")
-            server.starttls()
-            print("[MAILER] TLS started. Logging in...")
-            server.login(config.SENDER_EMAIL, config.SENDER_PASSWORD)
-            print("[MAILER] Login successful. Sending email...")
-            
-            # Create the email message
-            msg = MIMEMultipart()
-            msg['From'] = config.SENDER_EMAIL
-            msg['To'] = config.RECEIVER_EMAIL
-            msg['Subject'] = subject
-            msg.attach(MIMEText(body, 'plain'))
-            
-            text = msg.as_string()
-            server.sendmail(config.SENDER_EMAIL, config.RECEIVER_EMAIL, text)
-            print(f"[MAILER] Email sent successfully to {config.RECEIVER_EMAIL}.")
+    name = "smtp"
+
+    def __init__(self, host=config.SMTP_SERVER, port=config.SMTP_PORT, sender=config.SENDER_EMAIL,
+                 password=config.SENDER_PASSWORD, receiver=config.RECEIVER_EMAIL, starttls=config.SMTP_STARTTLS,
+                 timeout=config.SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.password = password
+        self.receiver = receiver
+        self.starttls = starttls
+        self.timeout = timeout
+        self.server = None
+
+    def _connect(self):
+        print(f"[MAILER] Connecting to SMTP server: {self.host}:{self.port}")
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.password:
+                server.login(self.sender, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+
+    def send(self, notification):
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = self.receiver
+        msg['Subject'] = notification.subject
+        msg.attach(MIMEText(notification.body, 'plain'))
+        text = msg.as_string()
+
+        for attempt in range(2):
+            try:
+                if self.server is None:
+                    self._connect()
+                self.server.sendmail(self.sender, self.receiver, text)
+                print(f"[MAILER] Email '{notification.subject}' sent to {self.receiver}.")
+                return
+            except OSError as e:
+                if not _is_disconnect(e):
+                    raise
+                # The server closed the idle connection; reconnect once
+                self.close()
+                if attempt:
+                    raise
+                metrics.RETRIES.inc(operation="smtp_reconnect")
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                pass
+            self.server = None
+
+class WebhookSink:
+    """Posts notifications as JSON ({"subject", "body", "created_at"}) to a URL, e.g. a chat webhook."""
+    name = "webhook"
+
+    def __init__(self, url, timeout=10):
+        import requests
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def send(self, notification):
+        response = self.session.post(self.url, timeout=self.timeout, json={
+            "subject": notification.subject, "body": notification.body, "created_at": notification.created_at,
+        })
+        response.raise_for_status()
+
+    def close(self):
+        self.session.close()
+
+class NotificationDispatcher:
+    """
+    Sends notifications from a background thread so callers never wait on SMTP.
+    - submit() never blocks; when the bounded queue is full the notification is dropped.
+    - Notifications with a key are held for `coalesce_window` seconds and repeats are
+      folded into one message ("merge") or replaced by the newest one ("replace").
+    - At most `rate_limit` messages per minute are sent; the rest wait (and keep
+      coalescing) until the limit allows them.
+    Sinks are objects with send(notification) and close(); a failing sink does not
+    stop the others.
+    """
+    def __init__(self, sinks, queue_size=config.NOTIFY_QUEUE_SIZE, rate_limit=config.NOTIFY_RATE_LIMIT,
+                 coalesce_window=config.NOTIFY_COALESCE_WINDOW):
+        self.sinks = list(sinks)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.rate_limit = rate_limit
+        self.coalesce_window = coalesce_window
+        self.pending = {} # key -> [notification, repeat count]
+        self.dropped = 0
+        self._sent_times = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="notify", daemon=True)
+        self._thread.start()
+
+    def submit(self, notification):
+        try:
+            self.queue.put_nowait(notification)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            metrics.NOTIFICATIONS.inc(sink="queue", result="dropped")
+            print(f"[MAILER] Notification queue is full; dropped '{notification.subject}' ({self.dropped} dropped so far).")
+            return False
+
+    def _add(self, notification):
+        if notification.key is None:
+            self.pending[object()] = [notification, 1] # Unique key: never coalesced
+            return
+        held = self.pending.get(notification.key)
+        if held is None:
+            self.pending[notification.key] = [notification, 1]
+        elif notification.coalesce == "replace":
+            held[0] = notification._replace(created_at=held[0].created_at)
+        else:
+            held[0] = held[0]._replace(body=held[0].body + "\n\n---\n\n" + notification.body)
+            held[1] += 1
+
+    def _due(self, now, flush=False):
+        due = []
+        for key, (notification, count) in list(self.pending.items()):
+            if flush or notification.key is None or now - notification.created_at >= self.coalesce_window:
+                if count > 1:
+                    notification = notification._replace(subject=f"{notification.subject} (x{count})")
+                due.append((key, notification))
+        return due
+
+    def _allowed(self, now):
+        self._sent_times = [t for t in self._sent_times if now - t < 60]
+        return not self.rate_limit or len(self._sent_times) < self.rate_limit
+
+    def _deliver(self, notification):
+        for sink in self.sinks:
+            try:
+                with metrics.NOTIFICATION_SECONDS.time(sink=sink.name):
+                    sink.send(notification)
+                metrics.NOTIFICATIONS.inc(sink=sink.name, result="sent")
+            except Exception as e:
+                print(f"[MAILER] {sink.name} could not send '{notification.subject}': {e}")
+                metrics.NOTIFICATIONS.inc(sink=sink.name, result="error")
+
+    def _run(self):
+        while True:
+            stopping = self._stop.is_set()
+            try:
+                self._add(self.queue.get(timeout=0.5))
+                while True:
+                    self._add(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            now = time.time()
+            for key, notification in self._due(now, flush=stopping):
+                if not stopping and not self._allowed(now):
+                    break # Rate limited; stays pending and keeps coalescing
+                del self.pending[key]
+                self._sent_times.append(now)
+                self._deliver(notification)
+            if stopping and self.queue.empty():
+                break
+        for sink in self.sinks:
+            sink.close()
 
-    except Exception as e:
-        print(f"[MAILER] An error occurred during the email process: {e}")
+    def close(self, timeout=30):
+        """Sends everything still queued or held (ignoring the rate limit) and closes the sinks."""
+        self._stop.set()
+        self._thread.join(timeout)
+
+def create_sinks():
+    sinks = []
+    if all([config.SMTP_SERVER, config.SENDER_EMAIL, config.RECEIVER_EMAIL]):
+        sinks.append(SMTPSink())
+    else:
+        print("[MAILER] Email configuration is incomplete. Emails will not be sent.")
+    if config.NOTIFY_WEBHOOK_URL:
+        sinks.append(WebhookSink(config.NOTIFY_WEBHOOK_URL))
+    return sinks
+
+# One dispatcher per process, started on first use
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = NotificationDispatcher(create_sinks())
+                atexit.register(_dispatcher.close)
+    return _dispatcher
+
+def send_email(subject, body, key=None, coalesce=None):
+    """
+    Queues a notification for the background dispatcher and returns immediately.
+    Returns False if it was dropped because the queue is full.
+    """
+    return get_dispatcher().submit(make_notification(subject, body, key, coalesce))
 
 def send_error_email(errors):
     """
@@ -43,13 +242,14 @@ def send_error_email(errors):
     """
     subject = "Trading Bot Alert: Consecutive Errors Detected"
     
-    body = "The trading bot has encountered 10 consecutive cycles with errors and requires attention.\n\n"
+    body = f"The trading bot has encountered {config.ERROR_ALERT_CYCLES} consecutive cycles with errors and requires attention.\n\n"
     body += "--- Collected Errors ---\n"
     for error in errors:
         body += f"- {error}\n"
     body += "\nPlease check the bot's logs for more details."
     
-    send_email(subject, body)
+    # Repeated alerts within the coalescing window are merged into one email
+    send_email(subject, body, key="error_alert", coalesce="merge")
 
 def send_summary_email(portfolio_summary, open_positions):
     """
@@ -73,18 +273,19 @@ def send_summary_email(portfolio_summary, open_positions):
         body += "No open positions at the moment.\n"
     else:
         for symbol, pos in open_positions.items():
-            pnl = pos.get('unrealized_pnl', 0)
-            pnl_pct = (pnl / pos['margin']) * 100 if pos.get('margin', 0) > 0 else 0
+            pnl = pos.unrealized_pnl
+            pnl_pct = (pnl / pos.margin) * 100 if pos.margin > 0 else 0
             
             body += f"Symbol: {symbol}\n"
-            body += f"  Side: {pos.get('side', 'N/A').upper()}\n"
-            body += f"  Quantity: {pos.get('quantity', 0):.6f}\n"
-            body += f"  Leverage: {pos.get('leverage', 0)}x\n"
-            body += f"  Entry Price: ${pos.get('entry_price', 0):.4f}\n"
-            body += f"  Current Price: ${pos.get('current_price', 0):.4f}\n"
+            body += f"  Side: {pos.side.upper()}\n"
+            body += f"  Quantity: {pos.quantity:.6f}\n"
+            body += f"  Leverage: {pos.leverage}x\n"
+            body += f"  Entry Price: ${pos.entry_price:.4f}\n"
+            body += f"  Current Price: ${pos.current_price:.4f}\n"
             body += f"  Unrealized PnL: ${pnl:.4f} ({pnl_pct:.2f}%)\n"
             body += "---\n"
 
     body += "\nBot continues to operate normally."
 
-    send_email(subject, body)
+    # Only the newest summary is sent if several are waiting
+    send_email(subject, body, key="summary", coalesce="replace")
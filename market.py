@@ -1,58 +1,115 @@
 import config
-import pandas as pd
-import pandas_ta as ta
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from exchange import get_client
+from candle_store import get_candles
+from indicators import get_indicator_values
 import json
+import metrics
+from models import MarketSnapshot
 
-def get_market_summary(symbol=config.TRADING_SYMBOLS[0], interval='3m', limit=250):
+def build_summary(symbol, indicator_values, current_price):
+    """Turns indicator values (see indicators.IndicatorSet) into the MarketSnapshot used by the engine."""
+    ema_200_value = round(indicator_values['ema_200'], 2)
+    trend = "bullish" if current_price > ema_200_value else "bearish"
+
+    return MarketSnapshot(
+        symbol=symbol,
+        current_price=current_price,
+        ema_20=round(indicator_values['ema_20'], 2),
+        ema_50=round(indicator_values['ema_50'], 2),
+        ema_200=ema_200_value,
+        rsi_14=round(indicator_values['rsi_14'], 2),
+        atr_14=round(indicator_values['atr_14'], 4), # ATR value
+        volume=round(indicator_values['volume'], 2),
+        volume_sma_20=round(indicator_values['volume_sma_20'], 2), # Volume SMA
+        market_trend=trend,
+    )
+
+def get_market_snapshot(symbols, client=None):
+    """
+    Returns prices and 24h statistics for all symbols from a single fetch_tickers
+    request, plus funding rates from one fetch_funding_rates request when
+    config.MARKET_SNAPSHOT_FUNDING is on. Symbols missing from the response are left
+    out, and a failed request gives an empty snapshot (callers then fall back to the
+    latest candle close). Never raises.
+
+    Returns:
+        {symbol: {price, bid, ask, high_24h, low_24h, change_24h_pct, quote_volume_24h, funding_rate}}
+    """
+    if not symbols:
+        return {}
+    client = client or get_client()
+    try:
+        with metrics.MARKET_FETCH_SECONDS.time(part="tickers"):
+            tickers = client.fetch_tickers(list(symbols))
+    except Exception as e:
+        print(f"[MARKET] Could not fetch tickers: {e}")
+        return {}
+
+    snapshot = {}
+    for symbol in symbols:
+        ticker = tickers.get(symbol)
+        if not ticker or ticker.get('last') is None:
+            continue
+        snapshot[symbol] = {
+            "price": ticker['last'],
+            "bid": ticker.get('bid'),
+            "ask": ticker.get('ask'),
+            "high_24h": ticker.get('high'),
+            "low_24h": ticker.get('low'),
+            "change_24h_pct": ticker.get('percentage'),
+            "quote_volume_24h": ticker.get('quoteVolume'),
+            "funding_rate": None,
+        }
+
+    if config.MARKET_SNAPSHOT_FUNDING and snapshot:
+        # Funding belongs to the perpetual contract of each symbol (BTC/USDT -> BTC/USDT:USDT)
+        perpetuals = {s if ':' in s else f"{s}:{s.split('/')[1]}": s for s in snapshot}
+        try:
+            rates = client.fetch_funding_rates(list(perpetuals))
+            for perpetual, rate in rates.items():
+                if perpetual in perpetuals:
+                    snapshot[perpetuals[perpetual]]["funding_rate"] = rate.get('fundingRate')
+        except Exception as e:
+            print(f"[MARKET] Could not fetch funding rates: {e}")
+    return snapshot
+
+def get_market_summary(symbol=config.TRADING_SYMBOLS[0], interval='3m', limit=250, client=None, closed_only=False, ticker=None):
     """
     Fetches recent candles, calculates key indicators including EMA, RSI, ATR, and Volume SMA,
-    and returns a JSON summary for the LLM.
+    and returns them as a models.MarketSnapshot (to_dict() gives the JSON summary).
+    An existing `client` can be passed in to share its connection and rate limiter.
+    With `closed_only=True` the indicators are computed on the last closed candle and
+    the still-forming one is ignored.
+    `ticker` is the symbol's entry from get_market_snapshot(); its price and 24h stats
+    are added to the summary. Without it the price is the latest candle's close, which
+    the candle sync just fetched, so no extra request is made.
     """
     try:
-        client = get_client()
-        # 1. Fetch recent candles
-        ohlcv = client.fetch_ohlcv(symbol, timeframe=interval, limit=limit)
-        
-        # 2. Convert to Pandas DataFrame
-        columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
-        df = pd.DataFrame(ohlcv, columns=columns)
-        
-        # Convert necessary columns to numeric types
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            df[col] = pd.to_numeric(df[col])
-
-        # 3. Calculate Indicators (using pandas-ta)
-        df.ta.ema(length=20, append=True)
-        df.ta.ema(length=50, append=True)
-        df.ta.ema(length=200, append=True)
-        df.ta.rsi(length=14, append=True)
-        df.ta.atr(length=14, append=True) # For dynamic stop-loss
-        df.ta.sma(close=df['volume'], length=20, append=True) # For volume confirmation
+        client = client or get_client()
+        # 1. Get recent candles from the local store (only new candles are downloaded)
+        with metrics.MARKET_FETCH_SECONDS.time(part="candles"):
+            ohlcv = get_candles(symbol, interval, limit, client=client)
+        latest_close = ohlcv[-1][4] if ohlcv else None
+        if closed_only:
+            candle_ms = client.parse_timeframe(interval) * 1000
+            now_ms = time.time() * 1000
+            ohlcv = [candle for candle in ohlcv if candle[0] + candle_ms <= now_ms]
         
-        # 4. Select the last candle (most recent data)
-        last_candle = df.iloc[-1]
+        # 2. Update the streaming indicators with the new candles and read the latest values
+        with metrics.MARKET_FETCH_SECONDS.time(part="indicators"):
+            last_candle = get_indicator_values(symbol, interval, ohlcv)
 
-        # Fetch the most recent price using fetch_ticker for accuracy
-        ticker = client.fetch_ticker(symbol)
-        current_price = ticker['last'] if ticker and 'last' in ticker else last_candle['close']
+        current_price = ticker['price'] if ticker else latest_close
 
-        # 5. Create summary JSON for the LLM
-        ema_200_value = round(last_candle['EMA_200'], 2)
-        trend = "bullish" if current_price > ema_200_value else "bearish"
-
-        summary = {
-            "symbol": symbol,
-            "current_price": current_price,
-            "ema_20": round(last_candle['EMA_20'], 2),
-            "ema_50": round(last_candle['EMA_50'], 2),
-            "ema_200": ema_200_value,
-            "rsi_14": round(last_candle['RSI_14'], 2),
-            "atr_14": round(last_candle['ATRr_14'], 4), # ATR value
-            "volume": round(last_candle['volume'], 2),
-            "volume_sma_20": round(last_candle['SMA_20'], 2), # Volume SMA
-            "market_trend": trend
-        }
+        # 3. Create summary JSON for the LLM
+        summary = build_summary(symbol, last_candle, current_price)
+        if ticker:
+            for key, value in ticker.items():
+                if key != 'price':
+                    setattr(summary, key, value)
         
         return summary
         
@@ -60,6 +117,58 @@ def get_market_summary(symbol=config.TRADING_SYMBOLS[0], interval='3m', limit=25
         print(f"Error getting market data for {symbol}: {e}")
         return None
 
+def get_market_summaries(symbols, interval='3m', closed_only=False):
+    """
+    Fetches market summaries for many symbols at once: one batched ticker request for
+    every symbol's price and 24h stats (get_market_snapshot), then the candles of each
+    symbol using a bounded thread pool.
+    All threads share the process-wide client and its thread-safe rate limiter, so
+    the exchange rate limit is still respected. A symbol that does not finish within
+    MARKET_FETCH_TIMEOUT of its worker starting on it is reported as None instead of
+    stalling the whole cycle.
+
+    Returns:
+        A dictionary of {symbol: summary or None}.
+    """
+    client = get_client()
+    snapshot = get_market_snapshot(symbols, client=client)
+
+    # With a concurrency of 1 the symbols are fetched one by one, but still on a worker thread so the timeout applies
+    concurrency = max(1, min(config.MARKET_FETCH_CONCURRENCY, len(symbols)))
+    results = {symbol: None for symbol in symbols}
+    started = {} # symbol -> time its worker picked it up; the timeout counts from there
+
+    def fetch(symbol):
+        started[symbol] = time.monotonic()
+        return get_market_summary(symbol=symbol, interval=interval, client=client, closed_only=closed_only, ticker=snapshot.get(symbol))
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="market")
+    try:
+        futures = {executor.submit(fetch, symbol): symbol for symbol in symbols}
+        # Backstop for symbols stuck in the queue behind workers that never return
+        batch_deadline = time.monotonic() + config.MARKET_FETCH_TIMEOUT * math.ceil(len(symbols) / concurrency)
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            for future in [f for f in pending if futures[f] in started and now - started[futures[f]] >= config.MARKET_FETCH_TIMEOUT]:
+                pending.discard(future)
+                print(f"[MARKET] Timed out fetching market data for {futures[future]} after {config.MARKET_FETCH_TIMEOUT}s.")
+            if pending and now >= batch_deadline:
+                for future in pending:
+                    print(f"[MARKET] Gave up on market data for {futures[future]}: no worker was free before the batch deadline.")
+                break
+            if not pending:
+                break
+            deadlines = [started[futures[f]] + config.MARKET_FETCH_TIMEOUT for f in pending if futures[f] in started]
+            timeout = min(deadlines + [batch_deadline]) - now
+            done, pending = wait(pending, timeout=max(timeout, 0.0), return_when=FIRST_COMPLETED)
+            for future in done:
+                results[futures[future]] = future.result()
+    finally:
+        # Don't wait for stragglers; their results are simply discarded
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
 def get_broad_market_analysis(symbol=config.TRADING_SYMBOLS[0], interval='3m', limit=480):
     """
     Fetches a larger dataset of candles (e.g., last 24h) to analyze the broader market context.
@@ -67,33 +176,19 @@ def get_broad_market_analysis(symbol=config.TRADING_SYMBOLS[0], interval='3m', l
     This is used by the Strategist LLM.
     """
     try:
-        client = get_client()
-        ohlcv = client.fetch_ohlcv(symbol, timeframe=interval, limit=limit)
-        
-        columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
-        df = pd.DataFrame(ohlcv, columns=columns)
-        
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            df[col] = pd.to_numeric(df[col])
-
-        # Calculate ADX for trend strength
-        adx_indicator = df.ta.adx(length=14)
-        if adx_indicator is not None and not adx_indicator.empty:
-            df['ADX_14'] = adx_indicator.iloc[:, 0] # ADX is the first column
-        else:
-            df['ADX_14'] = 25 # Default neutral value
-
-        # Calculate overall volatility (e.g., ATR as a percentage of price)
-        df.ta.atr(length=14, append=True)
-        
-        last_candle = df.iloc[-1]
+        ohlcv = get_candles(symbol, interval, limit)
+        last_candle = get_indicator_values(symbol, interval, ohlcv)
         current_price = last_candle['close']
-        
-        atr_value = last_candle.get('ATRr_14', 0)
+
+        # Overall volatility (ATR as a percentage of price)
+        atr_value = last_candle['atr_14']
         atr_pct = (atr_value / current_price) * 100 if current_price > 0 else 0
-        
-        adx_value = last_candle.get('ADX_14', 25)
-        
+
+        # ADX for trend strength; default to a neutral value until it is warmed up
+        adx_value = last_candle['adx_14']
+        if math.isnan(adx_value):
+            adx_value = 25
+
         market_condition = "Trending" if adx_value > 25 else "Choppy/Ranging"
 
         analysis = {
@@ -118,7 +213,7 @@ if __name__ == "__main__":
     print("\n--- Testing get_market_summary (for Engine) ---")
     summary = get_market_summary(symbol=test_symbol)
     if summary:
-        print(json.dumps(summary, indent=2))
+        print(json.dumps(summary.to_dict(), indent=2))
 
     print("\n--- Testing get_broad_market_analysis (for Strategist) ---")
     broad_analysis = get_broad_market_analysis(symbol=test_symbol)
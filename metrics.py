@@ -0,0 +1,155 @@
+"""
+Latency histograms and counters for the trading cycle, in Prometheus format.
+
+The worker records into the in-process metrics below and publishes a snapshot on
+the "metrics" IPC channel once per cycle; app.py serves the latest snapshot at
+/metrics in the Prometheus text exposition format. No client library is needed.
+
+Usage:
+    with metrics.STAGE_SECONDS.time(stage="fetch"):
+        ...
+    metrics.ORDERS.inc(action="open_long")
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+import ipc
+
+# Seconds; from a fast in-memory step to a slow exchange round trip
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the `with` block, also when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            return [[list(key), list(counts), total] for key, (counts, total) in self._values.items()]
+
+# --- Trading cycle ---
+STAGE_SECONDS = Histogram("bot_stage_seconds", "Duration of each step of the trading cycle.", ["stage"])
+MARKET_FETCH_SECONDS = Histogram("bot_market_fetch_seconds", "Market data time: per-symbol candles and indicators, and the batched tickers request.", ["part"])
+ORDER_SECONDS = Histogram("bot_order_seconds", "Duration of trade.parse_and_execute per symbol.", ["command"])
+ORDERS = Counter("bot_orders_total", "Orders placed (simulated or on the exchange).", ["action"])
+ERRORS = Counter("bot_errors_total", "Errors by the step they happened in.", ["stage"])
+CYCLE_OVERRUNS = Counter("bot_cycle_overruns_total", "Scheduled runs that lasted past their next slot.", ["job"])
+LAST_CYCLE = Gauge("bot_last_cycle_timestamp_seconds", "Unix time the last trading cycle finished.")
+
+# --- Exchange API ---
+API_CALLS = Counter("bot_api_calls_total", "Exchange API requests.", ["result"])
+API_CALL_SECONDS = Histogram("bot_api_call_seconds", "Exchange HTTP request latency, excluding the rate limit wait.")
+RATE_LIMIT_WAITS = Counter("bot_rate_limit_waits_total", "Requests that had to wait for the rate limiter.")
+RATE_LIMIT_WAIT_SECONDS = Counter("bot_rate_limit_wait_seconds_total", "Total time spent waiting for the rate limiter.")
+RETRIES = Counter("bot_retries_total", "Operations retried after a failure (API requests, SMTP reconnects).", ["operation"])
+
+# --- Notifications ---
+NOTIFICATIONS = Counter("bot_notifications_total", "Notifications by sink and outcome.", ["sink", "result"])
+NOTIFICATION_SECONDS = Histogram("bot_notification_seconds", "Time to deliver a notification to a sink.", ["sink"])
+
+def snapshot():
+    """Returns all metrics as a JSON-serializable dictionary (for the IPC channel)."""
+    return {
+        "timestamp": time.time(),
+        "metrics": [
+            {"name": m.name, "help": m.help, "kind": m.kind, "labelnames": list(m.labelnames),
+             "buckets": list(getattr(m, "buckets", ())), "samples": m.samples()}
+            for m in _registry
+        ],
+    }
+
+def publish():
+    return ipc.publish('metrics', snapshot())
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render(snap):
+    """Renders a snapshot in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in snap["metrics"]:
+        name, names = metric["name"], metric["labelnames"]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        if metric["kind"] != "histogram":
+            for values, value in metric["samples"]:
+                lines.append(f"{name}{_labels(names, values)} {_number(value)}")
+            continue
+        for values, counts, total in metric["samples"]:
+            cumulative = 0
+            for bound, count in zip(metric["buckets"] + [math.inf], counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(names, values, ('le', _number(bound)))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, values)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(names, values)} {cumulative}")
+    return "\n".join(lines) + "\n"
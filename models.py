@@ -0,0 +1,161 @@
+"""
+Typed records for the data every cycle passes around: open positions, per-symbol
+market snapshots (the summary from market.get_market_summary) and engine decisions.
+
+They are slotted classes: no per-instance __dict__, attribute access instead of
+string keys, and a misspelled field (snapshot.ATRr_14 instead of snapshot.atr_14)
+raises instead of silently reading a default. to_dict()/from_dict() convert to and
+from the JSON shapes the state database, IPC channels, trade journal and web UI
+already use, and json_default() lets json.dumps() write them directly.
+
+For code that still treats them as dictionaries they also answer record['field'],
+record.get('field', default) and `'field' in record`. Optional fields that are None
+count as missing there, like an absent key did; a name that is not a field raises
+KeyError even from get().
+"""
+from dataclasses import dataclass, fields, replace
+
+class Record:
+    __slots__ = ()
+    _fields = () # Field names, in to_dict() order
+    _optional = frozenset() # Fields left out of to_dict() while they are None
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(f"{type(self).__name__} has no field {key!r}")
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(f"{type(self).__name__} has no field {key!r}")
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        value = self[key]
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return key in self._fields and getattr(self, key) is not None
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self._fields
+                if name not in self._optional or getattr(self, name) is not None}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Builds a record from its JSON shape. Unknown keys raise TypeError."""
+        return cls(**data)
+
+    def copy(self):
+        return replace(self)
+
+def _record(cls):
+    """Makes `cls` a slotted dataclass and fills in its field tables."""
+    cls = dataclass(slots=True)(cls)
+    cls._fields = tuple(f.name for f in fields(cls))
+    cls._optional = frozenset(f.name for f in fields(cls) if f.default is None)
+    return cls
+
+@_record
+class Position(Record):
+    """An open position, simulated (SimulatedPortfolio) or on the exchange (PositionCache)."""
+    side: str # 'buy'/'sell' in simulation, 'long'/'short' from the exchange
+    entry_price: float
+    quantity: float
+    leverage: float
+    margin: float
+    current_price: float = 0.0
+    unrealized_pnl: float = 0.0
+    atr_at_entry: float = 0.0
+    symbol: str = None # Exchange symbol (live positions)
+    # Stop state from stops.StopBook, saved so a restart keeps a trailed stop
+    stop_price: float = None
+    best_price: float = None
+    partial_taken: bool = None
+
+    @property
+    def is_long(self):
+        return self.side in ('long', 'buy')
+
+@_record
+class MarketSnapshot(Record):
+    """
+    Price and indicators of one symbol for one cycle (see market.build_summary).
+    A price-only snapshot (MarketSnapshot(symbol, price), e.g. a streaming tick) leaves
+    the indicators None.
+    """
+    symbol: str
+    current_price: float
+    ema_20: float = None
+    ema_50: float = None
+    ema_200: float = None
+    rsi_14: float = None
+    atr_14: float = None
+    volume: float = None
+    volume_sma_20: float = None
+    market_trend: str = None
+    # 24h statistics from the batched ticker request (market.get_market_snapshot)
+    bid: float = None
+    ask: float = None
+    high_24h: float = None
+    low_24h: float = None
+    change_24h_pct: float = None
+    quote_volume_24h: float = None
+    funding_rate: float = None
+
+class Decision(Record):
+    """
+    An engine decision ({"command", "reasoning", "trade_amount_usd"}) whose reasoning
+    text is only formatted when something actually reads it.
+    """
+    __slots__ = ('command', 'trade_amount_usd', '_reason', '_reason_args', '_reasoning')
+    _fields = ('command', 'reasoning', 'trade_amount_usd')
+
+    def __init__(self, command, trade_amount_usd=0, reason="", *reason_args):
+        self.command = command
+        self.trade_amount_usd = trade_amount_usd
+        self._reason = reason
+        self._reason_args = reason_args
+        self._reasoning = None
+
+    @property
+    def reasoning(self):
+        if self._reasoning is None:
+            args = self._reason_args
+            self._reasoning = self._reason.format(*args) if args else self._reason
+        return self._reasoning
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('command', 'hold'), data.get('trade_amount_usd', 0), data.get('reasoning', ''))
+
+    def copy(self):
+        return Decision(self.command, self.trade_amount_usd, self.reasoning)
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Decision({self.to_dict()!r})"
+
+def json_default(obj):
+    """`default=` for json.dumps: writes records in their JSON shape, anything else as str()."""
+    if isinstance(obj, Record):
+        return obj.to_dict()
+    return str(obj)
+
+def as_dict(value):
+    """A record, a mapping or None as a plain dictionary."""
+    if value is None:
+        return {}
+    return value.to_dict() if isinstance(value, Record) else dict(value)
@@ -0,0 +1,122 @@
+import json
+import os
+import sqlite3
+import threading
+from models import json_default
+
+class PortfolioStore:
+    """
+    SQLite (WAL mode) storage for the simulated portfolio.
+    - Balance and each open position are separate small rows; a save only rewrites
+      the positions that changed and runs in one transaction, so a crash never
+      leaves a half-written state behind.
+    - Equity history is append-only; rows older than `history_size` are deleted
+      in batches (compaction) instead of rewriting the whole history.
+    """
+    def __init__(self, db_path, history_size=1440):
+        self.db_path = db_path
+        self.history_size = history_size
+        self._lock = threading.Lock()
+        self._saved_positions = {} # symbol -> JSON text of the last saved position
+        self._appends_since_compaction = 0
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS portfolio (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS positions (symbol TEXT PRIMARY KEY, data TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS equity_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                equity REAL NOT NULL
+            );
+        """)
+
+    def load(self):
+        """Returns the saved state as {'balance', 'positions', 'equity_history'}, or None if nothing was saved yet."""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM portfolio WHERE key = 'balance'").fetchone()
+            if row is None:
+                return None
+            positions = {}
+            for symbol, data in self.conn.execute("SELECT symbol, data FROM positions"):
+                positions[symbol] = json.loads(data)
+                self._saved_positions[symbol] = data
+            history = self.conn.execute(
+                "SELECT timestamp, equity FROM equity_history ORDER BY id DESC LIMIT ?", (self.history_size,)
+            ).fetchall()
+        return {
+            'balance': json.loads(row[0]),
+            'positions': positions,
+            'equity_history': [{"timestamp": t, "equity": e} for t, e in reversed(history)],
+        }
+
+    def save(self, balance, positions, equity_point=None):
+        """Saves the balance, the changed/removed positions and an optional new equity point atomically."""
+        with self._lock:
+            self._save([equity_point] if equity_point else [], balance, positions)
+
+    def _save(self, equity_points, balance, positions, only_if_empty=False):
+        """
+        Writes one save in a transaction. With `only_if_empty` the transaction takes the
+        write lock up front and writes nothing (returns False) if a state already exists.
+        """
+        changed = {}
+        for symbol, position in positions.items():
+            data = json.dumps(position, default=json_default) # models.Position or its JSON shape
+            if self._saved_positions.get(symbol) != data:
+                changed[symbol] = data
+        removed = [symbol for symbol in self._saved_positions if symbol not in positions]
+
+        self.conn.execute("BEGIN IMMEDIATE" if only_if_empty else "BEGIN")
+        try:
+            if only_if_empty and self.conn.execute("SELECT 1 FROM portfolio WHERE key = 'balance'").fetchone():
+                self.conn.execute("ROLLBACK")
+                return False
+            self.conn.execute("INSERT OR REPLACE INTO portfolio (key, value) VALUES ('balance', ?)", (json.dumps(balance),))
+            self.conn.executemany("INSERT OR REPLACE INTO positions (symbol, data) VALUES (?, ?)", changed.items())
+            self.conn.executemany("DELETE FROM positions WHERE symbol = ?", [(symbol,) for symbol in removed])
+            self.conn.executemany(
+                "INSERT INTO equity_history (timestamp, equity) VALUES (?, ?)",
+                [(point['timestamp'], point['equity']) for point in equity_points]
+            )
+            self._appends_since_compaction += len(equity_points)
+            if self._appends_since_compaction >= max(1, self.history_size // 10):
+                self._compact()
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        self._saved_positions.update(changed)
+        for symbol in removed:
+            del self._saved_positions[symbol]
+        return True
+
+    def _compact(self):
+        self.conn.execute(
+            "DELETE FROM equity_history WHERE id <= (SELECT MAX(id) FROM equity_history) - ?", (self.history_size,)
+        )
+        self._appends_since_compaction = 0
+
+    def migrate_json(self, json_path, default_balance=None):
+        """
+        Imports a legacy simulation_state.json file into the database in one transaction
+        and renames it to <name>.migrated so it is not imported twice. Returns the imported
+        state, or None if the database already had a state when the transaction started
+        (another process migrated first); load() then returns that state.
+        """
+        with open(json_path, 'r') as f:
+            state = json.load(f)
+        balance = state.get('balance', default_balance)
+        positions = state.get('positions', {})
+        history = state.get('equity_history', [])[-self.history_size:]
+        with self._lock:
+            if not self._save(history, balance, positions, only_if_empty=True):
+                return None
+        os.replace(json_path, json_path + ".migrated")
+        print(f"[SIM] Migrated {json_path} into {self.db_path} ({len(positions)} positions, {len(history)} equity points).")
+        return {'balance': balance, 'positions': positions, 'equity_history': history}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
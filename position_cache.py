@@ -0,0 +1,166 @@
+import threading
+import time
+import config
+from models import Position
+
+def normalize_symbol(symbol):
+    """'BTC/USDT', 'BTC/USDT:USDT' and 'BTCUSDT' all become 'BTCUSDT'."""
+    return symbol.split(':')[0].replace('/', '').upper()
+
+def _from_exchange(position):
+    """Converts a ccxt position into the models.Position used by SimulatedPortfolio and engine.check_exit_triggers."""
+    quantity = abs(float(position.get('contracts') or 0))
+    entry_price = float(position.get('entryPrice') or 0)
+    leverage = float(position.get('leverage') or 1)
+    margin = position.get('initialMargin') or position.get('collateral') or (entry_price * quantity / leverage if leverage else 0)
+    return Position(
+        symbol=position.get('symbol'),
+        side=position.get('side'),
+        quantity=quantity,
+        entry_price=entry_price,
+        current_price=float(position.get('markPrice') or entry_price),
+        unrealized_pnl=float(position.get('unrealizedPnl') or 0),
+        margin=float(margin or 0),
+        leverage=leverage,
+    )
+
+def _pnl(position, price):
+    direction = 1 if position.is_long else -1
+    return (price - position.entry_price) * position.quantity * direction
+
+class PositionCache:
+    """
+    Live-mode view of the account's open positions, keyed by normalized symbol.
+    - refresh() downloads every position with ONE fetch_positions call; the worker
+      calls it once per cycle and get() answers from memory until the snapshot is
+      older than `max_age`, when it refreshes on its own.
+    - apply_fill() records our own order fills right away, so the rest of the cycle
+      sees them, and remembers what the exchange should show. The next refresh
+      reconciles against that: a fill younger than `fill_grace` seconds that the
+      exchange doesn't show yet is kept (the position endpoint lags), an older
+      mismatch is reported and the exchange wins.
+    - If a refresh fails, the last snapshot is used until it is `max_stale` seconds
+      old; after that get() reports "error" rather than trade on stale positions.
+    Local fills also keep the entry ATR, which the exchange doesn't know, for the
+    dynamic stop loss.
+    """
+    def __init__(self, fetch_positions, max_age=config.POSITION_CACHE_MAX_AGE,
+                 max_stale=config.POSITION_CACHE_MAX_STALE, fill_grace=config.POSITION_FILL_GRACE, clock=time.time):
+        self.fetch_positions = fetch_positions
+        self.max_age = max_age
+        self.max_stale = max_stale
+        self.fill_grace = fill_grace
+        self.clock = clock
+        self.positions = {} # normalized symbol -> models.Position
+        self.refreshed_at = None
+        self._fills = {} # normalized symbol -> (expected side or "flat", expected quantity, fill time), until the exchange shows it
+        self._entry_atr = {} # normalized symbol -> ATR at entry of our open position
+        self._lock = threading.RLock()
+
+    def refresh(self):
+        """Reloads all positions from the exchange. Returns False if the request failed."""
+        try:
+            raw_positions = self.fetch_positions()
+        except Exception as e:
+            if "Authentication credentials were not provided" not in str(e):
+                print(f"[POSITIONS] Could not refresh positions: {e}")
+            return False
+        now = self.clock()
+        positions = {}
+        for raw in raw_positions:
+            position = _from_exchange(raw)
+            if position.quantity > 0 and position.symbol:
+                positions[normalize_symbol(position.symbol)] = position
+        with self._lock:
+            self._reconcile(positions, now)
+            for key in list(self._entry_atr):
+                if key in positions:
+                    positions[key].atr_at_entry = self._entry_atr[key]
+                else:
+                    del self._entry_atr[key] # Closed
+            self.positions = positions
+            self.refreshed_at = now
+        return True
+
+    def _reconcile(self, positions, now):
+        for key, (side, quantity, filled_at) in list(self._fills.items()):
+            position = positions.get(key)
+            exchange_view = (position.side, position.quantity) if position else ("flat", 0)
+            if exchange_view[0] == side and (side == "flat" or abs(exchange_view[1] - quantity) <= quantity * 1e-6):
+                del self._fills[key] # Confirmed
+                continue
+            if now - filled_at < self.fill_grace:
+                # The exchange hasn't caught up with our fill yet; keep the local view
+                if side == "flat":
+                    positions.pop(key, None)
+                elif key in self.positions:
+                    positions[key] = self.positions[key]
+                continue
+            print(f"[POSITIONS] {key}: expected {side} {quantity} after our fill, exchange shows "
+                  f"{exchange_view[0]} {exchange_view[1]}. Using the exchange's position.")
+            del self._fills[key]
+
+    def _ensure_fresh(self):
+        """Refreshes when the snapshot is older than max_age. Returns False if only a too-stale snapshot is available."""
+        now = self.clock()
+        if self.refreshed_at is None or now - self.refreshed_at > self.max_age:
+            if not self.refresh() and (self.refreshed_at is None or now - self.refreshed_at > self.max_stale):
+                return False
+        return True
+
+    def get(self, symbol):
+        """Returns (side, quantity) like trade.get_current_position, ("flat", 0) if none, or ("error", 0)."""
+        if not self._ensure_fresh():
+            return "error", 0
+        with self._lock:
+            position = self.positions.get(normalize_symbol(symbol))
+        if not position:
+            return "flat", 0
+        return position.side, position.quantity
+
+    def open_positions(self, symbols=None):
+        """
+        Returns {symbol: position} for every open position. `symbols` (e.g.
+        config.TRADING_SYMBOLS) are used as keys where they match; others keep the
+        exchange's symbol.
+        """
+        if not self._ensure_fresh():
+            return {}
+        names = {normalize_symbol(s): s for s in (symbols or [])}
+        with self._lock:
+            return {names.get(key, position.symbol): position for key, position in self.positions.items()}
+
+    def update_prices(self, prices):
+        """Updates current price and unrealized PnL from {symbol: price} between refreshes."""
+        with self._lock:
+            for symbol, price in prices.items():
+                position = self.positions.get(normalize_symbol(symbol))
+                if position and price:
+                    position.current_price = price
+                    position.unrealized_pnl = _pnl(position, price)
+
+    def apply_fill(self, symbol, side, quantity, price, reduce_only=False, leverage=1, atr_at_entry=None):
+        """Applies one of our own market order fills to the cache ('buy'/'sell' side)."""
+        key = normalize_symbol(symbol)
+        now = self.clock()
+        with self._lock:
+            if reduce_only:
+                self.positions.pop(key, None)
+                self._entry_atr.pop(key, None)
+                self._fills[key] = ("flat", 0, now)
+                return
+            position_side = "long" if side == "buy" else "short"
+            self.positions[key] = Position(
+                symbol=symbol,
+                side=position_side,
+                quantity=quantity,
+                entry_price=price,
+                current_price=price,
+                unrealized_pnl=0.0,
+                margin=price * quantity / leverage if leverage else 0,
+                leverage=leverage,
+                atr_at_entry=atr_at_entry or 0.0,
+            )
+            self._fills[key] = (position_side, quantity, now)
+            if atr_at_entry:
+                self._entry_atr[key] = atr_at_entry
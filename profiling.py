@@ -0,0 +1,121 @@
+"""
+Opt-in profiling of live worker cycles.
+
+Worker stages are wrapped with CycleProfiler.stage(). While the profiler is armed,
+every stage call runs under cProfile (or pyinstrument, if config.PROFILER says so
+and it is installed); at the end of the cycle the stage profiles are merged and
+written to config.PROFILE_DIR:
+
+    profiles/cycle_000042_20250101-120300.prof   # cProfile: open with pstats or snakeviz
+    profiles/cycle_000042_20250101-120300.txt    # top functions by cumulative time
+    profiles/cycle_000042_20250101-120300.html   # pyinstrument
+
+Arming:
+- WORKER_PROFILE=true profiles the first PROFILE_CYCLES cycles after start
+- `kill -USR1 <worker pid>` profiles the next PROFILE_CYCLES cycles at any time
+
+When disarmed, a wrapped stage costs one attribute check.
+"""
+import cProfile
+import functools
+import io
+import os
+import pstats
+import signal
+import threading
+import time
+import config
+
+class CycleProfiler:
+    def __init__(self, directory=config.PROFILE_DIR, cycles=config.PROFILE_CYCLES, backend=config.PROFILER):
+        self.directory = directory
+        self.cycles = cycles
+        self.backend = backend
+        self.remaining = 0
+        self._lock = threading.Lock()
+        self._profiles = [] # Profiles of the current cycle's stages
+        if backend == "pyinstrument":
+            try:
+                import pyinstrument # noqa: F401
+            except ImportError:
+                print("[PROFILE] pyinstrument is not installed; using cProfile.")
+                self.backend = "cprofile"
+
+    @property
+    def armed(self):
+        return self.remaining > 0
+
+    def arm(self, cycles=None):
+        self.remaining = cycles or self.cycles
+        print(f"[PROFILE] Profiling the next {self.remaining} cycle(s) into {self.directory}/")
+
+    def install_signal_handler(self, signum=getattr(signal, "SIGUSR1", None)):
+        """Arms the profiler when the process receives `signum` (SIGUSR1 by default; not available on Windows)."""
+        if signum is None:
+            return
+        signal.signal(signum, lambda *_: self.arm())
+
+    def stage(self, func):
+        """Decorator: profiles calls of `func` while the profiler is armed."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.armed:
+                return func(*args, **kwargs)
+            return self._profile(func, args, kwargs)
+        return wrapper
+
+    def _profile(self, func, args, kwargs):
+        if self.backend == "pyinstrument":
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.stop()
+                with self._lock:
+                    self._profiles.append(profiler.last_session)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another thread is being profiled and this Python allows only one profiler at a time
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with self._lock:
+                self._profiles.append(profiler)
+
+    def cycle_finished(self, cycle):
+        """Writes the merged profile of the cycle's stages. Called at the end of every cycle."""
+        if not self.armed:
+            return
+        with self._lock:
+            profiles, self._profiles = self._profiles, []
+        self.remaining -= 1
+        if not profiles:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, f"cycle_{cycle:06d}_{time.strftime('%Y%m%d-%H%M%S')}")
+            if self.backend == "pyinstrument":
+                from pyinstrument.renderers import HTMLRenderer
+                from pyinstrument.session import Session
+                session = functools.reduce(Session.combine, profiles)
+                with open(base + ".html", "w") as f:
+                    f.write(HTMLRenderer().render(session))
+                print(f"[PROFILE] Wrote {base}.html")
+                return
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(base + ".prof")
+            text = io.StringIO()
+            pstats.Stats(base + ".prof", stream=text).sort_stats("cumulative").print_stats(40)
+            with open(base + ".txt", "w") as f:
+                f.write(text.getvalue())
+            print(f"[PROFILE] Wrote {base}.prof ({stats.total_tt:.3f}s profiled)")
+        except Exception as e:
+            print(f"[PROFILE] Could not write profile for cycle {cycle}: {e}")
@@ -0,0 +1,120 @@
+"""
+Wall-clock aligned job scheduler for the worker.
+
+Decision jobs run once per candle, `settle_delay` seconds after the candle closes
+(so the exchange has finalized it), instead of at whatever offset the process
+happened to start at. Faster jobs (the TP/SL check) run on their own fixed
+interval. Every job has its own thread, so a slow decision cycle never delays
+the TP/SL check.
+
+Slots are computed from the clock, not from the end of the previous run, so
+jobs don't drift. A run that lasts past its next slot is reported as an overrun
+and the missed slots are skipped rather than run back to back.
+"""
+import math
+import threading
+import time
+import traceback
+import ccxt
+import metrics
+
+def timeframe_seconds(timeframe):
+    """'3m' -> 180, '1h' -> 3600 (same parsing as ccxt)."""
+    return ccxt.Exchange.parse_timeframe(timeframe)
+
+class Job:
+    def __init__(self, name, func, period, offset=0.0):
+        self.name = name
+        self.func = func
+        self.period = period
+        self.offset = offset # Seconds after each period boundary
+        self.runs = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.last_duration = None
+        self.max_duration = 0.0
+
+    def next_slot(self, now):
+        """First slot strictly after `now`."""
+        boundary = math.floor((now - self.offset) / self.period) * self.period + self.offset
+        return boundary + self.period
+
+    def finished(self, slot, started, finished, tag="SCHEDULER"):
+        """Records a run of `slot` and returns the next slot, skipping (and reporting) the ones it overran."""
+        self.runs += 1
+        self.last_duration = round(finished - started, 3)
+        self.max_duration = max(self.max_duration, finished - started)
+        next_slot = slot + self.period
+        if finished > next_slot:
+            missed = math.floor((finished - slot) / self.period)
+            self.overruns += 1
+            self.skipped += missed
+            metrics.CYCLE_OVERRUNS.inc(job=self.name)
+            print(f"[{tag}] Job '{self.name}' overran: took {finished - started:.2f}s "
+                  f"(period {self.period}s), skipping {missed} slot(s). Total overruns: {self.overruns}.")
+            next_slot = slot + (missed + 1) * self.period
+        return next_slot
+
+    def stats(self):
+        return {
+            "runs": self.runs, "overruns": self.overruns, "skipped_slots": self.skipped,
+            "last_duration": self.last_duration, "max_duration": round(self.max_duration, 3),
+        }
+
+class Scheduler:
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.jobs = []
+        self._stop = threading.Event()
+        self._threads = []
+
+    def every_candle(self, timeframe, func, settle_delay=0.0, name=None):
+        """Runs `func` once per `timeframe` candle, `settle_delay` seconds after the candle closes."""
+        period = timeframe_seconds(timeframe)
+        if not 0 <= settle_delay < period:
+            raise ValueError(f"settle_delay must be between 0 and {period}s for {timeframe} candles")
+        job = Job(name or func.__name__, func, period, offset=settle_delay)
+        self.jobs.append(job)
+        return job
+
+    def every(self, interval, func, name=None):
+        """Runs `func` every `interval` seconds, aligned to the clock."""
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        job = Job(name or func.__name__, func, interval)
+        self.jobs.append(job)
+        return job
+
+    def _run_job(self, job):
+        slot = job.next_slot(self.clock())
+        while not self._stop.is_set():
+            if self._stop.wait(max(0.0, slot - self.clock())):
+                return
+            started = self.clock()
+            try:
+                job.func()
+            except Exception as e:
+                print(f"[SCHEDULER] Job '{job.name}' failed: {e}")
+                traceback.print_exc()
+            slot = job.finished(slot, started, self.clock())
+
+    def start(self):
+        for job in self.jobs:
+            thread = threading.Thread(target=self._run_job, args=(job,), name=f"job-{job.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+
+    def run_forever(self):
+        """Starts every job and blocks until stop() is called or Ctrl+C is pressed."""
+        self.start()
+        try:
+            while not self._stop.wait(1):
+                pass
+        except KeyboardInterrupt:
+            print("[SCHEDULER] Stopping...")
+            self.stop()
+        for thread in self._threads:
+            thread.join(timeout=5)
@@ -1,36 +1,61 @@
 import config
-import json
 import os
+from collections import deque
 from datetime import datetime
 from market import get_market_summary # To get prices
+from portfolio_store import PortfolioStore
+from models import Position
+from stops import StopBook, EXIT_KINDS, HOLD, PARTIAL
 from trade_logger import log_trade # Import the logger
 
-STATE_FILE = "simulation_state.json"
+STATE_FILE = "simulation_state.json" # Legacy JSON state, migrated into config.SIMULATION_STATE_DB on first start
+MAX_HISTORY_POINTS = 1440 # Keep last 24 hours of 1-min data
 
 class SimulatedPortfolio:
     """
     Manages a virtual portfolio, tracking leveraged positions, balance,
     and PnL across multiple symbols, with state persistence.
+    In backtest mode nothing is read from or written to disk and nothing is printed;
+    every open/close event is collected in `trade_history` instead.
+    Only the process that owns the portfolio (the worker) should `migrate` the legacy
+    JSON state; the web app passes migrate=False and just reads the database.
     """
-    def __init__(self):
-        self.balance = config.SIMULATION_STARTING_BALANCE
+    def __init__(self, starting_balance=None, backtest=False, stops=None, migrate=True):
+        self.balance = config.SIMULATION_STARTING_BALANCE if starting_balance is None else starting_balance
         self.positions = {}
-        self.equity_history = []
-        self._load_state()
-
-    def _load_state(self):
-        if os.path.exists(STATE_FILE):
-            try:
-                with open(STATE_FILE, 'r') as f:
-                    state = json.load(f)
-                    self.balance = state.get('balance', config.SIMULATION_STARTING_BALANCE)
-                    self.positions = state.get('positions', {})
-                    self.equity_history = state.get('equity_history', [])
-                print(f"[SIM] Loaded saved state from: {STATE_FILE}")
-            except Exception as e:
-                print(f"[SIM] Could not read state file, starting fresh: {e}")
+        self.equity_history = deque(maxlen=MAX_HISTORY_POINTS)
+        self.backtest = backtest
+        self.trade_history = []
+        self.stops = stops or StopBook() # TP/SL state of the open positions (see stops.py)
+        self.store = None
+        if not backtest:
+            self.store = PortfolioStore(config.SIMULATION_STATE_DB, history_size=MAX_HISTORY_POINTS)
+            self._load_state(migrate)
+
+    def _load_state(self, migrate=True):
+        state = None
+        try:
+            state = self.store.load()
+            if state is None and migrate and os.path.exists(STATE_FILE):
+                try:
+                    state = self.store.migrate_json(STATE_FILE, config.SIMULATION_STARTING_BALANCE)
+                except FileNotFoundError:
+                    state = None # Another process migrated and renamed the file first
+                if state is None:
+                    state = self.store.load()
+        except Exception as e:
+            print(f"[SIM] Could not read saved state, starting fresh: {e}")
+
+        if state:
+            self.balance = state['balance']
+            self.positions = {symbol: Position.from_dict(data) for symbol, data in state['positions'].items()}
+            for symbol, position in self.positions.items():
+                self.stops.open(symbol, position.side, position.entry_price, position.quantity,
+                                position.margin, position.atr_at_entry, saved=position)
+            self.equity_history.extend(state['equity_history'])
+            print(f"[SIM] Loaded saved state from: {config.SIMULATION_STATE_DB}")
         else:
-            print("[SIM] No state file, starting fresh.")
+            print("[SIM] No saved state, starting fresh.")
             # Add the initial equity point when starting fresh
             self.equity_history.append({
                 "timestamp": datetime.now().isoformat(),
@@ -38,48 +63,74 @@ class SimulatedPortfolio:
             })
 
     def _save_state(self):
+        if self.backtest:
+            return
         try:
             # Add a new data point to the history before saving
             current_summary = self.get_portfolio_summary()
-            self.equity_history.append({
+            equity_point = {
                 "timestamp": datetime.now().isoformat(),
                 "equity": current_summary['total_equity_usd']
-            })
-            
-            # Keep the history from getting too large
-            max_history_points = 1440 # Keep last 24 hours of 1-min data
-            if len(self.equity_history) > max_history_points:
-                self.equity_history = self.equity_history[-max_history_points:]
-
-            with open(STATE_FILE, 'w') as f:
-                state = {
-                    'balance': self.balance, 
-                    'positions': self.positions,
-                    'equity_history': self.equity_history
-                }
-                json.dump(state, f, indent=4)
+            }
+            self.equity_history.append(equity_point)
+            for symbol, position in self.positions.items():
+                if symbol in self.stops:
+                    position.stop_price, position.best_price, position.partial_taken = self.stops.export(symbol)
+            # Only the balance, the changed positions and the new point are written
+            self.store.save(self.balance, self.positions, equity_point)
         except Exception as e:
-            print(f"[SIM] Error writing to state file: {e}")
+            print(f"[SIM] Error writing portfolio state: {e}")
+
+    def _print(self, message):
+        if not self.backtest:
+            print(message)
+
+    def _record_trade(self, log_data):
+        if self.backtest:
+            self.trade_history.append(log_data)
+        else:
+            log_trade(log_data)
 
     def get_position_details(self, symbol):
         position = self.positions.get(symbol)
         if not position:
             return "flat", 0
-        return position['side'], position['quantity']
+        return position.side, position.quantity
 
     def get_all_open_positions(self):
         return self.positions
 
+    def check_exit(self, symbol):
+        """
+        Checks the position against its stop, take profit and partial take profit at its
+        current price. Returns (kind, reason, quantity to close) or None.
+        """
+        position = self.positions.get(symbol)
+        if not position:
+            return None
+        price = position.current_price
+        trigger = self.stops.update(symbol, price)
+        if trigger == HOLD:
+            return None
+        quantity = position.quantity
+        if trigger == PARTIAL:
+            quantity *= self.stops.partial_tp_fraction
+        return EXIT_KINDS[trigger], self.stops.describe(symbol, trigger, price), quantity
+
+    def get_stop_price(self, symbol):
+        """The position's current stop price (it moves with trailing and breakeven stops)."""
+        return self.stops.stop_price_of(symbol)
+
     def get_equity_history(self):
-        return self.equity_history
+        return list(self.equity_history)
 
     def get_portfolio_summary(self):
         """
         Calculates and returns a summary of the entire portfolio.
         Equity = balance + total_margin + total_unrealized_pnl
         """
-        total_margin = sum(p.get('margin', 0) for p in self.positions.values())
-        total_unrealized_pnl = sum(p.get('unrealized_pnl', 0) for p in self.positions.values())
+        total_margin = sum(p.margin for p in self.positions.values())
+        total_unrealized_pnl = sum(p.unrealized_pnl for p in self.positions.values())
         equity = self.balance + total_margin + total_unrealized_pnl
         
         return {
@@ -93,19 +144,19 @@ class SimulatedPortfolio:
         """Stores leverage to be used for the next trade on a symbol."""
         # In this model, leverage is set right before opening.
         # We just need to pass it to the _open_position method.
-        print(f"[SIM] Leverage for {symbol} will be set to {leverage}x on next trade.")
+        self._print(f"[SIM] Leverage for {symbol} will be set to {leverage}x on next trade.")
         # We don't store it globally anymore, it's per-position.
         return True
 
     def create_order(self, symbol, order_type, side, quantity, params=None):
         params = params or {}
         # The price from market_data passed in params is more accurate for logging
-        market_data = params.get('market_data', get_market_summary(symbol=symbol))
-        current_price = market_data.get('current_price')
+        market_data = params.get('market_data') or get_market_summary(symbol=symbol)
+        current_price = market_data.current_price
         reason = params.get('reason', 'N/A')
 
         if params.get('reduceOnly'):
-            self._close_position(symbol, current_price, reason, market_data)
+            self._close_position(symbol, current_price, reason, market_data, quantity)
         else:
             trade_amount_usd = params.get('trade_amount_usd')
             leverage = params.get('leverage', 20)
@@ -113,27 +164,28 @@ class SimulatedPortfolio:
 
     def _open_position(self, symbol, side, quantity, price, leverage, trade_amount_usd, reason, market_data):
         if symbol in self.positions:
-            print(f"[SIM] Position already open for {symbol}.")
+            self._print(f"[SIM] Position already open for {symbol}.")
             return
 
         margin_used = trade_amount_usd
         if self.balance < margin_used:
-            print(f"[SIM] Insufficient balance to open position for {symbol}. Need {margin_used:.2f}, have {self.balance:.2f}")
+            self._print(f"[SIM] Insufficient balance to open position for {symbol}. Need {margin_used:.2f}, have {self.balance:.2f}")
             return
 
         self.balance -= margin_used
 
-        self.positions[symbol] = {
-            'side': side,
-            'entry_price': price,
-            'current_price': price,
-            'quantity': quantity,
-            'leverage': leverage,
-            'margin': margin_used,
-            'unrealized_pnl': 0,
-            'atr_at_entry': market_data.get('atr_14', 0) # Store ATR on entry
-        }
-        print(f"[SIM] POSITION OPENED: {symbol} {side.upper()} {quantity:.6f} @ {price}. Margin: {margin_used:.2f} USDT. New Balance: {self.balance:.2f} USDT")
+        position = self.positions[symbol] = Position(
+            side=side,
+            entry_price=price,
+            current_price=price,
+            quantity=quantity,
+            leverage=leverage,
+            margin=margin_used,
+            unrealized_pnl=0,
+            atr_at_entry=market_data.atr_14 or 0 # Store ATR on entry
+        )
+        self.stops.open(symbol, side, price, quantity, margin_used, position.atr_at_entry)
+        self._print(f"[SIM] POSITION OPENED: {symbol} {side.upper()} {quantity:.6f} @ {price}. Margin: {margin_used:.2f} USDT. New Balance: {self.balance:.2f} USDT")
         self._save_state()
 
         # Log the opening trade
@@ -148,58 +200,79 @@ class SimulatedPortfolio:
             'entry_price': price,
             'market_data': market_data
         }
-        log_trade(log_data)
+        self._record_trade(log_data)
 
 
-    def _close_position(self, symbol, price, reason, market_data):
+    def _close_position(self, symbol, price, reason, market_data, quantity=None):
+        """Closes the position, or `quantity` of it (a partial close keeps the rest open)."""
         position = self.positions.get(symbol)
         if not position:
-            print(f"[SIM] No position to close for {symbol}.")
+            self._print(f"[SIM] No position to close for {symbol}.")
             return
 
-        pnl = self._calculate_pnl(symbol, price)
-        margin_returned = position['margin']
+        partial = quantity is not None and quantity < position.quantity * (1 - 1e-9)
+        closed_quantity = quantity if partial else position.quantity
+        margin_returned = position.margin * closed_quantity / position.quantity if partial else position.margin
+        pnl = self._calculate_pnl(symbol, price, closed_quantity)
         self.balance += margin_returned + pnl
         
-        print(f"[SIM] POSITION CLOSED: {symbol}, Exit: {price}, PnL: {pnl:.4f}, Margin Ret: {margin_returned:.2f}, New Balance: {self.balance:.2f}")
+        self._print(f"[SIM] POSITION {'PARTIALLY ' if partial else ''}CLOSED: {symbol}, Exit: {price}, PnL: {pnl:.4f}, Margin Ret: {margin_returned:.2f}, New Balance: {self.balance:.2f}")
         
         # Log the closing trade
-        pnl_pct = (pnl / position['margin']) * 100 if position['margin'] > 0 else 0
+        pnl_pct = (pnl / margin_returned) * 100 if margin_returned > 0 else 0
         log_data = {
             'action': 'CLOSE',
             'symbol': symbol,
             'reason': reason,
-            'side': position['side'],
-            'quantity': position['quantity'],
-            'leverage': position['leverage'],
-            'margin': position['margin'],
-            'entry_price': position['entry_price'],
+            'side': position.side,
+            'quantity': closed_quantity,
+            'leverage': position.leverage,
+            'margin': margin_returned,
+            'entry_price': position.entry_price,
             'exit_price': price,
             'pnl_usd': pnl,
             'pnl_pct': pnl_pct,
             'market_data': market_data
         }
-        log_trade(log_data)
+        self._record_trade(log_data)
 
-        del self.positions[symbol]
+        if partial:
+            position.quantity -= closed_quantity
+            position.margin -= margin_returned
+            position.unrealized_pnl = self._calculate_pnl(symbol, position.current_price or price)
+            self.stops.mark_partial(symbol)
+        else:
+            del self.positions[symbol]
+            self.stops.close(symbol)
         self._save_state()
 
-    def _calculate_pnl(self, symbol, current_price):
+    def _calculate_pnl(self, symbol, current_price, quantity=None):
         position = self.positions.get(symbol)
         if not position:
             return 0
         
-        price_diff = current_price - position['entry_price']
-        if position['side'] == 'sell':
+        price_diff = current_price - position.entry_price
+        if position.side == 'sell':
             price_diff = -price_diff
             
-        return price_diff * position['quantity']
+        return price_diff * (position.quantity if quantity is None else quantity)
 
-    def update_open_positions(self, market_data_cache: dict):
+    def update_open_positions(self, market_data_cache: dict, from_tick=False):
         """ 
         Iterates through open positions, updates current price and unrealized PnL
         using a pre-fetched cache of market data.
+        With `from_tick=True` (streaming price ticks) only the symbols in the cache are
+        updated, quietly and without saving state; the next cycle persists them.
         """
+        if from_tick:
+            for symbol, market_data in market_data_cache.items():
+                position = self.positions.get(symbol)
+                current_price = market_data.current_price
+                if position and current_price:
+                    position.current_price = current_price
+                    position.unrealized_pnl = self._calculate_pnl(symbol, current_price)
+            return
+
         if not self.positions:
             # Still save state to record equity history even if no positions are open
             self._save_state()
@@ -213,14 +286,14 @@ class SimulatedPortfolio:
             position = self.positions[symbol]
             market_data = market_data_cache.get(symbol)
 
-            if market_data and market_data.get('current_price'):
-                current_price = market_data.get('current_price')
-                old_price = position.get('current_price', 'N/A')
-                position['current_price'] = current_price
-                position['unrealized_pnl'] = self._calculate_pnl(symbol, current_price)
+            if market_data and market_data.current_price:
+                current_price = market_data.current_price
+                old_price = position.current_price
+                position.current_price = current_price
+                position.unrealized_pnl = self._calculate_pnl(symbol, current_price)
                 updated_count += 1
                 # This log can be very noisy, let's comment it out for now.
-                # print(f"[SIM] Updated {symbol}: Old Price: {old_price}, New Price: {current_price}, Unrealized PnL: {position['unrealized_pnl']:.4f}")
+                # print(f"[SIM] Updated {symbol}: Old Price: {old_price}, New Price: {current_price}, Unrealized PnL: {position.unrealized_pnl:.4f}")
             else:
                 print(f"[SIM] Warning: No market data for {symbol} in cache during PnL update.")
         
@@ -32,9 +32,11 @@ cleanup() {
 trap cleanup SIGINT SIGTERM
 
 # Start Gunicorn in the background.
+# Threaded workers, so the dashboards' long-lived /api/stream connections don't block other requests.
+# Each stream holds a thread; DASHBOARD_MAX_STREAMS (config.py) caps them below WEB_THREADS.
 # Output is piped through a while-read loop to prepend a timestamp to each line.
 echo "Starting Gunicorn web server in the background..."
-gunicorn app:app --bind 0.0.0.0:${PORT:-3000} 2>&1 | while IFS= read -r line; do echo "[$(date '+%Y-%m-%d %H:%M:%S')] $line"; done >> "$LOG_FILE" &
+gunicorn app:app --bind 0.0.0.0:${PORT:-3000} --worker-class gthread --threads ${WEB_THREADS:-16} 2>&1 | while IFS= read -r line; do echo "[$(date '+%Y-%m-%d %H:%M:%S')] $line"; done >> "$LOG_FILE" &
 
 # Start the worker process in the background
 # Output is piped through a while-read loop to prepend a timestamp to each line.
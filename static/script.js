@@ -54,40 +54,86 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
-    async function fetchData() {
-        try {
-            // Fetch all data in parallel
-            const [summaryRes, positionsRes, logRes, historyRes] = await Promise.all([
-                fetch('/api/portfolio_summary'),
-                fetch('/api/open_positions'),
-                fetch('/api/trade_log'),
-                fetch('/api/portfolio_history')
-            ]);
+    let openPositions = {};
+    let equityHistory = [];
+    const MAX_HISTORY_POINTS = 1440; // Same as the worker keeps
+
+    function setBotStatus(ok) {
+        const botStatusEl = document.getElementById('bot-status');
+        botStatusEl.textContent = ok ? 'Running' : 'Error';
+        botStatusEl.classList.toggle('bg-success', ok);
+        botStatusEl.classList.toggle('bg-danger', !ok);
+    }
 
-            const summary = await summaryRes.json();
-            updatePortfolioSummary(summary);
+    function markUpdated() {
+        lastUpdatedEl.textContent = `Last Updated: ${new Date().toLocaleTimeString()}`;
+    }
 
-            const positions = await positionsRes.json();
-            updateOpenPositions(positions);
+    // Full state, from /api/snapshot or the first event of /api/stream
+    function applySnapshot(snapshot) {
+        updatePortfolioSummary(snapshot.portfolio_summary);
+        openPositions = snapshot.open_positions || {};
+        updateOpenPositions(openPositions);
+        updateTradeLog(snapshot.log_content, true);
+        equityHistory = snapshot.equity_history || [];
+        updateEquityChart(equityHistory);
+        markUpdated();
+    }
+
+    // Incremental changes pushed by /api/stream
+    function applyDelta(delta) {
+        if (delta.portfolio_summary) {
+            updatePortfolioSummary(delta.portfolio_summary);
+        }
+        if (delta.positions) {
+            Object.assign(openPositions, delta.positions.updated);
+            delta.positions.removed.forEach(symbol => delete openPositions[symbol]);
+            updateOpenPositions(openPositions);
+        }
+        if (delta.equity_points) {
+            equityHistory = equityHistory.concat(delta.equity_points).slice(-MAX_HISTORY_POINTS);
+            updateEquityChart(equityHistory);
+        }
+        if (delta.trades) {
+            updateTradeLog(delta.trades.log_content, false);
+        }
+        markUpdated();
+    }
 
-            const log = await logRes.json();
-            updateTradeLog(log.log_content);
-            
-            const history = await historyRes.json();
-            updateEquityChart(history);
+    function connectStream() {
+        const source = new EventSource('/api/stream');
+        source.addEventListener('snapshot', event => applySnapshot(JSON.parse(event.data)));
+        source.addEventListener('delta', event => applyDelta(JSON.parse(event.data)));
+        source.onopen = () => setBotStatus(true);
+        // EventSource reconnects by itself and the server starts again with a snapshot
+        source.onerror = () => {
+            setBotStatus(false);
+            // A 503 (every stream slot taken) closes the stream for good
+            if (source.readyState === EventSource.CLOSED) {
+                startPolling();
+            }
+        };
+    }
 
-            lastUpdatedEl.textContent = `Last Updated: ${new Date().toLocaleTimeString()}`;
+    function startPolling() {
+        fetchData();
+        setInterval(fetchData, 5000); // Refresh every 5 seconds
+    }
 
+    // Fallback for browsers without EventSource
+    async function fetchData() {
+        try {
+            const response = await fetch('/api/snapshot');
+            applySnapshot(await response.json());
+            setBotStatus(true);
         } catch (error) {
             console.error("Error fetching data:", error);
-            const botStatusEl = document.getElementById('bot-status');
-            botStatusEl.textContent = 'Error';
-            botStatusEl.classList.remove('bg-success');
-            botStatusEl.classList.add('bg-danger');
+            setBotStatus(false);
         }
     }
 
     function updatePortfolioSummary(summary) {
+        if (!summary || summary.total_equity_usd === undefined) return;
         const pnlClass = summary.unrealized_pnl_usd >= 0 ? 'pnl-positive' : 'pnl-negative';
         portfolioSummaryEl.innerHTML = `
             <div class="col">
@@ -144,8 +190,13 @@ document.addEventListener('DOMContentLoaded', function() {
         openPositionsContainerEl.innerHTML = html;
     }
 
-    function updateTradeLog(logContent) {
-        tradeLogEl.textContent = logContent;
+    function updateTradeLog(logContent, replace) {
+        if (!replace && !logContent) return;
+        if (replace) {
+            tradeLogEl.textContent = logContent;
+        } else {
+            tradeLogEl.textContent += logContent; // Append only the new entries
+        }
         tradeLogEl.scrollTop = tradeLogEl.scrollHeight; // Auto-scroll to bottom
     }
 
@@ -162,6 +213,9 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // --- Initial Load ---
     createEquityChart();
-    fetchData();
-    setInterval(fetchData, 5000); // Refresh every 5 seconds
+    if (window.EventSource) {
+        connectStream();
+    } else {
+        startPolling();
+    }
 });
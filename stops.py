@@ -0,0 +1,166 @@
+"""
+Stop management for open positions, shared by the simulated portfolio (worker and
+event-driven backtest) and the vectorized backtest, so all of them exit alike.
+
+On top of the fixed take profit and the ATR stop of engine.check_exit_triggers:
+- trailing stop: the stop follows the best price since entry at TRAILING_STOP_ATR x ATR
+- breakeven: once the price moved BREAKEVEN_AFTER_ATR x ATR in favour, the stop is
+  raised (lowered for shorts) to the entry price
+- partial take profit: PARTIAL_TP_FRACTION of the position is closed once, at
+  PARTIAL_TP_PCT of margin
+All three are off (0) by default, which gives exactly the exits of check_exit_triggers.
+The ATR is the one at entry; without it the percentage fallback stop is used and
+does not trail.
+
+Every level is kept as a price, so a price tick is a handful of comparisons:
+initial_levels() and step() are plain scalar functions (vector_backtest compiles
+them with numba), and StopBook keeps the per-position state in flat arrays
+indexed by a slot per symbol instead of in the position dictionaries.
+"""
+from array import array
+import config
+
+# Exits returned by step()
+HOLD, TAKE_PROFIT, STOP_LOSS, PARTIAL = 0, 1, 2, 3
+EXIT_KINDS = {TAKE_PROFIT: 'take_profit', STOP_LOSS: 'stop_loss', PARTIAL: 'partial_take_profit'}
+
+def initial_levels(direction, entry_price, margin_per_unit, atr, take_profit_pct, stop_loss_pct,
+                   atr_multiplier, trailing_atr, breakeven_atr, partial_tp_pct):
+    """
+    Returns (take_profit_price, stop_price, partial_price, trail_distance, breakeven_distance)
+    for a new position. `direction` is 1 for long, -1 for short; percentages are of margin.
+    partial_price, trail_distance and breakeven_distance are 0 when the feature is off.
+    """
+    take_profit_price = entry_price + direction * margin_per_unit * take_profit_pct / 100
+    if atr > 0:
+        stop_price = entry_price - direction * atr * atr_multiplier
+    else:
+        stop_price = entry_price - direction * margin_per_unit * stop_loss_pct / 100
+    partial_price = 0.0
+    if partial_tp_pct > 0:
+        partial_price = entry_price + direction * margin_per_unit * partial_tp_pct / 100
+    trail_distance = atr * trailing_atr if atr > 0 else 0.0
+    breakeven_distance = atr * breakeven_atr if atr > 0 else 0.0
+    return take_profit_price, stop_price, partial_price, trail_distance, breakeven_distance
+
+def step(direction, entry_price, price, best_price, stop_price, take_profit_price,
+         partial_price, partial_taken, trail_distance, breakeven_distance):
+    """
+    Advances a position's stop by one price and checks its levels (take profit first,
+    like check_exit_triggers). Calling it again with the same price changes nothing.
+    Returns (trigger, best_price, stop_price).
+    """
+    if (price - best_price) * direction > 0:
+        best_price = price
+        if trail_distance > 0:
+            trailed = best_price - direction * trail_distance
+            if (trailed - stop_price) * direction > 0:
+                stop_price = trailed
+        if breakeven_distance > 0 and (best_price - entry_price) * direction >= breakeven_distance \
+                and (entry_price - stop_price) * direction > 0:
+            stop_price = entry_price
+    if (price - take_profit_price) * direction >= 0:
+        return TAKE_PROFIT, best_price, stop_price
+    if (price - stop_price) * direction <= 0:
+        return STOP_LOSS, best_price, stop_price
+    if partial_price > 0 and not partial_taken and (price - partial_price) * direction >= 0:
+        return PARTIAL, best_price, stop_price
+    return HOLD, best_price, stop_price
+
+class StopBook:
+    """Stop state of every open position, one slot per symbol in parallel arrays."""
+    _FIELDS = ("direction", "entry_price", "margin_per_unit", "atr", "best_price", "stop_price", "initial_stop",
+               "take_profit_price", "partial_price", "partial_taken", "trail_distance", "breakeven_distance")
+
+    def __init__(self, take_profit_pct=config.TAKE_PROFIT_PCT, stop_loss_pct=config.STOP_LOSS_PCT,
+                 atr_multiplier=config.ATR_MULTIPLIER, trailing_atr=config.TRAILING_STOP_ATR,
+                 breakeven_atr=config.BREAKEVEN_AFTER_ATR, partial_tp_pct=config.PARTIAL_TP_PCT,
+                 partial_tp_fraction=config.PARTIAL_TP_FRACTION):
+        self.take_profit_pct = take_profit_pct
+        self.stop_loss_pct = stop_loss_pct
+        self.atr_multiplier = atr_multiplier
+        self.trailing_atr = trailing_atr
+        self.breakeven_atr = breakeven_atr
+        self.partial_tp_pct = partial_tp_pct
+        self.partial_tp_fraction = partial_tp_fraction
+        self.slots = {} # symbol -> slot index
+        self._free = []
+        for field in self._FIELDS:
+            setattr(self, field, array('d'))
+
+    def __contains__(self, symbol):
+        return symbol in self.slots
+
+    def open(self, symbol, side, entry_price, quantity, margin, atr, saved=None):
+        """Starts tracking a position. `saved` is the saved position (models.Position) after a restart."""
+        self.close(symbol)
+        if not margin or not quantity or not entry_price:
+            return # Like check_exit_triggers, positions without margin or entry price are not managed
+        direction = 1.0 if side in ['long', 'buy'] else -1.0
+        margin_per_unit = margin / quantity
+        atr = atr or 0.0
+        take_profit_price, stop_price, partial_price, trail_distance, breakeven_distance = initial_levels(
+            direction, entry_price, margin_per_unit, atr, self.take_profit_pct, self.stop_loss_pct,
+            self.atr_multiplier, self.trailing_atr, self.breakeven_atr, self.partial_tp_pct
+        )
+        saved = saved or {}
+        values = (direction, entry_price, margin_per_unit, atr, saved.get('best_price', entry_price),
+                  saved.get('stop_price', stop_price), stop_price, take_profit_price, partial_price,
+                  float(saved.get('partial_taken', False)), trail_distance, breakeven_distance)
+        if self._free:
+            slot = self._free.pop()
+            for field, value in zip(self._FIELDS, values):
+                getattr(self, field)[slot] = value
+        else:
+            slot = len(self.direction)
+            for field, value in zip(self._FIELDS, values):
+                getattr(self, field).append(value)
+        self.slots[symbol] = slot
+
+    def close(self, symbol):
+        slot = self.slots.pop(symbol, None)
+        if slot is not None:
+            self._free.append(slot)
+
+    def mark_partial(self, symbol):
+        slot = self.slots.get(symbol)
+        if slot is not None:
+            self.partial_taken[slot] = 1.0
+
+    def update(self, symbol, price):
+        """Feeds one price to the symbol's position. Returns HOLD, TAKE_PROFIT, STOP_LOSS or PARTIAL."""
+        slot = self.slots.get(symbol)
+        if slot is None or not price:
+            return HOLD
+        trigger, self.best_price[slot], self.stop_price[slot] = step(
+            self.direction[slot], self.entry_price[slot], price, self.best_price[slot], self.stop_price[slot],
+            self.take_profit_price[slot], self.partial_price[slot], self.partial_taken[slot],
+            self.trail_distance[slot], self.breakeven_distance[slot]
+        )
+        return trigger
+
+    def stop_price_of(self, symbol):
+        slot = self.slots.get(symbol)
+        return None if slot is None else self.stop_price[slot]
+
+    def export(self, symbol):
+        """(stop_price, best_price, partial_taken): the state that has to survive a restart, for the saved position."""
+        slot = self.slots[symbol]
+        return self.stop_price[slot], self.best_price[slot], bool(self.partial_taken[slot])
+
+    def describe(self, symbol, trigger, price):
+        """The trade log reason for an exit, in the wording of check_exit_triggers."""
+        slot = self.slots[symbol]
+        pnl_pct = (price - self.entry_price[slot]) * self.direction[slot] / self.margin_per_unit[slot] * 100 \
+            if self.margin_per_unit[slot] else 0.0
+        if trigger == TAKE_PROFIT:
+            return f"TAKE PROFIT triggered at {pnl_pct:.2f}%"
+        if trigger == PARTIAL:
+            return f"PARTIAL TAKE PROFIT ({self.partial_tp_fraction:.0%}) triggered at {pnl_pct:.2f}%"
+        stop_price = self.stop_price[slot]
+        if stop_price != self.initial_stop[slot]:
+            kind = "BREAKEVEN STOP" if stop_price == self.entry_price[slot] else "TRAILING STOP"
+            return f"{kind} triggered at price {price:.4f} (stop: {stop_price:.4f})"
+        if self.atr[slot] > 0:
+            return f"DYNAMIC STOP LOSS triggered at price {price:.4f} (ATR: {self.atr[slot]}, Multiplier: {self.atr_multiplier})"
+        return f"FALLBACK STOP LOSS triggered at {pnl_pct:.2f}%"
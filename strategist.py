@@ -5,10 +5,11 @@ import os
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 import config
+import ipc
 from market import get_broad_market_analysis # Gerçek analiz fonksiyonunu import et
+from trade_journal import get_journal
 
 STRATEGY_FILE = "strategy.json"
-TRADE_LOG_FILE = "trading_log.txt"
 
 # --- SAFETY GUARDRAILS (Loosened for Simulation) ---
 # Define safe operational limits for the parameters that the LLM can set.
@@ -40,7 +41,8 @@ Subtly adjust the parameters in `strategy.json` to improve profitability and red
     -   *Example 1:* "The bot is taking small losses in a choppy market (ADX is low across most assets). The RSI entry zone seems too wide. I should tighten it to look for more significant pullbacks."
     -   *Example 2:* "The market is trending strongly (ADX is high), but the bot is missing entries. The RSI entry zone might be too restrictive. I should widen it slightly."
     -   *Example 3:* "The bot is performing well. No changes are needed at this time."
-4.  **Propose Changes:** Modify the JSON parameters based on your hypothesis.
+4.  **Check Backtest Evidence:** If `backtest_sweep_results` is given, it lists the best parameter sets from a historical backtest sweep with their statistics (Sharpe ratio, max drawdown, profit factor). Prefer changes that move towards well-ranked parameter sets, and be skeptical of changes the backtests do not support.
+5.  **Propose Changes:** Modify the JSON parameters based on your hypothesis.
 
 **CRITICAL OUTPUT RULES:**
 -   Your response MUST be a raw, valid JSON object and NOTHING ELSE.
@@ -51,19 +53,44 @@ Subtly adjust the parameters in `strategy.json` to improve profitability and red
 -   Add a `comment` field at the top of the JSON to explain your reasoning for the change in one sentence.
 """
 
-def read_trade_log(num_bytes=4096):
-    """Reads the last `num_bytes` of the trade log file."""
+def read_trade_log(limit=20):
+    """Reads the last `limit` closed trades and the PnL per symbol from the trade journal."""
     try:
-        with open(TRADE_LOG_FILE, 'rb') as f:
-            f.seek(0, os.SEEK_END)
-            file_size = f.tell()
-            seek_pos = max(0, file_size - num_bytes)
-            f.seek(seek_pos, os.SEEK_SET)
-            return f.read().decode('utf-8', errors='ignore')
+        journal = get_journal()
+        trades = journal.last_closed_trades(limit)
+        if not trades:
+            return "No closed trades in the journal yet. Assuming no trades have been made yet."
+        return {
+            "last_closed_trades": [{
+                "time": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t['time'])),
+                "symbol": t['symbol'],
+                "side": t['side'],
+                "reason": t['reason'],
+                "leverage": t['leverage'],
+                "entry_price": t['entry_price'],
+                "exit_price": t['exit_price'],
+                "pnl_usd": round(t['pnl_usd'] or 0, 4),
+                "pnl_pct": round(t['pnl_pct'] or 0, 2),
+                "rsi_14": t['market_data'].get('rsi_14'),
+                "market_trend": t['market_data'].get('market_trend'),
+            } for t in trades],
+            "pnl_by_symbol": journal.pnl_by_symbol(),
+        }
+    except Exception as e:
+        return f"Error reading trade journal: {e}"
+
+def read_sweep_results(top=5):
+    """Reads the best `top` strategies from the last parameter sweep (see sweep.py), if there is one."""
+    try:
+        with open(config.SWEEP_RESULTS_FILE, 'r') as f:
+            report = json.load(f)
+        report["results"] = report.get("results", [])[:top]
+        return report
     except FileNotFoundError:
-        return "Trade log not found. Assuming no trades have been made yet."
+        return None
     except Exception as e:
-        return f"Error reading trade log: {e}"
+        print(f"[STRATEGIST] Could not read sweep results: {e}")
+        return None
 
 def read_current_strategy():
     """Reads the current strategy from the JSON file."""
@@ -113,13 +140,20 @@ def validate_strategy(strategy_json: dict) -> bool:
         return False
 
 def update_strategy_file(strategy_json: dict):
-    """Writes the new strategy to the strategy.json file."""
+    """
+    Writes the new strategy to the strategy.json file (atomically, via a temp file and
+    rename) and publishes it to the worker over IPC.
+    """
     try:
-        with open(STRATEGY_FILE, 'w') as f:
+        tmp_file = STRATEGY_FILE + ".tmp"
+        with open(tmp_file, 'w') as f:
             json.dump(strategy_json, f, indent=2)
+        os.replace(tmp_file, STRATEGY_FILE)
         print(f"[STRATEGIST] Strategy file updated. New comment: {strategy_json.get('comment')}")
     except Exception as e:
         print(f"[STRATEGIST] ERROR: Could not write to {STRATEGY_FILE}: {e}")
+        return
+    ipc.publish('strategy', {"published_at": time.time(), "strategy": strategy_json})
 
 
 def run_strategist_cycle():
@@ -162,6 +196,9 @@ def run_strategist_cycle():
             "recent_trade_log": trade_log,
             "broader_market_analysis": market_analyses
         }
+        sweep_results = read_sweep_results()
+        if sweep_results:
+            human_input_data["backtest_sweep_results"] = sweep_results
         human_input = json.dumps(human_input_data, indent=2)
 
         messages = [
@@ -198,7 +235,7 @@ def run_strategist_cycle():
 
 if __name__ == "__main__":
     print("--- LLM Strategist Initialized ---")
-    print(f"Watching {STRATEGY_FILE} and {TRADE_LOG_FILE}")
+    print(f"Watching {STRATEGY_FILE} and {config.TRADE_JOURNAL_DB}")
     print("The strategist will run once every 30 minutes.")
     print("------------------------------------")
 
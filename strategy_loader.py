@@ -0,0 +1,85 @@
+import json
+import os
+from collections import namedtuple
+import ipc
+
+# One accepted strategy version. `compiled` is whatever the loader's compile hook returned.
+LoadedStrategy = namedtuple("LoadedStrategy", ["version", "rules", "compiled", "source"])
+
+def _validate_with_strategist(rules):
+    from strategist import validate_strategy # Imported lazily; the strategist pulls in the LLM client
+    return validate_strategy(rules)
+
+class StrategyLoader:
+    """
+    Versioned strategy loader.
+    poll() is cheap: it checks the strategist's IPC channel sequence and stat()s the
+    strategy file, and only parses when one of them changed. A new version is
+    validated (strategist.validate_strategy by default) and compiled, then swapped
+    in with a single assignment, so readers always see a complete version. On a
+    parse, validation or compile error the last good version stays active.
+    """
+    def __init__(self, path='strategy.json', validate=_validate_with_strategist, compile=None):
+        self.path = path
+        self.validate = validate
+        self.compile = compile or (lambda rules: rules)
+        self.current = None
+        self._ipc_seq = 0
+        self._file_version = None # (inode, mtime_ns, size) of the last file version looked at
+
+    @property
+    def rules(self):
+        return self.current.rules if self.current else {}
+
+    @property
+    def compiled(self):
+        return self.current.compiled if self.current else None
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def poll(self):
+        """Loads a new strategy version if one is available. Returns True if a new version was swapped in."""
+        file_version = self._stat()
+        seq, published = ipc.read('strategy', since_seq=self._ipc_seq)
+        if published is not None:
+            self._ipc_seq = seq
+            # Ignore a snapshot older than the file (e.g. the file was edited by hand since)
+            if file_version is None or published['published_at'] * 1e9 >= file_version[1]:
+                self._file_version = file_version # The strategist wrote the same content to the file
+                return self._accept(published['strategy'], f"strategist (IPC sequence {seq})")
+
+        if file_version == self._file_version:
+            return False
+        self._file_version = file_version
+        if file_version is None:
+            print(f"[STRATEGY] {self.path} not found. {self._keeping()}")
+            return False
+        try:
+            with open(self.path, 'r') as f:
+                rules = json.load(f)
+        except Exception as e:
+            print(f"[STRATEGY] Could not parse {self.path}: {e}. {self._keeping()}")
+            return False
+        return self._accept(rules, self.path)
+
+    def _keeping(self):
+        return f"Keeping version {self.current.version}." if self.current else "No valid strategy loaded yet."
+
+    def _accept(self, rules, source):
+        if not self.validate(rules):
+            print(f"[STRATEGY] Strategy from {source} failed validation. {self._keeping()}")
+            return False
+        try:
+            compiled = self.compile(rules)
+        except Exception as e:
+            print(f"[STRATEGY] Could not compile strategy from {source}: {e}. {self._keeping()}")
+            return False
+        version = self.current.version + 1 if self.current else 1
+        self.current = LoadedStrategy(version, rules, compiled, source)
+        print(f"[STRATEGY] Loaded strategy version {version} ({rules.get('strategy_name', 'unnamed')}) from {source}.")
+        return True
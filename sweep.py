@@ -0,0 +1,223 @@
+"""
+Parameter sweep over strategy.json.
+Enumerates (grid) or randomly samples strategies whose parameters stay inside
+strategist.VALIDATION_LIMITS, backtests each one with the vectorized backtest and
+ranks them by the chosen statistics. Candles and indicators are computed once,
+written to .npy files and memory-mapped read-only by every worker process, so the
+pool shares one copy of the data instead of pickling it per task.
+
+The ranked results are written to config.SWEEP_RESULTS_FILE, where the strategist
+picks them up as evidence for its next proposal.
+
+Usage:
+    python sweep.py --grid 3 --params rsi_long_entry_min,rsi_long_entry_max
+    python sweep.py --samples 500 --rank sharpe_ratio,max_drawdown_pct
+"""
+
+import argparse
+import copy
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import config
+import vector_backtest
+from strategist import VALIDATION_LIMITS
+from trade import LEVERAGE_LIMITS
+
+# Where each VALIDATION_LIMITS key lives in strategy.json
+PARAMETERS = {
+    "default_leverage": ("trade_parameters", "default_leverage"),
+    "trade_amount_pct_of_balance": ("trade_parameters", "trade_amount_pct_of_balance"),
+    "rsi_long_entry_min": ("long_conditions", "rsi_entry_min"),
+    "rsi_long_entry_max": ("long_conditions", "rsi_entry_max"),
+    "rsi_exit_extreme_long": ("long_conditions", "rsi_exit_extreme"),
+    "rsi_short_entry_min": ("short_conditions", "rsi_entry_min"),
+    "rsi_short_entry_max": ("short_conditions", "rsi_entry_max"),
+    "rsi_exit_extreme_short": ("short_conditions", "rsi_exit_extreme"),
+}
+
+# Statistics that can be ranked on, and whether higher is better
+RANK_METRICS = {
+    "sharpe_ratio": True,
+    "total_return_pct": True,
+    "profit_factor": True,
+    "win_rate_pct": True,
+    "avg_trade_pnl_usd": True,
+    "max_drawdown_pct": False,
+}
+
+_INDICATOR_NAMES = ["ema_20", "ema_50", "ema_200", "rsi_14", "atr_14", "volume_sma_20"]
+
+def apply_parameters(strategy, parameters):
+    """Returns a copy of the strategy with the given VALIDATION_LIMITS parameters set."""
+    new_strategy = copy.deepcopy(strategy)
+    for name, value in parameters.items():
+        section, field = PARAMETERS[name]
+        new_strategy.setdefault(section, {})[field] = value
+    return new_strategy
+
+def parameter_limits(name):
+    """
+    The range a parameter is swept over: its VALIDATION_LIMITS, narrowed for leverage
+    to LEVERAGE_LIMITS, since parse_command clamps anything outside and those
+    strategies would all backtest the same.
+    """
+    low, high = VALIDATION_LIMITS[name]
+    if name == "default_leverage":
+        low, high = max(low, LEVERAGE_LIMITS[0]), min(high, LEVERAGE_LIMITS[1])
+    return low, high
+
+def unique_candidates(candidates):
+    """Drops parameter sets that repeat an earlier one, keeping the first occurrence's order."""
+    seen = set()
+    for parameters in candidates:
+        key = tuple(sorted(parameters.items()))
+        if key not in seen:
+            seen.add(key)
+            yield parameters
+
+def grid_parameters(names, steps):
+    """Yields every combination of `steps` evenly spaced values per parameter."""
+    axes = []
+    for name in names:
+        low, high = parameter_limits(name)
+        axes.append(sorted(set(int(round(v)) for v in np.linspace(low, high, steps))))
+    for values in itertools.product(*axes):
+        yield dict(zip(names, values))
+
+def sample_parameters(names, samples, seed=None):
+    """Yields `samples` random parameter sets drawn uniformly inside the limits."""
+    rng = random.Random(seed)
+    for _ in range(samples):
+        yield {name: rng.randint(*parameter_limits(name)) for name in names}
+
+def _rank_key(statistics, metrics):
+    key = []
+    for metric in metrics:
+        value = statistics.get(metric)
+        if value is None:
+            # profit_factor is None when there were no losing trades
+            value = float('inf') if metric == 'profit_factor' and statistics.get('trades') else float('-inf')
+        key.append(-value if RANK_METRICS[metric] else value)
+    return tuple(key)
+
+def rank_results(results, metrics, min_trades=1):
+    """Sorts sweep results best first by the given metrics (ties broken by the next metric)."""
+    eligible = [r for r in results if r['statistics']['trades'] >= min_trades]
+    return sorted(eligible, key=lambda r: _rank_key(r['statistics'], metrics))
+
+# --- Worker side: the arrays are memory-mapped once per process ---
+
+_shared = {}
+
+def _init_worker(directory, symbols, strategy, timeframe, starting_balance):
+    _shared['timestamps'] = np.load(os.path.join(directory, 'timestamps.npy'), mmap_mode='r')
+    _shared['ohlcv'] = np.load(os.path.join(directory, 'ohlcv.npy'), mmap_mode='r')
+    indicators = np.load(os.path.join(directory, 'indicators.npy'), mmap_mode='r')
+    _shared['indicators'] = dict(zip(_INDICATOR_NAMES, indicators))
+    _shared['symbols'] = symbols
+    _shared['strategy'] = strategy
+    _shared['timeframe'] = timeframe
+    _shared['starting_balance'] = starting_balance
+
+def _evaluate(parameters):
+    result = vector_backtest.run_vectorized_backtest(
+        apply_parameters(_shared['strategy'], parameters),
+        _shared['timestamps'], _shared['ohlcv'], _shared['symbols'],
+        timeframe=_shared['timeframe'],
+        starting_balance=_shared['starting_balance'],
+        indicators=_shared['indicators'],
+    )
+    return {"parameters": parameters, "statistics": result['statistics']}
+
+def run_sweep(strategy, symbols, candidates, timeframe='3m', data_dir=config.BACKTEST_DATA_DIR,
+              starting_balance=None, workers=config.SWEEP_WORKERS):
+    """
+    Backtests every candidate parameter set on the symbols' history.
+
+    Returns:
+        A list of {"parameters": {...}, "statistics": {...}} in candidate order.
+    """
+    timestamps, ohlcv = vector_backtest.load_arrays(symbols, timeframe, data_dir)
+    indicators = vector_backtest.compute_indicators(ohlcv)
+    with tempfile.TemporaryDirectory(prefix='sweep_') as directory:
+        np.save(os.path.join(directory, 'timestamps.npy'), timestamps)
+        np.save(os.path.join(directory, 'ohlcv.npy'), ohlcv)
+        np.save(os.path.join(directory, 'indicators.npy'), np.stack([indicators[name] for name in _INDICATOR_NAMES]))
+        del ohlcv, indicators
+
+        initargs = (directory, list(symbols), strategy, timeframe, starting_balance)
+        results = []
+        started = time.time()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            for result in executor.map(_evaluate, candidates, chunksize=4):
+                results.append(result)
+                if len(results) % 50 == 0:
+                    print(f"[SWEEP] {len(results)} strategies backtested ({time.time() - started:.1f}s)")
+    return results
+
+def write_results(ranked, metrics, symbols, timeframe, file_path=config.SWEEP_RESULTS_FILE, top=20):
+    """Writes the best `top` results atomically so readers never see a partial file."""
+    report = {
+        "generated_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "symbols": list(symbols),
+        "timeframe": timeframe,
+        "ranked_by": metrics,
+        "results": ranked[:top],
+    }
+    tmp_file = file_path + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_file, file_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep strategy.json parameters inside strategist.VALIDATION_LIMITS.")
+    parser.add_argument('--symbols', default=','.join(config.TRADING_SYMBOLS))
+    parser.add_argument('--timeframe', default='3m')
+    parser.add_argument('--data-dir', default=config.BACKTEST_DATA_DIR)
+    parser.add_argument('--strategy', default='strategy.json')
+    parser.add_argument('--balance', type=float, default=config.SIMULATION_STARTING_BALANCE)
+    parser.add_argument('--params', default=','.join(PARAMETERS), help="Parameters to vary; the rest keep their strategy.json values")
+    parser.add_argument('--grid', type=int, metavar='STEPS', help="Evaluate STEPS evenly spaced values per parameter")
+    parser.add_argument('--samples', type=int, default=200, help="Number of random strategies (when --grid is not given)")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--rank', default='sharpe_ratio,max_drawdown_pct,profit_factor', help=f"Comma-separated metrics from {list(RANK_METRICS)}")
+    parser.add_argument('--min-trades', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=config.SWEEP_WORKERS)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--output', default=config.SWEEP_RESULTS_FILE)
+    args = parser.parse_args()
+
+    symbols = [s.strip() for s in args.symbols.split(',')]
+    names = [p.strip() for p in args.params.split(',')]
+    metrics = [m.strip() for m in args.rank.split(',')]
+    for name in names:
+        if name not in PARAMETERS:
+            parser.error(f"Unknown parameter '{name}'. Choose from {list(PARAMETERS)}")
+    for metric in metrics:
+        if metric not in RANK_METRICS:
+            parser.error(f"Unknown metric '{metric}'. Choose from {list(RANK_METRICS)}")
+
+    with open(args.strategy, 'r') as f:
+        strategy = json.load(f)
+
+    if args.grid:
+        candidates = grid_parameters(names, args.grid)
+    else:
+        candidates = sample_parameters(names, args.samples, args.seed)
+    candidates = list(unique_candidates(candidates))
+    print(f"[SWEEP] Backtesting {len(candidates)} strategies on {len(symbols)} symbols with {args.workers} workers...")
+
+    started = time.time()
+    results = run_sweep(strategy, symbols, candidates, args.timeframe, args.data_dir, args.balance, args.workers)
+    ranked = rank_results(results, metrics, args.min_trades)
+    write_results(ranked, metrics, symbols, args.timeframe, args.output, args.top)
+    print(f"[SWEEP] Finished in {time.time() - started:.1f}s. {len(ranked)} strategies had at least {args.min_trades} trades.")
+    for result in ranked[:5]:
+        print(json.dumps(result['parameters']), {metric: result['statistics'][metric] for metric in metrics})
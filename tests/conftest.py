@@ -0,0 +1,17 @@
+import os
+import sys
+import tempfile
+
+# config.py refuses to import without the LLM settings; the tests never call the LLM
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+os.environ.setdefault("LLM_MODEL_NAME_OPENROUTER", "test")
+# Keep anything the modules write at import time out of the working tree
+_workdir = tempfile.mkdtemp(prefix="tests_")
+os.environ.setdefault("IPC_DIR", os.path.join(_workdir, "ipc"))
+os.environ.setdefault("SIMULATION_STATE_DB", os.path.join(_workdir, "simulation_state.db"))
+os.environ.setdefault("TRADE_JOURNAL_DB", os.path.join(_workdir, "trade_journal.db"))
+os.environ.setdefault("CANDLE_STORE_DIR", os.path.join(_workdir, "candles"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
@@ -0,0 +1,68 @@
+"""
+The dashboard stream: a capped number of /api/stream connections, and one shared
+journal read per push interval however many dashboards are open.
+"""
+import threading
+import pytest
+
+pytest.importorskip("langchain_openai") # app imports trader, which needs the LLM client
+import app
+
+class StubJournal:
+    """Stand-in for the TradeJournal that counts the queries it answers."""
+    def __init__(self):
+        self.entries = []
+        self.queries = 0
+
+    def add(self, count=1):
+        for _ in range(count):
+            self.entries.append({"id": len(self.entries) + 1, "time": 1700000000.0, "action": "INFO",
+                                 "symbol": "BTC/USDT", "reason": "test"})
+
+    def last_id(self):
+        self.queries += 1
+        return self.entries[-1]["id"] if self.entries else 0
+
+    def get_trades(self, limit=50, **filters):
+        self.queries += 1
+        return self.entries[-limit:]
+
+@pytest.fixture
+def journal(monkeypatch):
+    stub = StubJournal()
+    monkeypatch.setattr(app, "get_journal", lambda: stub)
+    monkeypatch.setattr(app, "state_cache", app.StateCache(app.STATE_FILE, journal_tail_size=3))
+    return stub
+
+def test_journal_tail_is_shared_between_readers(journal):
+    journal.add(5)
+    for _ in range(20):
+        last_id, entries = app.state_cache.journal_tail()
+    assert last_id == 5 and [e["id"] for e in entries] == [3, 4, 5]
+    assert journal.queries == 2 # One last_id and one get_trades for all 20 readers
+
+    journal.add()
+    assert app.state_cache.journal_tail()[0] == 5 # Not asked again within the push interval
+    app.state_cache._journal_checked = float('-inf')
+    assert app.state_cache.journal_tail()[0] == 6
+
+    app.state_cache._journal_checked = float('-inf')
+    queries = journal.queries
+    app.state_cache.journal_tail()
+    assert journal.queries == queries + 1 # Unchanged journal: only last_id
+
+def test_stream_connections_are_capped(journal, monkeypatch):
+    monkeypatch.setattr(app, "_stream_slots", threading.BoundedSemaphore(1))
+    client = app.app.test_client()
+
+    first = client.get('/api/stream', buffered=False)
+    assert first.status_code == 200
+    assert next(first.response).startswith(b"event: snapshot")
+
+    refused = client.get('/api/stream')
+    assert refused.status_code == 503 and refused.headers["Retry-After"]
+
+    first.close() # The client went away; its slot is free again
+    second = client.get('/api/stream', buffered=False)
+    assert second.status_code == 200
+    second.close()
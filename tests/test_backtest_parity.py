@@ -0,0 +1,39 @@
+"""
+The vectorized backtest must make exactly the trades of the event-driven one
+(see vector_backtest.compare_backtests), with the stops.py exit features off and on.
+The fixture is 1500 3m candles of three random-walk symbols.
+"""
+import json
+import os
+import pytest
+from conftest import FIXTURES_DIR
+import backtest
+import vector_backtest
+
+SYMBOLS = ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
+
+@pytest.fixture(scope="module")
+def strategy():
+    with open(os.path.join(FIXTURES_DIR, "strategy.json"), "r") as f:
+        return json.load(f)
+
+@pytest.fixture(scope="module")
+def candles():
+    return {symbol: list(backtest.load_candles(symbol, "3m", FIXTURES_DIR)) for symbol in SYMBOLS}
+
+EXIT_PARAMS = {
+    "fixed_exits": dict(trailing_atr=0, breakeven_atr=0, partial_tp_pct=0),
+    "trailing_breakeven_partial": dict(trailing_atr=1.0, breakeven_atr=0.5, partial_tp_pct=10, partial_tp_fraction=0.5),
+}
+
+@pytest.mark.parametrize("exit_params", EXIT_PARAMS.values(), ids=EXIT_PARAMS.keys())
+def test_vectorized_matches_event_driven(strategy, candles, exit_params):
+    result = backtest.run_backtest(strategy, candles, **exit_params)
+    assert len(result["trades"]) > 20 # The fixture has to exercise the rules
+    assert vector_backtest.compare_backtests(strategy, candles, **exit_params) == []
+
+def test_array_statistics_match_compute_statistics(strategy, candles):
+    timestamps, ohlcv = vector_backtest.align_candles(candles)
+    result = vector_backtest.run_vectorized_backtest(strategy, timestamps, ohlcv, SYMBOLS, starting_balance=1000.0)
+    expected = backtest.compute_statistics(result["equity_curve"], result["trades"], 1000.0)
+    assert result["statistics"] == expected
@@ -0,0 +1,101 @@
+"""
+BracketManager against benchmark.MockExchange, which fills reduce-only
+STOP_MARKET / TAKE_PROFIT_MARKET orders when a candle reaches their stopPrice.
+"""
+import pytest
+import benchmark
+import brackets
+from brackets import BracketManager
+from position_cache import PositionCache
+
+SYMBOL = "BTC/USDT"
+START = 1700000000000
+
+def candle(index, price, low=None, high=None):
+    return [START + index * 180000, price, high or price, low or price, price, 10.0]
+
+@pytest.fixture
+def client():
+    # Flat at 100; candle 3 dips to 90, below the 5% stop of a 10x long
+    series = {SYMBOL: [candle(0, 100), candle(1, 100), candle(2, 100), candle(3, 98, low=90)]}
+    return benchmark.MockExchange(series, visible=3)
+
+@pytest.fixture
+def journal(monkeypatch):
+    entries = []
+    monkeypatch.setattr(brackets, "log_trade", entries.append)
+    return entries
+
+def open_long(client, quantity=1.0):
+    client.create_order(SYMBOL, 'market', 'buy', quantity, None, {})
+    cache = PositionCache(client.fetch_positions, fill_grace=0)
+    cache.refresh()
+    position = cache.open_positions([SYMBOL])[SYMBOL]
+    position.leverage = 10
+    position.margin = position.entry_price * position.quantity / 10
+    return cache, position
+
+def manager(client):
+    return BracketManager(lambda: client, take_profit_pct=10, stop_loss_pct=5, atr_multiplier=1.5)
+
+def test_place_and_cancel(client):
+    _, position = open_long(client)
+    bracket_manager = manager(client)
+    bracket_manager.place(SYMBOL, position)
+    assert bracket_manager.protects(SYMBOL)
+    orders = sorted(client.fetch_open_orders(SYMBOL), key=lambda o: o['type'])
+    assert [(o['type'], o['side'], o['amount'], o['reduceOnly']) for o in orders] == [
+        ("STOP_MARKET", 'sell', 1.0, True), ("TAKE_PROFIT_MARKET", 'sell', 1.0, True),
+    ]
+    assert [o['stopPrice'] for o in orders] == pytest.approx([99.5, 101.0])
+
+    bracket_manager.cancel(SYMBOL)
+    assert not bracket_manager.protects(SYMBOL)
+    assert client.fetch_open_orders(SYMBOL) == []
+
+def test_sync_replaces_missing_leg(client, monkeypatch):
+    cache, position = open_long(client)
+    bracket_manager = manager(client)
+    create_order = client.create_order
+    def reject_take_profit(symbol, type, *args):
+        if type == "TAKE_PROFIT_MARKET":
+            raise RuntimeError("rejected")
+        return create_order(symbol, type, *args)
+    monkeypatch.setattr(client, "create_order", reject_take_profit)
+    bracket_manager.place(SYMBOL, position)
+    assert not bracket_manager.protects(SYMBOL)
+    assert len(client.fetch_open_orders(SYMBOL)) == 1
+
+    monkeypatch.setattr(client, "create_order", create_order)
+    bracket_manager.sync({SYMBOL: position})
+    assert bracket_manager.protects(SYMBOL)
+    assert sorted(o['type'] for o in client.fetch_open_orders(SYMBOL)) == ["STOP_MARKET", "TAKE_PROFIT_MARKET"]
+
+def test_sync_keeps_matching_bracket(client, journal):
+    _, position = open_long(client)
+    bracket_manager = manager(client)
+    bracket_manager.place(SYMBOL, position)
+    placed = client.calls['create_order']
+    bracket_manager.sync({SYMBOL: position.copy()})
+    assert client.calls['create_order'] == placed
+    assert journal == []
+
+def test_filled_leg_is_journaled_and_cleaned_up(client, journal):
+    cache, position = open_long(client)
+    bracket_manager = manager(client)
+    bracket_manager.place(SYMBOL, position)
+
+    client.advance() # The stop triggers; the take profit expires with the position
+    cache.refresh()
+    assert cache.open_positions([SYMBOL]) == {}
+    bracket_manager.sync(cache.open_positions([SYMBOL]))
+
+    assert not bracket_manager.brackets
+    assert client.fetch_open_orders(SYMBOL) == []
+    assert len(journal) == 1
+    close = journal[0]
+    assert (close['action'], close['symbol'], close['side'], close['quantity']) == ('CLOSE', SYMBOL, 'long', 1.0)
+    assert close['exit_price'] == pytest.approx(99.5)
+    assert close['pnl_usd'] == pytest.approx(-0.5)
+    assert close['pnl_pct'] == pytest.approx(-5.0)
+    assert close['time'] == START / 1000 + 3 * 180
@@ -0,0 +1,54 @@
+"""
+engine.CompiledStrategy must decide exactly like the reference engine.decide_action,
+for every filter combination, on generated snapshots and positions that include the
+rule boundaries (price at EMA200, RSI at the zone limits, volume at its SMA).
+"""
+import itertools
+import random
+import pytest
+import engine
+from models import MarketSnapshot
+
+FLAGS = list(itertools.product([False, True], repeat=3))
+POSITIONS = [('flat', 0), ('long', 1.5), ('buy', 1.5), ('short', 2.0), ('sell', 2.0)]
+RSI_EDGES = [25, 30, 50, 70, 75, 35, 65, 28, 72]
+
+def make_strategy(use_trend, use_rsi, use_volume, no_trade_zone_pct):
+    return {
+        "filters": {"use_ema_trend_filter": use_trend, "no_trade_zone_pct": no_trade_zone_pct,
+                    "use_rsi_pullback": use_rsi, "use_volume_confirmation": use_volume},
+        "long_conditions": {"rsi_entry_min": 30, "rsi_entry_max": 50, "rsi_exit_extreme": 75},
+        "short_conditions": {"rsi_entry_min": 50, "rsi_entry_max": 70, "rsi_exit_extreme": 25},
+        "trade_parameters": {"default_leverage": 15, "trade_amount_pct_of_balance": 12},
+    }
+
+def make_snapshots(rng, count):
+    for _ in range(count):
+        ema_200 = rng.uniform(50, 150)
+        price = rng.choice([ema_200, ema_200 * rng.uniform(0.99, 1.01), ema_200 * rng.uniform(0.8, 1.2)])
+        volume_sma = rng.uniform(100, 1000)
+        yield MarketSnapshot(
+            symbol="BTC/USDT", current_price=price, ema_20=price, ema_50=price, ema_200=ema_200,
+            rsi_14=rng.choice(RSI_EDGES) if rng.random() < 0.3 else rng.uniform(0, 100),
+            atr_14=rng.uniform(0.1, 5), volume=rng.choice([volume_sma, rng.uniform(0, 2000)]),
+            volume_sma_20=volume_sma, market_trend="bullish" if price > ema_200 else "bearish",
+        )
+
+@pytest.mark.parametrize("no_trade_zone_pct", [0, 0.005])
+@pytest.mark.parametrize("flags", FLAGS, ids=["trend={}-rsi={}-volume={}".format(*f) for f in FLAGS])
+def test_compiled_matches_decide_action(flags, no_trade_zone_pct):
+    strategy = make_strategy(*flags, no_trade_zone_pct)
+    decide = engine.compile_strategy(strategy).decide
+    rng = random.Random(hash((flags, no_trade_zone_pct)) & 0xFFFF)
+    for snapshot in make_snapshots(rng, 300):
+        portfolio_summary = {"available_balance_usd": rng.uniform(0, 5000)}
+        for position_status in POSITIONS:
+            expected = engine.decide_action(strategy, snapshot.to_dict(), position_status, portfolio_summary)
+            assert decide(snapshot, position_status, portfolio_summary) == expected, (snapshot, position_status)
+
+def test_decide_all_isolates_failures():
+    compiled = engine.compile_strategy(make_strategy(True, True, True, 0))
+    snapshot = next(make_snapshots(random.Random(1), 1))
+    decisions = compiled.decide_all({"BTC/USDT": snapshot, "ETH/USDT": None}, {}, {"available_balance_usd": 100})
+    assert decisions["BTC/USDT"] == engine.decide_action(compiled.strategy, snapshot.to_dict(), ('flat', 0), {"available_balance_usd": 100})
+    assert isinstance(decisions["ETH/USDT"], AttributeError)
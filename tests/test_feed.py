@@ -0,0 +1,58 @@
+"""ReplayFeed replays recorded Binance combined-stream messages through on_tick, in order."""
+import json
+import pytest
+import config
+import feed
+
+SYMBOLS = ["BTC/USDT", "ETH/USDT:USDT"]
+
+def kline(stream_symbol, close, event_time):
+    return {"stream": f"{stream_symbol.lower()}@kline_1m",
+            "data": {"e": "kline", "E": event_time, "s": stream_symbol, "k": {"i": "1m", "c": str(close)}}}
+
+def book_ticker(stream_symbol, bid, ask):
+    return {"stream": f"{stream_symbol.lower()}@bookTicker",
+            "data": {"u": 1, "s": stream_symbol, "b": str(bid), "B": "1", "a": str(ask), "A": "1"}}
+
+@pytest.fixture
+def replay_file(tmp_path):
+    messages = [
+        book_ticker("BTCUSDT", 100.0, 101.0),
+        kline("ETHUSDT", 2000.5, 1700000000000),
+        book_ticker("DOGEUSDT", 0.1, 0.2), # Not subscribed
+        {"result": None, "id": 1}, # Subscription reply
+        kline("BTCUSDT", 99.0, 1700000001000),
+        book_ticker("ETHUSDT", 0, 0), # No price
+        kline("ETHUSDT", 2001.0, 1700000002000),
+    ]
+    path = tmp_path / "feed.jsonl"
+    path.write_text("\n".join(json.dumps(m) for m in messages[:4]) + "\n\n" + "\n".join(json.dumps(m) for m in messages[4:]) + "\n")
+    return str(path)
+
+def test_replay_calls_on_tick_in_order(replay_file):
+    ticks = []
+    feed.ReplayFeed(SYMBOLS, lambda symbol, price: ticks.append((symbol, price)), replay_file, interval='1m').run()
+    assert ticks == [("BTC/USDT", 100.5), ("ETH/USDT:USDT", 2000.5), ("BTC/USDT", 99.0), ("ETH/USDT:USDT", 2001.0)]
+
+def test_failing_callback_does_not_stop_the_replay(replay_file):
+    ticks = []
+    def on_tick(symbol, price):
+        ticks.append(symbol)
+        if len(ticks) == 1:
+            raise RuntimeError("boom")
+    feed.ReplayFeed(SYMBOLS, on_tick, replay_file).run()
+    assert len(ticks) == 4
+
+def test_replay_runs_in_a_thread_and_can_stop(replay_file):
+    ticks = []
+    replay = feed.ReplayFeed(SYMBOLS, lambda symbol, price: (ticks.append(price), replay.stop()), replay_file)
+    replay.start()._thread.join(timeout=5)
+    assert not replay._thread.is_alive()
+    assert ticks == [100.5] # Stopped after the first tick
+
+def test_create_feed_uses_the_given_interval(replay_file, monkeypatch):
+    monkeypatch.setattr(config, "MARKET_FEED_MODE", "replay")
+    monkeypatch.setattr(config, "MARKET_FEED_REPLAY_FILE", replay_file)
+    replay = feed.create_feed(SYMBOLS, lambda symbol, price: None, interval='15m')
+    assert isinstance(replay, feed.ReplayFeed)
+    assert replay.streams() == ["btcusdt@bookTicker", "btcusdt@kline_15m", "ethusdt@bookTicker", "ethusdt@kline_15m"]
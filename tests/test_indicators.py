@@ -0,0 +1,95 @@
+"""
+The streaming indicators must match pandas_ta's formulas (written out here with
+pandas ewm/rolling) within the tolerance documented in indicators.py, and a set
+restored from disk must continue exactly where the saved one stopped.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import FIXTURES_DIR
+import backtest
+import indicators
+
+EXACT_RTOL = 1e-9 # EMA and SMA
+WILDER_RTOL = 1e-6 # RSI, ATR and ADX once warmed up
+
+@pytest.fixture(scope="module")
+def candles():
+    return list(backtest.load_candles("BTC/USDT", "3m", FIXTURES_DIR))[:600]
+
+@pytest.fixture(scope="module")
+def frame(candles):
+    return pd.DataFrame(candles, columns=["timestamp", "open", "high", "low", "close", "volume"])
+
+@pytest.fixture(scope="module")
+def streamed(candles):
+    indicator_set = indicators.IndicatorSet()
+    return pd.DataFrame([indicator_set.update(candle) for candle in candles])
+
+def reference_ema(close, length):
+    # pandas_ta ema(sma=True): seeded with the SMA of the first `length` values
+    seeded = close.copy()
+    seeded.iloc[:length - 1] = np.nan
+    seeded.iloc[length - 1] = close.iloc[:length].mean()
+    return seeded.ewm(span=length, adjust=False).mean()
+
+def reference_rma(series, length):
+    return series.ewm(alpha=1.0 / length, adjust=True, min_periods=length).mean()
+
+def reference_true_range(frame):
+    prev_close = frame["close"].shift(1)
+    ranges = pd.concat([frame["high"] - frame["low"], (frame["high"] - prev_close).abs(), (prev_close - frame["low"]).abs()], axis=1)
+    true_range = ranges.max(axis=1)
+    true_range.iloc[0] = np.nan
+    return true_range
+
+def reference_rsi(close, length):
+    change = close.diff()
+    gain = reference_rma(change.clip(lower=0), length)
+    loss = reference_rma((-change).clip(lower=0), length)
+    return 100.0 * gain / (gain + loss)
+
+def reference_adx(frame, length):
+    atr = reference_rma(reference_true_range(frame), length)
+    up = frame["high"].diff()
+    down = -frame["low"].diff()
+    plus = up.where((up > down) & (up > 0), 0.0).where(up.notna())
+    minus = down.where((down > up) & (down > 0), 0.0).where(down.notna())
+    dmp = 100.0 * reference_rma(plus, length) / atr
+    dmn = 100.0 * reference_rma(minus, length) / atr
+    dx = 100.0 * (dmp - dmn).abs() / (dmp + dmn)
+    return reference_rma(dx, length)
+
+def assert_matches(actual, expected, rtol):
+    assert expected.notna().sum() > 100 # The window has to reach past the warm-up
+    np.testing.assert_array_equal(actual.isna().to_numpy(), expected.isna().to_numpy())
+    np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=rtol, atol=0)
+
+@pytest.mark.parametrize("length", [20, 50, 200])
+def test_ema(frame, streamed, length):
+    assert_matches(streamed[f"ema_{length}"], reference_ema(frame["close"], length), EXACT_RTOL)
+
+def test_volume_sma(frame, streamed):
+    assert_matches(streamed["volume_sma_20"], frame["volume"].rolling(20).mean(), EXACT_RTOL)
+
+def test_rsi(frame, streamed):
+    assert_matches(streamed["rsi_14"], reference_rsi(frame["close"], 14), WILDER_RTOL)
+
+def test_atr(frame, streamed):
+    assert_matches(streamed["atr_14"], reference_rma(reference_true_range(frame), 14), WILDER_RTOL)
+
+def test_adx(frame, streamed):
+    assert_matches(streamed["adx_14"], reference_adx(frame, 14), WILDER_RTOL)
+
+def test_peek_matches_update(candles):
+    indicator_set = indicators.IndicatorSet.from_history(candles[:-1])
+    peeked = indicator_set.peek(candles[-1])
+    assert peeked == indicator_set.update(candles[-1])
+
+def test_saved_set_continues_the_stream(candles, tmp_path, monkeypatch):
+    monkeypatch.setattr(indicators, "_sets", {})
+    indicators.get_indicator_values("BTC/USDT", "3m", candles[:400], state_dir=str(tmp_path))
+    indicators._sets.clear() # As after a restart
+    restored = indicators.get_indicator_values("BTC/USDT", "3m", candles[300:451], state_dir=str(tmp_path))
+    uninterrupted = indicators.IndicatorSet.from_history(candles[:450]).peek(candles[450])
+    assert restored == uninterrupted
@@ -0,0 +1,122 @@
+"""
+SMTPSink and NotificationDispatcher against a stub smtplib.SMTP that records what
+it was asked to send and can fail on demand.
+"""
+import smtplib
+import time
+import pytest
+import mailer
+
+class StubSMTP:
+    """Stand-in for smtplib.SMTP. `failures` is a list of exceptions raised by the next sendmail/login calls."""
+    instances = []
+    sent = []
+    failures = []
+    login_error = None
+
+    def __init__(self, host, port, timeout=None):
+        self.closed = False
+        StubSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        if StubSMTP.login_error:
+            raise StubSMTP.login_error
+
+    def sendmail(self, sender, receiver, text):
+        if StubSMTP.failures:
+            raise StubSMTP.failures.pop(0)
+        StubSMTP.sent.append(text)
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture(autouse=True)
+def stub_smtp(monkeypatch):
+    StubSMTP.instances, StubSMTP.sent, StubSMTP.failures, StubSMTP.login_error = [], [], [], None
+    monkeypatch.setattr(smtplib, "SMTP", StubSMTP)
+
+def make_sink(**kwargs):
+    return mailer.SMTPSink(host="localhost", port=2525, sender="bot@example.com", password="secret",
+                           receiver="me@example.com", starttls=False, timeout=5, **kwargs)
+
+def subjects():
+    return [next(line[9:] for line in text.splitlines() if line.startswith("Subject: ")) for text in StubSMTP.sent]
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+def test_sink_reuses_the_connection():
+    sink = make_sink()
+    sink.send(mailer.make_notification("one", "body"))
+    sink.send(mailer.make_notification("two", "body"))
+    assert subjects() == ["one", "two"]
+    assert len(StubSMTP.instances) == 1
+
+def test_sink_reconnects_once_after_a_disconnect():
+    sink = make_sink()
+    sink.send(mailer.make_notification("one", "body"))
+    StubSMTP.failures = [smtplib.SMTPServerDisconnected("idle timeout")]
+    sink.send(mailer.make_notification("two", "body"))
+    assert subjects() == ["one", "two"]
+    assert len(StubSMTP.instances) == 2 and StubSMTP.instances[0].closed
+
+    StubSMTP.failures = [ConnectionResetError(), ConnectionResetError()]
+    with pytest.raises(ConnectionResetError):
+        sink.send(mailer.make_notification("three", "body"))
+    assert len(StubSMTP.instances) == 3 # One retry only
+
+@pytest.mark.parametrize("error", [
+    smtplib.SMTPSenderRefused(550, b"sender refused", "bot@example.com"),
+    smtplib.SMTPRecipientsRefused({"me@example.com": (550, b"no such user")}),
+    smtplib.SMTPDataError(554, b"rejected"),
+], ids=["sender", "recipient", "data"])
+def test_sink_fails_fast_on_refusals(error):
+    sink = make_sink()
+    StubSMTP.failures = [error]
+    with pytest.raises(type(error)):
+        sink.send(mailer.make_notification("one", "body"))
+    assert len(StubSMTP.instances) == 1 # No reconnect
+
+def test_sink_fails_fast_on_login_errors():
+    StubSMTP.login_error = smtplib.SMTPAuthenticationError(535, b"bad credentials")
+    with pytest.raises(smtplib.SMTPAuthenticationError):
+        make_sink().send(mailer.make_notification("one", "body"))
+    assert len(StubSMTP.instances) == 1 and StubSMTP.instances[0].closed
+
+def test_dispatcher_coalesces_repeats():
+    dispatcher = mailer.NotificationDispatcher([make_sink()], rate_limit=0, coalesce_window=0.3)
+    for i in range(3):
+        dispatcher.submit(mailer.make_notification("Alert", f"error {i}", key="alert", coalesce="merge"))
+        dispatcher.submit(mailer.make_notification("Summary", f"summary {i}", key="summary", coalesce="replace"))
+    assert wait_for(lambda: len(StubSMTP.sent) == 2)
+    dispatcher.close()
+    by_subject = dict(zip(subjects(), StubSMTP.sent))
+    assert set(by_subject) == {"Alert (x3)", "Summary"}
+    assert all(f"error {i}" in by_subject["Alert (x3)"] for i in range(3))
+    assert "summary 2" in by_subject["Summary"] and "summary 0" not in by_subject["Summary"]
+
+def test_dispatcher_rate_limits_and_flushes_on_close():
+    dispatcher = mailer.NotificationDispatcher([make_sink()], rate_limit=2, coalesce_window=0)
+    for i in range(5):
+        dispatcher.submit(mailer.make_notification(f"message {i}", "body"))
+    assert wait_for(lambda: len(StubSMTP.sent) == 2)
+    time.sleep(1.2) # A few more dispatcher passes; the limit still holds
+    assert len(StubSMTP.sent) == 2
+    dispatcher.close()
+    assert sorted(subjects()) == [f"message {i}" for i in range(5)]
+
+def test_error_email_names_the_alert_threshold(monkeypatch):
+    submitted = []
+    monkeypatch.setattr(mailer, "send_email", lambda subject, body, **kwargs: submitted.append(body))
+    monkeypatch.setattr(mailer.config, "ERROR_ALERT_CYCLES", 7)
+    mailer.send_error_email(["[BTC/USDT] boom"])
+    assert "encountered 7 consecutive cycles" in submitted[0]
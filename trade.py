@@ -1,11 +1,22 @@
 import config
-from exchange import get_client
+from exchange import get_client, amount_to_precision
 import re
+import metrics
 from market import get_market_summary
+from models import Decision, MarketSnapshot
+from position_cache import PositionCache
+from brackets import BracketManager
+
+# Motorun komutlarındaki kaldıraç bu aralığa sıkıştırılır (parse_command, sweep.py)
+LEVERAGE_LIMITS = (5, 25)
 
 # GLOBAL portfolio değişkeni - main.py tarafından set edilecek
 portfolio = None
 
+# Canlı modda pozisyonlar borsadan tek istekle alınır ve önbellekte tutulur
+_position_cache = None
+_bracket_manager = None
+
 def set_portfolio(portfolio_instance):
     """
     Main script'ten portfolio instance'ını alır.
@@ -23,41 +34,75 @@ def get_current_position(symbol: str):
             return "flat", 0
         return portfolio.get_position_details(symbol)
 
-    try:
-        client = get_client()
-        all_positions = client.fetch_positions()
-        for position in all_positions:
-            if position['info']['symbol'] == symbol.replace('/', ''):
-                amount = float(position['contracts'])
-                side = position['side']
-                if amount > 0:
-                    return side, amount
-        return "flat", 0
-            
-    except Exception as e:
-        if "Authentication credentials were not provided" in str(e):
-            return "flat", 0
-        print(f"Could not get position info for {symbol}: {e}")
-    return "error", 0
+    return get_position_cache().get(symbol)
 
-def parse_and_execute(decision: dict, symbol: str, market_data: dict, position_status: tuple):
+def get_position_cache():
+    """Live mode position cache, shared by the worker's cycle and the TP/SL check."""
+    global _position_cache
+    if _position_cache is None:
+        _position_cache = PositionCache(lambda: get_client().fetch_positions())
+    return _position_cache
+
+def get_bracket_manager():
+    """Live mode exchange-side TP/SL orders (see brackets.py)."""
+    global _bracket_manager
+    if _bracket_manager is None:
+        _bracket_manager = BracketManager(get_client)
+    return _bracket_manager
+
+def _place_order(executor, symbol, side, amount, params, action):
     """
-    Parses the decision dictionary from the engine and executes the trade.
-    Accepts market_data and position_status to avoid redundant API calls.
+    Places a market order. In live mode the fill is applied to the position cache and
+    the position's exchange-side TP/SL bracket is placed (on open) or cancelled (on close).
     """
-    command = decision.get("command", "hold")
-    reasoning = decision.get("reasoning", "No reasoning provided.")
-    trade_amount_usd = decision.get("trade_amount_usd", 0)
-    print(f"[{symbol}] Command received: '{command}' with amount ${trade_amount_usd:.2f}")
+    if config.SIMULATION_MODE:
+        order = executor.create_order(symbol, 'market', side, amount, params)
+        metrics.ORDERS.inc(action=action)
+        return order
+
+    # ccxt signature: (symbol, type, side, amount, price, params); only exchange params go to the exchange.
+    # The amount is rounded to the lot size first, so the cache records what the exchange will show.
+    reduce_only = params.get('reduceOnly', False)
+    amount = amount_to_precision(executor, symbol, amount)
+    order = executor.create_order(symbol, 'market', side, amount, None, {'reduceOnly': True} if reduce_only else {})
+    metrics.ORDERS.inc(action=action)
+    market_data = params.get('market_data')
+    price = (order or {}).get('average') or (market_data.current_price if market_data else None)
+    filled = float((order or {}).get('filled') or amount)
+    get_position_cache().apply_fill(
+        symbol, side, filled, price, reduce_only=reduce_only,
+        leverage=params.get('leverage', 1), atr_at_entry=market_data.atr_14 if market_data else None,
+    )
+    if config.EXCHANGE_BRACKETS:
+        if reduce_only:
+            get_bracket_manager().cancel(symbol)
+        else:
+            get_bracket_manager().place(symbol, get_position_cache().open_positions([symbol]).get(symbol))
+    return order
 
+def parse_command(command: str):
+    """Splits an engine command like 'long 20x' into its action and leverage (clamped to LEVERAGE_LIMITS)."""
     # Parse leverage from command string
     leverage = 20 # Default
     match = re.search(r'(\d+)x', command)
     if match:
         leverage = int(match.group(1))
-        leverage = max(5, min(25, leverage))
+        leverage = max(LEVERAGE_LIMITS[0], min(LEVERAGE_LIMITS[1], leverage))
 
     action = command.split()[0]
+    return action, leverage
+
+def parse_and_execute(decision: Decision, symbol: str, market_data: MarketSnapshot, position_status: tuple):
+    """
+    Parses the engine's decision and executes the trade.
+    Accepts market_data and position_status to avoid redundant API calls.
+    """
+    command = decision.command
+    reasoning = decision.reasoning or "No reasoning provided."
+    trade_amount_usd = decision.trade_amount_usd
+    print(f"[{symbol}] Command received: '{command}' with amount ${trade_amount_usd:.2f}")
+
+    action, leverage = parse_command(command)
     
     # Use the position status passed from the worker
     position_type, position_amount = position_status
@@ -77,7 +122,7 @@ def parse_and_execute(decision: dict, symbol: str, market_data: dict, position_s
         if not market_data:
             print(f"[{symbol}] Market data is missing. Aborting.")
             return
-        current_price = market_data.get('current_price')
+        current_price = market_data.current_price
 
         # Prepare params for the executor
         exec_params = {
@@ -94,7 +139,8 @@ def parse_and_execute(decision: dict, symbol: str, market_data: dict, position_s
                 print(f"[{symbol}] Action: Closing existing {position_type.upper()} position...")
                 close_params = exec_params.copy()
                 close_params['reduceOnly'] = True
-                executor.create_order(symbol, 'market', 'buy' if position_type in ["short", "sell"] else 'sell', position_amount, close_params)
+                _place_order(executor, symbol, 'buy' if position_type in ["short", "sell"] else 'sell', position_amount, close_params,
+                             "close_short" if position_type in ["short", "sell"] else "close_long")
                 position_type = "flat" # Update status after closing
 
             # Only open a new position if flat
@@ -106,7 +152,7 @@ def parse_and_execute(decision: dict, symbol: str, market_data: dict, position_s
                 executor.set_leverage(leverage, symbol)
                 
                 print(f"[{symbol}] Action: Opening {action.upper()} position of {quantity:.6f}...")
-                executor.create_order(symbol, 'market', 'buy' if action == "long" else 'sell', quantity, exec_params)
+                _place_order(executor, symbol, 'buy' if action == "long" else 'sell', quantity, exec_params, f"open_{action}")
             else:
                 print(f"[{symbol}] Already in a {position_type} position, skipping new '{action}' command.")
 
@@ -114,11 +160,11 @@ def parse_and_execute(decision: dict, symbol: str, market_data: dict, position_s
             if position_type in ["long", "buy"]:
                 print(f"[{symbol}] Action: Closing LONG position of {position_amount}...")
                 exec_params['reduceOnly'] = True
-                executor.create_order(symbol, 'market', 'sell', position_amount, exec_params)
+                _place_order(executor, symbol, 'sell', position_amount, exec_params, "close_long")
             elif position_type in ["short", "sell"]:
                 print(f"[{symbol}] Action: Closing SHORT position of {position_amount}...")
                 exec_params['reduceOnly'] = True
-                executor.create_order(symbol, 'market', 'buy', position_amount, exec_params)
+                _place_order(executor, symbol, 'buy', position_amount, exec_params, "close_short")
             else:
                 print(f"[{symbol}] No position to close.")
         
@@ -127,6 +173,7 @@ def parse_and_execute(decision: dict, symbol: str, market_data: dict, position_s
 
     except Exception as e:
         print(f"[{symbol}] Error during trade execution: {e}")
+        metrics.ERRORS.inc(stage="order")
         import traceback
         traceback.print_exc()
 
@@ -138,11 +185,7 @@ if __name__ == "__main__":
         test_portfolio = SimulatedPortfolio()
         set_portfolio(test_portfolio)
     
-    test_decision = {
-        "command": "long 30x",
-        "trade_amount_usd": 100,
-        "reasoning": "Test reasoning."
-    }
+    test_decision = Decision("long 30x", 100, "Test reasoning.")
     test_symbol = "BTC/USDT"
-    parse_and_execute(test_decision, test_symbol)
+    parse_and_execute(test_decision, test_symbol, get_market_summary(test_symbol), ("flat", 0))
     print("---")
\ No newline at end of file
@@ -0,0 +1,148 @@
+import json
+import sqlite3
+import threading
+import time
+import config
+from models import as_dict
+
+# Columns stored for every trade event (market_data is kept as a JSON text column)
+_COLUMNS = ["time", "action", "symbol", "side", "reason", "quantity", "leverage", "margin",
+            "entry_price", "exit_price", "pnl_usd", "pnl_pct", "market_data"]
+
+class TradeJournal:
+    """
+    Structured, append-only journal of trade events (OPEN / CLOSE) in SQLite.
+    The worker appends to it; the strategist and the web UI read only the slices they
+    need through the query methods below. WAL mode lets those readers run in other
+    processes while the worker writes.
+    """
+    def __init__(self, db_path=config.TRADE_JOURNAL_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS trades (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                time REAL NOT NULL,
+                action TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                side TEXT,
+                reason TEXT,
+                quantity REAL,
+                leverage NUMERIC,
+                margin REAL,
+                entry_price REAL,
+                exit_price REAL,
+                pnl_usd REAL,
+                pnl_pct REAL,
+                market_data TEXT
+            );
+            CREATE INDEX IF NOT EXISTS trades_symbol_time ON trades (symbol, time);
+            CREATE INDEX IF NOT EXISTS trades_action_time ON trades (action, time);
+            CREATE INDEX IF NOT EXISTS trades_time ON trades (time);
+        """)
+
+    def record(self, log_data):
+        """Appends one trade event (the dictionary passed to trade_logger.log_trade) and returns it as stored."""
+        entry = {
+            "time": log_data.get('time', time.time()),
+            "action": str(log_data.get('action', 'N/A')).upper(),
+            "symbol": log_data.get('symbol', 'N/A'),
+            "side": log_data.get('side'),
+            "reason": log_data.get('reason'),
+            "quantity": log_data.get('quantity'),
+            "leverage": log_data.get('leverage'),
+            "margin": log_data.get('margin'),
+            "entry_price": log_data.get('entry_price'),
+            "exit_price": log_data.get('exit_price'),
+            "pnl_usd": log_data.get('pnl_usd'),
+            "pnl_pct": log_data.get('pnl_pct'),
+            "market_data": as_dict(log_data.get('market_data')),
+        }
+        values = [json.dumps(entry[c], default=str) if c == "market_data" else entry[c] for c in _COLUMNS]
+        with self._lock:
+            cursor = self.conn.execute(
+                f"INSERT INTO trades ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})", values
+            )
+        entry["id"] = cursor.lastrowid
+        return entry
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            if entry.get("market_data"):
+                entry["market_data"] = json.loads(entry["market_data"])
+            entries.append(entry)
+        return entries
+
+    def get_trades(self, limit=50, action=None, symbol=None, after_id=None, since=None):
+        """
+        Returns the most recent trade events matching the filters, oldest first.
+        `after_id` returns the first `limit` events newer than that id (for incremental polling).
+        """
+        conditions, params = [], []
+        if action:
+            conditions.append("action = ?")
+            params.append(action.upper())
+        if symbol:
+            conditions.append("symbol = ?")
+            params.append(symbol)
+        if after_id is not None:
+            conditions.append("id > ?")
+            params.append(after_id)
+        if since is not None:
+            conditions.append("time >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit)
+        if after_id is not None:
+            # Incremental reads continue from after_id instead of skipping to the newest events
+            return self._query(f"SELECT * FROM trades {where} ORDER BY id LIMIT ?", params)
+        entries = self._query(f"SELECT * FROM trades {where} ORDER BY id DESC LIMIT ?", params)
+        return entries[::-1]
+
+    def last_closed_trades(self, limit=20, symbol=None):
+        """Returns the last `limit` closed trades, oldest first."""
+        return self.get_trades(limit=limit, action='CLOSE', symbol=symbol)
+
+    def pnl_by_symbol(self, since=None):
+        """Returns {symbol: {trades, wins, pnl_usd, avg_pnl_pct}} over closed trades."""
+        sql = """
+            SELECT symbol, COUNT(*) AS trades, SUM(pnl_usd > 0) AS wins,
+                   SUM(pnl_usd) AS pnl_usd, AVG(pnl_pct) AS avg_pnl_pct
+            FROM trades WHERE action = 'CLOSE' AND time >= ? GROUP BY symbol ORDER BY symbol
+        """
+        with self._lock:
+            rows = self.conn.execute(sql, (since or 0,)).fetchall()
+        return {
+            row["symbol"]: {
+                "trades": row["trades"],
+                "wins": row["wins"],
+                "pnl_usd": round(row["pnl_usd"] or 0, 4),
+                "avg_pnl_pct": round(row["avg_pnl_pct"] or 0, 2),
+            } for row in rows
+        }
+
+    def last_id(self):
+        with self._lock:
+            row = self.conn.execute("SELECT MAX(id) FROM trades").fetchone()
+        return row[0] or 0
+
+# One journal per process, opened on first use
+_journal = None
+_journal_lock = threading.Lock()
+
+def get_journal():
+    """Returns the shared TradeJournal of this process."""
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                _journal = TradeJournal()
+    return _journal
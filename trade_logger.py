@@ -2,6 +2,8 @@ import logging
 from logging.handlers import RotatingFileHandler
 import json
 from datetime import datetime
+from trade_journal import get_journal
+from models import json_default
 
 LOG_FILE = "trading_log.txt"
 
@@ -25,61 +27,76 @@ def setup_trade_logger():
     logger.addHandler(handler)
     return logger
 
+def format_trade(entry: dict) -> str:
+    """
+    Renders one journal entry (see trade_journal.TradeJournal.record) in the
+    readable, multi-line format of trading_log.txt.
+    """
+    timestamp = datetime.fromtimestamp(entry.get('time', 0)).strftime('%Y-%m-%d %H:%M:%S')
+    action = (entry.get('action') or 'N/A').upper()
+    symbol = entry.get('symbol') or 'N/A'
+
+    log_entry = f"--- {action} EVENT: {symbol} | {timestamp} ---\n"
+
+    # Reason for the action
+    log_entry += f"Reason: {entry.get('reason') or 'No reason provided.'}\n"
+
+    # Position Details
+    side = (entry.get('side') or 'N/A').upper()
+    quantity = entry.get('quantity') or 0
+    leverage = entry.get('leverage') or 0
+    margin = entry.get('margin') or 0
+    entry_price = entry.get('entry_price') or 0
+
+    log_entry += f"Position: {side} | Qty: {quantity:.6f} | Leverage: {leverage}x | Margin: ${margin:.2f}\n"
+
+    # Market Signals
+    market_data = entry.get('market_data') or {}
+    current_price = market_data.get('current_price', 0)
+    ema_20 = market_data.get('ema_20', 0)
+    ema_50 = market_data.get('ema_50', 0)
+    rsi_14 = market_data.get('rsi_14', 0)
+    trend = market_data.get('market_trend', 'N/A')
+
+    log_entry += f"Signals: Price: ${current_price} | EMA20: {ema_20} | EMA50: {ema_50} | RSI: {rsi_14} | Trend: {trend}\n"
+
+    # Entry/Exit and PnL
+    if action == 'OPEN':
+        log_entry += f"Entry Price: ${entry_price}\n"
+    elif action == 'CLOSE':
+        exit_price = entry.get('exit_price') or 0
+        pnl_usd = entry.get('pnl_usd') or 0
+        pnl_pct = entry.get('pnl_pct') or 0
+        log_entry += f"Entry: ${entry_price} | Exit: ${exit_price}\n"
+        log_entry += f"Result: PnL: ${pnl_usd:.4f} | PnL % on Margin: {pnl_pct:.2f}%\n"
+
+    log_entry += "-" * 50 + "\n\n"
+    return log_entry
+
+def render_log(entries) -> str:
+    """Renders a slice of the journal as trading_log.txt text."""
+    return "".join(format_trade(entry) for entry in entries)
+
 def log_trade(log_data: dict):
     """
-    Logs a trade event (open or close) in a readable, structured format.
-    
+    Records a trade event (open or close) in the structured trade journal and
+    appends its readable rendering to trading_log.txt.
+
     Args:
         log_data (dict): A dictionary containing all relevant trade information.
                          Keys like 'action', 'symbol', 'reason', 'pnl_usd', etc.
     """
     try:
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        action = log_data.get('action', 'N/A').upper()
-        symbol = log_data.get('symbol', 'N/A')
-        
-        log_entry = f"--- {action} EVENT: {symbol} | {timestamp} ---\n"
-        
-        # Reason for the action
-        log_entry += f"Reason: {log_data.get('reason', 'No reason provided.')}\n"
-        
-        # Position Details
-        side = log_data.get('side', 'N/A').upper()
-        quantity = log_data.get('quantity', 0)
-        leverage = log_data.get('leverage', 0)
-        margin = log_data.get('margin', 0)
-        entry_price = log_data.get('entry_price', 0)
-        
-        log_entry += f"Position: {side} | Qty: {quantity:.6f} | Leverage: {leverage}x | Margin: ${margin:.2f}\n"
-        
-        # Market Signals
-        market_data = log_data.get('market_data', {})
-        current_price = market_data.get('current_price', 0)
-        ema_20 = market_data.get('ema_20', 0)
-        ema_50 = market_data.get('ema_50', 0)
-        rsi_14 = market_data.get('rsi_14', 0)
-        trend = market_data.get('market_trend', 'N/A')
-        
-        log_entry += f"Signals: Price: ${current_price} | EMA20: {ema_20} | EMA50: {ema_50} | RSI: {rsi_14} | Trend: {trend}\n"
-        
-        # Entry/Exit and PnL
-        if action == 'OPEN':
-            log_entry += f"Entry Price: ${entry_price}\n"
-        elif action == 'CLOSE':
-            exit_price = log_data.get('exit_price', 0)
-            pnl_usd = log_data.get('pnl_usd', 0)
-            pnl_pct = log_data.get('pnl_pct', 0)
-            log_entry += f"Entry: ${entry_price} | Exit: ${exit_price}\n"
-            log_entry += f"Result: PnL: ${pnl_usd:.4f} | PnL % on Margin: {pnl_pct:.2f}%\n"
-
-        log_entry += "-" * 50 + "\n\n"
-        
-        logger.info(log_entry)
-
+        entry = get_journal().record(log_data)
+    except Exception as e:
+        print(f"[JOURNAL] Could not record trade in the journal: {e}")
+        entry = dict(log_data, time=datetime.now().timestamp())
+    try:
+        logger.info(format_trade(entry))
     except Exception as e:
         # Fallback for any formatting errors
         error_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        logger.error(f"--- LOGGING ERROR | {error_timestamp} ---\nCould not format log entry. Raw data: {json.dumps(log_data)}\nError: {e}\n" + "-"*50 + "\n\n")
+        logger.error(f"--- LOGGING ERROR | {error_timestamp} ---\nCould not format log entry. Raw data: {json.dumps(log_data, default=json_default)}\nError: {e}\n" + "-"*50 + "\n\n")
 
 # Initialize the logger when the module is imported
 logger = setup_trade_logger()
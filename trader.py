@@ -2,6 +2,7 @@ import config
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 import json
+from models import as_dict
 
 SYSTEM_PROMPT = """
 You are a disciplined and expert scalping trader. Your primary goal is to preserve capital and only trade high-probability setups. You will follow the rules below with NO exceptions.
@@ -101,7 +102,7 @@ def get_trade_decision(market_summary: dict, position_status: tuple, portfolio_s
     # Create a combined input for the LLM
     combined_input = {
         "portfolio_summary": portfolio_summary,
-        "market_data": market_summary,
+        "market_data": as_dict(market_summary),
         "position_status": {
             "side": side,
             "quantity": quantity
@@ -1,11 +1,18 @@
-import schedule
+import threading
 import time
 import market
 import engine # trader'ı engine ile değiştiriyoruz
 import config
+import ipc
+import metrics
 import json
+import os
+import dataclasses
 from datetime import datetime
-import trade_logger
+from strategy_loader import StrategyLoader
+from scheduler import Scheduler
+from profiling import CycleProfiler
+from models import Decision, MarketSnapshot
 import mailer # Import the new mailer module
 
 # ÖNCE trade modülünü import et
@@ -13,6 +20,8 @@ import trade
 
 # Initialize portfolio ONCE at startup
 portfolio = None
+# Guards the portfolio between main_job and the streaming feed thread
+portfolio_lock = threading.RLock()
 if config.SIMULATION_MODE:
     from simulation import SimulatedPortfolio
     portfolio = SimulatedPortfolio()
@@ -20,137 +29,216 @@ if config.SIMULATION_MODE:
     trade.set_portfolio(portfolio)
     print(f"[INIT] Portfolio initialized and shared with trade module.")
 
-def check_tp_sl():
+def check_tp_sl(symbols=None, verbose=True):
     """
-    Checks open positions and closes them if TP (percentage-based) or
-    dynamic SL (ATR-based) levels are hit.
+    Checks open positions and closes them (or part of them) when a TP or SL level
+    is hit. In simulation mode the levels come from the portfolio's stop book, which
+    also trails the stop.
+    `symbols` limits the check to those positions (used by the streaming feed,
+    which calls this quietly on every price tick).
+    In live mode the positions come from the position cache, which the cycle keeps fresh,
+    and positions with an exchange-side bracket (brackets.py) are left to the exchange.
     """
-    if not config.SIMULATION_MODE:
-        print("TP/SL check is currently only supported in simulation mode.")
-        return
-
-    open_positions = portfolio.get_all_open_positions()
+    open_positions = open_positions_now()
     if not open_positions:
         return
 
-    print("\n[MGM] Checking open positions for TP/SL...")
-    for symbol, position in list(open_positions.items()):
+    if verbose:
+        print("\n[MGM] Checking open positions for TP/SL...")
+    if symbols is None:
+        selected = list(open_positions.items())
+    else:
+        # Price ticks: look the symbols up instead of scanning every position
+        selected = [(symbol, open_positions[symbol]) for symbol in symbols if symbol in open_positions]
+    for symbol, position in selected:
         try:
-            margin = position.get('margin', 0)
-            unrealized_pnl = position.get('unrealized_pnl', 0)
-            entry_price = position.get('entry_price', 0)
-            current_price = position.get('current_price', 0)
-            atr_at_entry = position.get('atr_at_entry', 0)
-            side = position.get('side')
-
-            if margin == 0 or entry_price == 0:
+            if position.margin == 0 or position.entry_price == 0:
                 continue
 
-            # 1. Check for Take Profit (percentage-based)
-            pnl_pct = (unrealized_pnl / margin) * 100
-            if pnl_pct >= config.TAKE_PROFIT_PCT:
-                reason = f"TAKE PROFIT triggered at {pnl_pct:.2f}%"
-                print(f"✅ [{symbol}] {reason}")
-                trade.parse_and_execute({"command": "close", "reasoning": reason}, symbol)
-                continue # Move to next position
-
-            # 2. Check for Dynamic Stop Loss (ATR-based)
-            if atr_at_entry > 0:
-                stop_loss_price = 0
-                if side in ['long', 'buy']:
-                    stop_loss_price = entry_price - (atr_at_entry * config.ATR_MULTIPLIER)
-                    print(f"[{symbol}] PnL: {pnl_pct:.2f}% | Current: {current_price} | Dynamic SL Price: < {stop_loss_price:.4f}")
-                    if current_price <= stop_loss_price:
-                        reason = f"DYNAMIC STOP LOSS triggered at price {current_price:.4f} (ATR: {atr_at_entry}, Multiplier: {config.ATR_MULTIPLIER})"
-                        print(f"❌ [{symbol}] {reason}")
-                        trade.parse_and_execute({"command": "close", "reasoning": reason}, symbol)
-                elif side in ['short', 'sell']:
-                    stop_loss_price = entry_price + (atr_at_entry * config.ATR_MULTIPLIER)
-                    print(f"[{symbol}] PnL: {pnl_pct:.2f}% | Current: {current_price} | Dynamic SL Price: > {stop_loss_price:.4f}")
-                    if current_price >= stop_loss_price:
-                        reason = f"DYNAMIC STOP LOSS triggered at price {current_price:.4f} (ATR: {atr_at_entry}, Multiplier: {config.ATR_MULTIPLIER})"
-                        print(f"❌ [{symbol}] {reason}")
-                        trade.parse_and_execute({"command": "close", "reasoning": reason}, symbol)
+            current_price = position.current_price
+            if verbose:
+                pnl_pct = (position.unrealized_pnl / position.margin) * 100
+                if config.SIMULATION_MODE:
+                    stop_loss_price = portfolio.get_stop_price(symbol)
+                else:
+                    stop_loss_price = engine.get_stop_loss_price(position, config.ATR_MULTIPLIER)
+                if stop_loss_price is None:
+                    print(f"[{symbol}] PnL: {pnl_pct:.2f}% | Current: {current_price} | (Fallback SL: < {-config.STOP_LOSS_PCT}%)")
+                else:
+                    direction = '<' if position.is_long else '>'
+                    print(f"[{symbol}] PnL: {pnl_pct:.2f}% | Current: {current_price} | SL Price: {direction} {stop_loss_price:.4f}")
+
+            if config.SIMULATION_MODE:
+                # Trailing/breakeven stops and partial take profits; see stops.py
+                trigger = portfolio.check_exit(symbol)
             else:
-                # Fallback to old percentage-based SL if ATR is not available
-                print(f"[{symbol}] PnL: {pnl_pct:.2f}% | Current: {current_price} | (Fallback SL: < {-config.STOP_LOSS_PCT}%)")
-                if pnl_pct <= -config.STOP_LOSS_PCT:
-                    reason = f"FALLBACK STOP LOSS triggered at {pnl_pct:.2f}%"
-                    print(f"❌ [{symbol}] {reason}")
-                    trade.parse_and_execute({"command": "close", "reasoning": reason}, symbol)
+                if config.EXCHANGE_BRACKETS and trade.get_bracket_manager().protects(symbol):
+                    continue
+                trigger = engine.check_exit_triggers(position, config.TAKE_PROFIT_PCT, config.STOP_LOSS_PCT, config.ATR_MULTIPLIER)
+                trigger = trigger and (*trigger, position.quantity)
+            if trigger:
+                kind, reason, quantity = trigger
+                print(f"{'❌' if kind == 'stop_loss' else '✅'} [{symbol}] {reason}")
+                # Close at the position's latest price, keeping the cycle's indicators for the trade log
+                snapshot = latest_market_data.get(symbol)
+                market_data = dataclasses.replace(snapshot, current_price=current_price) if snapshot else MarketSnapshot(symbol, current_price)
+                position_status = (position.side, quantity) # Less than the whole position for a partial take profit
+                trade.parse_and_execute(Decision("close", 0, reason), symbol, market_data, position_status)
 
         except Exception as e:
             print(f"[{symbol}] Error during TP/SL check: {e}")
 
+def open_positions_now():
+    """Open positions by symbol: the simulated portfolio's, or the live position cache's."""
+    if config.SIMULATION_MODE:
+        return portfolio.get_all_open_positions() if portfolio else {}
+    return trade.get_position_cache().open_positions(config.TRADING_SYMBOLS)
+
+def update_position_prices(prices):
+    """Applies {symbol: price} to the open positions' current price and PnL."""
+    if config.SIMULATION_MODE:
+        portfolio.update_open_positions({s: MarketSnapshot(s, p) for s, p in prices.items()}, from_tick=True)
+    else:
+        trade.get_position_cache().update_prices(prices)
+
+def on_price_tick(symbol, price):
+    """
+    Called by the streaming feed for every price update. Updates the position's PnL
+    and runs the TP/SL check for that symbol only. Entry decisions still happen in main_job.
+    """
+    if symbol not in open_positions_now():
+        return
+    with portfolio_lock:
+        update_position_prices({symbol: price})
+        check_tp_sl(symbols=[symbol], verbose=False)
+
+def tp_sl_job():
+    """
+    Runs between decision cycles on its own faster cadence: refreshes the prices of
+    open positions with one batched ticker request and checks TP/SL. With a streaming
+    feed the prices are already live, so only the check runs.
+    """
+    prices = fetch_tp_sl_prices()
+    if prices is not None:
+        check_tp_sl_prices(prices)
+
+def fetch_tp_sl_prices():
+    """
+    The I/O half of tp_sl_job: {symbol: price} for the open positions ({} with a
+    streaming feed), or None if nothing is open. Takes no lock, so the async runtime
+    runs it on its I/O executor.
+    """
+    symbols = list(open_positions_now())
+    if not symbols:
+        return None
+    if config.MARKET_FEED_MODE != 'rest':
+        return {}
+    with metrics.STAGE_SECONDS.time(stage="tp_sl_fetch"):
+        return {s: t['price'] for s, t in market.get_market_snapshot(symbols).items()}
+
+def check_tp_sl_prices(prices):
+    """The position half of tp_sl_job: applies the fetched prices and checks TP/SL, under portfolio_lock."""
+    with metrics.STAGE_SECONDS.time(stage="tp_sl_job"):
+        with portfolio_lock:
+            if prices:
+                update_position_prices(prices)
+            check_tp_sl(verbose=False)
+
 
 # --- State Management ---
 cycle_count = 0
+cycle_started_at = None
 consecutive_error_cycles = 0
 last_cycle_errors = []
 strategy_rules = {}
+latest_market_data = {} # Last cycle's market summaries, used when TP/SL closes between cycles
+strategy_loader = StrategyLoader('strategy.json', compile=engine.compile_strategy)
+profiler = CycleProfiler() # Opt-in; see profiling.py
 # --- End State Management ---
 
 def load_strategy():
-    """Loads strategy rules from strategy.json."""
-    global strategy_rules
-    try:
-        with open('strategy.json', 'r') as f:
-            strategy_rules = json.load(f)
-        print("[INIT] Strategy rules loaded from strategy.json")
-    except Exception as e:
-        print(f"[CRITICAL] Could not load strategy.json: {e}. Bot will not run.")
-        strategy_rules = {} # Reset to prevent running with old/bad config
-
-def main_job():
     """
-    Main job flow: Fetch all data once -> Update PnL -> Check TP/SL -> For each symbol: Decide -> Execute.
-    This new structure uses a "Cycle Cache" to prevent redundant API calls.
+    Picks up a new strategy version if the strategist published one or strategy.json
+    changed. Invalid or half-written versions are rejected and the last good one is kept.
     """
-    global cycle_count, consecutive_error_cycles, last_cycle_errors
+    global strategy_rules
+    strategy_loader.poll()
+    strategy_rules = strategy_loader.rules
+
+def start_cycle():
+    """Starts a new cycle: reloads the strategy and prints the banner. Returns False if the cycle should be skipped."""
+    global cycle_count, cycle_started_at
     cycle_count += 1
-    
-    # Reload strategy every cycle to catch updates made by the strategist
+    cycle_started_at = time.perf_counter()
+
+    # Check for strategy updates made by the strategist every cycle
     load_strategy()
     if not strategy_rules:
         print("[WORKER] Halting cycle because strategy rules are not loaded.")
-        return
-
-    cycle_errors = []
-    is_cycle_successful = False
+        return False
 
     print(f"\n{'='*60}")
     print(f"--- Cycle Start: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} (Cycle #{cycle_count}) ---")
     print(f"--- Strategy: {strategy_rules.get('strategy_name', 'N/A')} ---")
     print(f"{'='*60}")
+    return True
 
-    # --- "CYCLE CACHE" DATA FETCH ---
-    # 1. Fetch market data for all symbols ONCE at the beginning of the cycle.
+@profiler.stage
+def fetch_market_data(cycle_errors):
+    """STEP 1: Fetches market data for all symbols ONCE per cycle. Returns the cycle cache ({} if nothing could be fetched)."""
+    global consecutive_error_cycles, last_cycle_errors, latest_market_data
     print("\n[STEP 1] Fetching market data for all symbols...")
     market_data_cache = {}
+    # Runs right after a candle closed, so decide on that closed candle rather than the one just opened
+    with metrics.STAGE_SECONDS.time(stage="fetch"):
+        summaries = market.get_market_summaries(config.TRADING_SYMBOLS, interval=config.DECISION_TIMEFRAME, closed_only=True)
     for symbol in config.TRADING_SYMBOLS:
-        summary = market.get_market_summary(symbol=symbol, interval='3m')
+        summary = summaries.get(symbol)
         if summary:
             market_data_cache[symbol] = summary
         else:
             error_msg = f"[{symbol}] Could not get market summary, it will be skipped this cycle."
             print(error_msg)
             cycle_errors.append(error_msg)
-    
+            metrics.ERRORS.inc(stage="fetch")
+
     if not market_data_cache:
         print("[WORKER] Could not fetch market data for ANY symbol. Skipping cycle.")
         consecutive_error_cycles += 1
         last_cycle_errors = cycle_errors
-        return # Exit early if no data is available at all
-    
+        return {}
+
+    latest_market_data = market_data_cache
+    ipc.publish('market', {"timestamp": time.time(), "summaries": market_data_cache})
+    return market_data_cache
+
+@profiler.stage
+def decide(market_data_cache):
+    """
+    STEPS 2-5a: Updates PnL, checks TP/SL and gets the engine's decisions for all symbols.
+    The caller must hold portfolio_lock.
+    Returns (portfolio_summary, position_statuses, decisions).
+    """
     # 2. Update PnL for all open positions using the cached data
     if config.SIMULATION_MODE and portfolio:
         print("\n[STEP 2] Updating open positions from cached market data...")
-        portfolio.update_open_positions(market_data_cache)
-        
+        with metrics.STAGE_SECONDS.time(stage="update_positions"):
+            portfolio.update_open_positions(market_data_cache)
+    elif not config.SIMULATION_MODE:
+        # Live: one fetch_positions call per cycle; steps 3 and 5 read from the cache
+        print("\n[STEP 2] Syncing positions from the exchange...")
+        with metrics.STAGE_SECONDS.time(stage="sync_positions"):
+            position_cache = trade.get_position_cache()
+            position_cache.refresh()
+            position_cache.update_prices({s: d.current_price for s, d in market_data_cache.items()})
+            if config.EXCHANGE_BRACKETS:
+                trade.get_bracket_manager().sync(position_cache.open_positions(config.TRADING_SYMBOLS))
+
     # 3. Check for TP/SL on existing positions
-    if config.SIMULATION_MODE and portfolio:
+    if not config.SIMULATION_MODE or portfolio:
         print("\n[STEP 3] Checking TP/SL triggers...")
-        check_tp_sl() # This function internally uses the updated portfolio state
+        with metrics.STAGE_SECONDS.time(stage="tp_sl"):
+            check_tp_sl() # This function internally uses the updated portfolio state
 
     # 4. Get a fresh portfolio summary
     portfolio_summary = {}
@@ -161,6 +249,28 @@ def main_job():
 
     # 5. For each symbol, run the main trading logic using cached data
     print("\n[STEP 5] Processing trading symbols with RULE-BASED ENGINE...")
+    # a. Get current position status and the compiled engine's decisions for all symbols at once
+    position_statuses = {}
+    for symbol in market_data_cache:
+        try:
+            position_statuses[symbol] = trade.get_current_position(symbol=symbol)
+        except Exception as e:
+            print(f"[{symbol}] Could not get position status: {e}")
+    with metrics.STAGE_SECONDS.time(stage="decide"):
+        decisions = strategy_loader.compiled.decide_all(
+            {s: market_data_cache[s] for s in position_statuses}, position_statuses, portfolio_summary
+        )
+    return portfolio_summary, position_statuses, decisions
+
+@profiler.stage
+def execute(market_data_cache, position_statuses, decisions, cycle_errors, revalidate=False):
+    """
+    STEP 5b-c: Executes the engine's decisions. The caller must hold portfolio_lock.
+    With `revalidate=True` (decisions made in an earlier step that released the lock)
+    a symbol whose position changed in between, e.g. closed by TP/SL, is skipped.
+    Returns True if at least one symbol was processed successfully.
+    """
+    is_cycle_successful = False
     for symbol in config.TRADING_SYMBOLS:
         try:
             market_summary = market_data_cache.get(symbol)
@@ -169,48 +279,79 @@ def main_job():
                 continue
 
             print(f"\n-> Processing {symbol}...")
-            
-            # a. Get current position status
-            position_status = trade.get_current_position(symbol=symbol)
-            
+
+            position_status = position_statuses.get(symbol)
+            if position_status is None:
+                raise RuntimeError("Position status unavailable.")
+            if revalidate and trade.get_current_position(symbol=symbol) != position_status:
+                print(f"[{symbol}] Position changed since the decision was made. Skipping until the next cycle.")
+                is_cycle_successful = True
+                continue
+
             # b. Get trade decision from the RULE-BASED ENGINE
-            print(f"[{symbol}] Data (from cache): {json.dumps(market_summary)}")
+            print(f"[{symbol}] Data (from cache): {json.dumps(market_summary.to_dict())}")
             print(f"[{symbol}] Current Position: {position_status[0]}")
-            decision = engine.decide_action(
-                strategy=strategy_rules,
-                market_data=market_summary, 
-                position_status=position_status, 
-                portfolio_summary=portfolio_summary
-            )
-            print(f"[{symbol}] Engine Decision: '{decision.get('command')}' | Reason: {decision.get('reasoning')}")
+            decision = decisions[symbol]
+            if isinstance(decision, Exception):
+                raise decision
+            print(f"[{symbol}] Engine Decision: '{decision.command}' | Reason: {decision.reasoning}")
 
             # c. Execute the decision, passing the cached data
-            trade.parse_and_execute(decision, symbol, market_summary, position_status)
-            
+            with metrics.ORDER_SECONDS.time(command=decision.command):
+                trade.parse_and_execute(decision, symbol, market_summary, position_status)
+
             is_cycle_successful = True
-            
+
         except Exception as e:
             error_msg = f"[{symbol}] An unexpected error occurred in the main loop: {e}"
             print(error_msg)
             import traceback
             traceback.print_exc()
             cycle_errors.append(error_msg)
-    
-    # 6. Save state to file for web UI
-    if config.SIMULATION_MODE and portfolio:
-        print("\n[STEP 6] Saving state to portfolio_state.json for web UI...")
-        try:
-            state_data = {
-                "portfolio_summary": portfolio.get_portfolio_summary(),
-                "open_positions": portfolio.get_all_open_positions(),
-                "equity_history": portfolio.get_equity_history()
-            }
-            with open('portfolio_state.json', 'w') as f:
+            metrics.ERRORS.inc(stage="execute")
+    return is_cycle_successful
+
+def snapshot_state():
+    """Returns the portfolio state for the web UI (None outside simulation mode). The caller must hold portfolio_lock."""
+    if not (config.SIMULATION_MODE and portfolio):
+        return None
+    return {
+        "portfolio_summary": portfolio.get_portfolio_summary(),
+        "open_positions": {symbol: position.to_dict() for symbol, position in portfolio.get_all_open_positions().items()},
+        "equity_history": portfolio.get_equity_history()
+    }
+
+@profiler.stage
+def persist_state(state_data):
+    """STEP 6: Publishes state for the web UI (IPC) and saves it to portfolio_state.json as a backstop."""
+    if state_data is None:
+        return
+    print("\n[STEP 6] Publishing state for web UI and saving portfolio_state.json...")
+    try:
+        with metrics.STAGE_SECONDS.time(stage="persist"):
+            ipc.publish('portfolio', state_data)
+            tmp_file = 'portfolio_state.json.tmp'
+            with open(tmp_file, 'w') as f:
                 json.dump(state_data, f, indent=2)
-        except Exception as e:
-            print(f"Error saving state to file: {e}")
+            os.replace(tmp_file, 'portfolio_state.json') # Readers never see a half-written file
+    except Exception as e:
+        print(f"Error saving state to file: {e}")
+        metrics.ERRORS.inc(stage="persist")
+
+def end_cycle():
+    """Records the cycle's duration and publishes the metrics. Also runs for cycles skipped after the fetch."""
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - cycle_started_at, stage="cycle")
+    metrics.LAST_CYCLE.set(time.time())
+    metrics.publish()
+    profiler.cycle_finished(cycle_count)
 
-    # 7. Handle Error and Summary Email Logic
+def finish_cycle(is_cycle_successful, cycle_errors, portfolio_summary):
+    """
+    STEP 7: Updates the error counters and returns the notifications due this cycle
+    as a list of (function, args) for the caller to send.
+    """
+    global consecutive_error_cycles, last_cycle_errors
+    notifications = []
     if not is_cycle_successful and len(config.TRADING_SYMBOLS) > 0:
         consecutive_error_cycles += 1
         print(f"\n[WORKER] Cycle failed for all symbols. Consecutive error count: {consecutive_error_cycles}")
@@ -220,47 +361,116 @@ def main_job():
             print(f"\n[WORKER] Cycle succeeded. Resetting consecutive error count from {consecutive_error_cycles} to 0.")
         consecutive_error_cycles = 0
 
-    if consecutive_error_cycles >= 5:
+    if consecutive_error_cycles >= config.ERROR_ALERT_CYCLES:
         print(f"\n[WORKER] Reached {consecutive_error_cycles} consecutive errors. Sending alert email...")
-        mailer.send_error_email(last_cycle_errors)
+        notifications.append((mailer.send_error_email, (last_cycle_errors,)))
         consecutive_error_cycles = 0 # Reset after sending to avoid spam
 
     # Send summary email every 30 cycles
     if cycle_count > 0 and cycle_count % 30 == 0:
         print(f"\n[WORKER] Reached cycle {cycle_count}. Sending periodic summary email...")
-        open_positions = portfolio.get_all_open_positions() if portfolio else {}
-        mailer.send_summary_email(portfolio_summary, open_positions)
+        # Copies: the email is sent from another thread while the positions keep updating
+        with portfolio_lock:
+            open_positions = {s: p.copy() for s, p in portfolio.get_all_open_positions().items()} if portfolio else {}
+        notifications.append((mailer.send_summary_email, (portfolio_summary, open_positions)))
+
+    end_cycle()
 
     print(f"\n{'='*60}")
-    print(f"--- Cycle End: Next run in 1 minute ---")
+    print(f"--- Cycle End: Next run after the next {config.DECISION_TIMEFRAME} candle closes ---")
     print(f"{'='*60}\n")
+    return notifications
 
+def main_job():
+    """
+    Main job flow: Fetch all data once -> Update PnL -> Check TP/SL -> For each symbol: Decide -> Execute.
+    This new structure uses a "Cycle Cache" to prevent redundant API calls.
+    Used by the threaded runtime; async_runtime.py runs the same steps as separate tasks.
+    """
+    if not start_cycle():
+        return
+    cycle_errors = []
+    market_data_cache = fetch_market_data(cycle_errors)
+    if not market_data_cache:
+        end_cycle() # Publish the fetch errors even though the cycle is skipped
+        return # Exit early if no data is available at all
 
-print("--- RULE-BASED Scalping Bot Initialized ---")
-print(f"Trading Assets: {', '.join(config.TRADING_SYMBOLS)}")
-print(f"Engine: Running based on rules from 'strategy.json'")
-print(f"Strategy: TP: {config.TAKE_PROFIT_PCT}% / SL: {config.STOP_LOSS_PCT}%")
-print(f"Simulation Mode: {'Active' if config.SIMULATION_MODE else 'Inactive'}")
-print(f"Run Interval: Every 1 minute (analyzing 3m candles)")
-print("------------------------------------")
+    with portfolio_lock:
+        portfolio_summary, position_statuses, decisions = decide(market_data_cache)
+        is_cycle_successful = execute(market_data_cache, position_statuses, decisions, cycle_errors)
+        state_data = snapshot_state()
+    persist_state(state_data)
 
-# Load strategy rules at startup
-load_strategy()
+    for send, args in finish_cycle(is_cycle_successful, cycle_errors, portfolio_summary):
+        send(*args)
 
-print("\n[WORKER] Starting trading bot worker...")
 
-# Schedule the main job to run every 1 minute
-schedule.every(1).minutes.do(main_job)
+def run_threaded():
+    """Runs main_job and tp_sl_job on the threaded Scheduler."""
+    # Decisions run once per candle close; TP/SL runs on its own faster cadence
+    scheduler = Scheduler()
+    scheduler.every_candle(config.DECISION_TIMEFRAME, main_job, settle_delay=config.CANDLE_SETTLE_DELAY)
+    if config.SIMULATION_MODE and config.TPSL_CHECK_INTERVAL > 0:
+        scheduler.every(config.TPSL_CHECK_INTERVAL, tp_sl_job)
 
-# Run the job once immediately to start
-if strategy_rules:
+    # Run the job once immediately to start
     main_job()
-else:
-    print("[WORKER] Bot not started due to missing strategy rules.")
 
+    print("\n[SCHEDULER] Worker is now running. Press Ctrl+C to stop.\n")
+    scheduler.run_forever()
+
+def run_async():
+    """Runs the cycle as separate asyncio tasks (see async_runtime.py)."""
+    import asyncio
+    from async_runtime import WorkerRuntime
+    runtime = WorkerRuntime(
+        {
+            "start_cycle": start_cycle, "fetch_market_data": fetch_market_data, "decide": decide,
+            "execute": execute, "snapshot_state": snapshot_state, "persist_state": persist_state,
+            "finish_cycle": finish_cycle, "end_cycle": end_cycle, "fetch_tp_sl_prices": fetch_tp_sl_prices,
+            "check_tp_sl_prices": check_tp_sl_prices, "portfolio_lock": portfolio_lock,
+        },
+        config.DECISION_TIMEFRAME,
+        settle_delay=config.CANDLE_SETTLE_DELAY,
+        tp_sl_interval=config.TPSL_CHECK_INTERVAL if config.SIMULATION_MODE else 0,
+    )
+    print("\n[RUNTIME] Worker is now running on asyncio. Press Ctrl+C to stop.\n")
+    try:
+        asyncio.run(runtime.run())
+    except KeyboardInterrupt:
+        print("[RUNTIME] Stopping...")
+
+if __name__ == "__main__":
+    print("--- RULE-BASED Scalping Bot Initialized ---")
+    print(f"Trading Assets: {', '.join(config.TRADING_SYMBOLS)}")
+    print(f"Engine: Running based on rules from 'strategy.json'")
+    print(f"Strategy: TP: {config.TAKE_PROFIT_PCT}% / SL: {config.STOP_LOSS_PCT}%")
+    print(f"Simulation Mode: {'Active' if config.SIMULATION_MODE else 'Inactive'}")
+    print(f"Run Interval: {config.CANDLE_SETTLE_DELAY}s after every {config.DECISION_TIMEFRAME} candle close, TP/SL every {config.TPSL_CHECK_INTERVAL or '-'}s")
+    print("------------------------------------")
+
+    # Load strategy rules at startup
+    load_strategy()
+
+    # Start the optional streaming price feed for tick-level TP/SL checks
+    if config.MARKET_FEED_MODE != 'rest' and config.SIMULATION_MODE:
+        from feed import create_feed
+        price_feed = create_feed(config.TRADING_SYMBOLS, on_price_tick, interval=config.DECISION_TIMEFRAME)
+        if price_feed:
+            price_feed.start()
+            print(f"[WORKER] Streaming price feed started ({config.MARKET_FEED_MODE}).")
+
+    # Opt-in profiling of live cycles: WORKER_PROFILE=true, or `kill -USR1 <pid>` at any time
+    profiler.install_signal_handler()
+    if config.WORKER_PROFILE:
+        profiler.arm()
 
-# Main loop for the scheduler
-print("\n[SCHEDULER] Worker is now running. Press Ctrl+C to stop.\n")
-while True:
-    schedule.run_pending()
-    time.sleep(1)
\ No newline at end of file
+    print("\n[WORKER] Starting trading bot worker...")
+
+    if not strategy_rules:
+        print("[WORKER] Bot not started due to missing strategy rules.")
+
+    if config.WORKER_RUNTIME == 'threads':
+        run_threaded()
+    else:
+        run_async()